@@ -0,0 +1,628 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарки для updateArchitecture.py.
+Работают офлайн и используют только стандартную библиотеку.
+ - phases: генерирует синтетический репозиторий (число файлов, глубина папок,
+   размер файлов, плотность импортов, доля Python/JS/HTML) и замеряет каждую
+   фазу отдельно; результаты пишутся в JSON для сравнения между коммитами.
+ - imports: сопоставление импортов с файлами проекта (линейный перебор
+   project_files против ImportIndex) на синтетических наборах путей.
+ - python: парсеры Python (ast и построчный на регулярных выражениях)
+   на больших синтетических модулях; результаты обоих сверяются.
+ - extract: извлечение импортов из больших файлов – по строкам readlines()
+   против mmap и регулярных выражений над байтами; время и пик памяти.
+ - prefetch: парсинг синтетического репозитория, когда каждое чтение файла
+   искусственно задержано (как на сетевой файловой системе): чтение в том же
+   потоке против упреждающего чтения пулом потоков с ограниченной очередью.
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+import updateArchitecture as ua
+# ==============================
+# Синтетические наборы файлов
+# ==============================
+def synthetic_project_files(count, seed=0):
+   """
+   Генерирует count относительных путей в стиле проекта: папки
+   с вложенностью до 4 уровней, файлы .py/.js/.swift.
+   """
+   rnd = random.Random(seed)
+   folders = ["."]
+   for i in range(max(1, count // 20)):
+       parent = rnd.choice(folders)
+       name = f"pkg{i}"
+       folders.append(name if parent == "." else os.path.join(parent, name))
+       if folders[-1].count(os.sep) > 3:
+           folders.pop()
+   exts = [".py", ".js", ".js", ".swift"]
+   return {
+       os.path.join(rnd.choice(folders), f"module{i}{rnd.choice(exts)}")
+       for i in range(count)
+   }
+def synthetic_imports(project_files, count, seed=0):
+   """
+   Набор (module, lang) для проверки: половина ссылается на существующие
+   файлы, половина – на несуществующие модули.
+   """
+   rnd = random.Random(seed)
+   files = sorted(project_files)
+   imports = []
+   for i in range(count):
+       if i % 2 == 0:
+           pf = rnd.choice(files)
+           base, ext = os.path.splitext(os.path.basename(pf))
+           lang = {".py": "python", ".js": "js", ".swift": "swift"}[ext]
+           imports.append((base, lang))
+       else:
+           imports.append((f"missing{i}", rnd.choice(["python", "js", "swift"])))
+   return imports
+# ==============================
+# Синтетический репозиторий на диске
+# ==============================
+def _python_source(name, lines, imports, rnd):
+   out = [f'"""Синтетический модуль {name}."""']
+   out.extend(f"import {module}" for module in imports)
+   out.append("")
+   i = 0
+   while len(out) < lines:
+       if i % 3 == 0:
+           out.append(f"class Class{i}(object):")
+           out.append(f'    """Класс {i}."""')
+           out.append(f"    field{i} = {i}")
+           for m in range(rnd.randint(1, 4)):
+               out.append(f"    def method{m}(self, value):")
+               out.append(f'        """Метод {m}."""')
+               out.append(f"        return value + {m}")
+       else:
+           out.append(f"def function{i}(a, b):")
+           out.append(f"    # Функция {i}")
+           out.append(f"    return a * b + {i}")
+       out.append("")
+       i += 1
+   return "\n".join(out) + "\n"
+def _js_source(name, lines, imports, rnd):
+   out = [f"// Синтетический модуль {name}"]
+   out.extend(f"const dep{k} = require('{module}');" for k, module in enumerate(imports))
+   out.append("")
+   i = 0
+   while len(out) < lines:
+       if i % 3 == 0:
+           out.append(f"/** Класс {i} */")
+           out.append(f"class Class{i} {{")
+           out.append(f"  constructor() {{")
+           out.append(f"    this.value = {i};")
+           out.append("  }")
+           for m in range(rnd.randint(1, 4)):
+               out.append(f"  method{m}(value) {{")
+               out.append(f"    return value + '{{}}' + {m};")
+               out.append("  }")
+           out.append("}")
+       else:
+           out.append(f"// Функция {i}")
+           out.append(f"function function{i}(a, b) {{")
+           out.append(f"  return a * b + {i};")
+           out.append("}")
+       out.append("")
+       i += 1
+   out.append("module.exports = { " + ", ".join(f"function{k}" for k in range(1, 3)) + " };")
+   return "\n".join(out) + "\n"
+def _html_source(name, lines, imports, rnd):
+   out = ["<!DOCTYPE html>", "<html>", "<head>", f"<title>{name}</title>"]
+   for module in imports:
+       if module.endswith(".css"):
+           out.append(f'<link rel="stylesheet" href="{module}">')
+       else:
+           out.append(f'<script src="{module}"></script>')
+   out.append("</head>")
+   out.append("<body>")
+   i = 0
+   while len(out) < lines - 2:
+       out.append(f"<div class=\"row\"><span>{i}</span></div>")
+       i += 1
+   out.append("</body>")
+   out.append("</html>")
+   return "\n".join(out) + "\n"
+def generate_synthetic_repo(root, files=1000, depth=3, file_lines=120, import_density=3.0,
+                           mix=(0.45, 0.45, 0.10), seed=0):
+   """
+   Создаёт в каталоге root синтетический репозиторий: files файлов в папках
+   с вложенностью до depth, около file_lines строк в каждом, в среднем
+   import_density импортов на файл (ссылки на другие файлы репозитория
+   и на внешние модули), доли Python/JS/HTML задаются mix.
+   Возвращает словарь с числом файлов по языкам и общим объёмом.
+   """
+   rnd = random.Random(seed)
+   folders = ["."]
+   for i in range(max(1, files // 15)):
+       parent = rnd.choice(folders)
+       if parent != "." and parent.count(os.sep) + 1 >= depth:
+           parent = "."
+       folders.append(f"pkg{i}" if parent == "." else os.path.join(parent, f"pkg{i}"))
+   langs = rnd.choices(["python", "js", "html"], weights=mix, k=files)
+   ext = {"python": ".py", "js": ".js", "html": ".html"}
+   planned = [
+       (os.path.join(rnd.choice(folders), f"mod{i}{ext[lang]}"), lang)
+       for i, lang in enumerate(langs)
+   ]
+   by_lang = {"python": [], "js": [], "html": []}
+   for rel, lang in planned:
+       by_lang[lang].append(rel)
+   stats = {"files": 0, "bytes": 0, "python": 0, "js": 0, "html": 0}
+   for rel, lang in planned:
+       count = max(0, int(rnd.gauss(import_density, import_density / 2) + 0.5))
+       imports = []
+       for k in range(count):
+           external = rnd.random() < 0.3
+           if lang == "python":
+               if external or not by_lang["python"]:
+                   imports.append(rnd.choice(["os", "sys", "json", "re"]))
+               else:
+                   target = rnd.choice(by_lang["python"])
+                   imports.append(os.path.splitext(target)[0].lstrip("./").replace(os.sep, "."))
+           elif lang == "js":
+               if external or not by_lang["js"]:
+                   imports.append(rnd.choice(["express", "mongoose", "lodash", "xlsx"]))
+               else:
+                   target = rnd.choice(by_lang["js"])
+                   relative = os.path.relpath(os.path.splitext(target)[0], os.path.dirname(rel))
+                   imports.append(relative if relative.startswith("..") else "./" + relative)
+           else:
+               imports.append(f"assets/style{k}.css" if external else f"js/app{k}.js")
+       source = {"python": _python_source, "js": _js_source, "html": _html_source}[lang](
+           os.path.basename(rel), file_lines, imports, rnd)
+       path = os.path.join(root, rel)
+       os.makedirs(os.path.dirname(path), exist_ok=True)
+       with open(path, "w", encoding="utf-8") as f:
+           f.write(source)
+       stats["files"] += 1
+       stats[lang] += 1
+       stats["bytes"] += len(source.encode("utf-8"))
+   return stats
+# ==============================
+# Замер фаз
+# ==============================
+def _best_of(fn, repeat):
+   """Минимальное время выполнения fn() за repeat запусков и результат последнего."""
+   best = None
+   result = None
+   for _ in range(repeat):
+       start = time.perf_counter()
+       result = fn()
+       elapsed = time.perf_counter() - start
+       best = elapsed if best is None else min(best, elapsed)
+   return best, result
+def bench_phases(root, repeat=3):
+   """
+   Замеряет фазы updateArchitecture на репозитории root (лучшее из repeat):
+   обход, построение индекса импортов, extract_imports_from_file, каждый
+   parse_*_file, generate_directory_tree (полное и с ограничениями глубины
+   и числа файлов), формирование строк,
+   update_architecture_md (запись и повторный вызов без изменений),
+   а также полный прогон build_architecture без кэша и с тёплым кэшем.
+   В "memory" – пик памяти (tracemalloc) полного прогона с записью
+   ARCHITECTURE.md: без кэша со списком строк и с потоковой записью по папкам,
+   а также с потоковой записью и кэшами – без них и с тёплыми кэшами.
+   """
+   root = os.path.abspath(root)
+   phases = {}
+   phases["discovery"], model = _best_of(lambda: ua.scan_directory_model(root), repeat)
+   project_files = ua.collect_project_files(model)
+   phases["import_index"], index = _best_of(lambda: ua.ImportIndex(project_files), repeat)
+   files = {"python": [], "js": [], "html": []}
+   for rel_path in sorted(model):
+       for task in ua.collect_parse_tasks(rel_path, model[rel_path]):
+           if task["lang"] in files:
+               files[task["lang"]].append(task["path"])
+   sources = {}
+   for lang, paths in files.items():
+       for path in paths:
+           with open(path, "r", encoding="utf-8") as f:
+               sources[path] = (lang, f.readlines())
+   phases["extract_imports"], _ = _best_of(
+       lambda: [ua.extract_imports_from_file(lines, lang, index) for lang, lines in sources.values()],
+       repeat)
+   parsers = {
+       "python": ua.parse_python_file,
+       "js": ua.parse_js_file,
+       "html": ua.parse_html_file
+   }
+   for lang, parser in parsers.items():
+       phases[f"parse_{lang}"], _ = _best_of(
+           lambda: [parser(path, root, index) for path in files[lang]], repeat)
+   phases["directory_tree"], _ = _best_of(lambda: ua.generate_directory_tree(root, model), repeat)
+   # С ограничениями размеры свёрнутых файлов берутся из stat, собранного при обходе
+   stats_model = ua.scan_directory_model(root, with_stats=True)
+   phases["directory_tree_capped"], _ = _best_of(
+       lambda: ua.generate_directory_tree(root, stats_model, max_depth=2, max_files=10), repeat)
+   structure = ua.build_architecture(root, use_cache=False)["structure"]
+   phases["render"], lines = _best_of(lambda: ua.render_architecture(root, model, structure), repeat)
+   with tempfile.TemporaryDirectory() as tmp:
+       arch_file = os.path.join(tmp, "ARCHITECTURE.md")
+       def _write():
+           if os.path.exists(arch_file):
+               os.unlink(arch_file)
+           return ua.update_architecture_md(lines, arch_file)
+       with contextlib.redirect_stdout(io.StringIO()):
+           phases["update_md"], _ = _best_of(_write, repeat)
+           phases["update_md_unchanged"], _ = _best_of(
+               lambda: ua.update_architecture_md(lines, arch_file), repeat)
+   phases["full_cold"], _ = _best_of(lambda: ua.build_architecture(root, use_cache=False), repeat)
+   cache_path = os.path.join(root, ua.CACHE_FILE_NAME)
+   if os.path.exists(cache_path):
+       os.unlink(cache_path)
+   ua.build_architecture(root)
+   phases["full_warm_cache"], _ = _best_of(lambda: ua.build_architecture(root), repeat)
+   memory = {}
+   with tempfile.TemporaryDirectory() as tmp:
+       arch_file = os.path.join(tmp, "ARCHITECTURE.md")
+       def _build_and_write(stream, use_cache=False):
+           if os.path.exists(arch_file):
+               os.unlink(arch_file)
+           result = ua.build_architecture(root, use_cache=use_cache, stream=stream)
+           ua.update_architecture_md(result["lines"], arch_file)
+       def _drop_caches():
+           for name in (ua.CACHE_FILE_NAME, ua.SECTIONS_CACHE_FILE_NAME):
+               if os.path.exists(os.path.join(root, name)):
+                   os.unlink(os.path.join(root, name))
+       with contextlib.redirect_stdout(io.StringIO()):
+           memory["full_cold_lines"], _ = _peak_memory(lambda: _build_and_write(False))
+           memory["full_cold_stream"], _ = _peak_memory(lambda: _build_and_write(True))
+           # С кэшем (как по умолчанию в командной строке): без кэшей и с тёплыми кэшами
+           _drop_caches()
+           memory["cold_stream_cache"], _ = _peak_memory(lambda: _build_and_write(True, True))
+           memory["warm_stream_cache"], _ = _peak_memory(lambda: _build_and_write(True, True))
+   counts = {lang: len(paths) for lang, paths in files.items()}
+   counts["lines"] = sum(len(lines) for _, lines in sources.values())
+   return {"phases": phases, "memory": memory, "counts": counts}
+def _git_revision():
+   """Текущий коммит репозитория скрипта (если доступен git)."""
+   try:
+       return subprocess.run(
+           ["git", "rev-parse", "--short", "HEAD"],
+           cwd=os.path.dirname(os.path.abspath(__file__)),
+           capture_output=True, text=True, check=True
+       ).stdout.strip()
+   except (OSError, subprocess.CalledProcessError):
+       return None
+def run_phase_suite(args):
+   """
+   Генерирует репозиторий по параметрам args, замеряет фазы и возвращает
+   результат вместе с параметрами и описанием окружения.
+   """
+   params = {
+       "files": args.files,
+       "depth": args.depth,
+       "file_lines": args.file_lines,
+       "import_density": args.import_density,
+       "mix": args.mix,
+       "seed": args.seed,
+       "repeat": args.repeat
+   }
+   with tempfile.TemporaryDirectory() as tmp:
+       root = args.keep or tmp
+       repo = generate_synthetic_repo(root, args.files, args.depth, args.file_lines,
+                                      args.import_density, args.mix, args.seed)
+       result = bench_phases(root, args.repeat)
+   result["repo"] = repo
+   result["params"] = params
+   result["meta"] = {
+       "revision": _git_revision(),
+       "python": platform.python_version(),
+       "platform": platform.platform(),
+       "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")
+   }
+   return result
+def print_phases(result, baseline=None):
+   """Печатает таблицу фаз; при наличии baseline – отношение к нему."""
+   header = f"{'phase':<22} {'seconds':>10}"
+   if baseline:
+       header += f" {'baseline':>10} {'ratio':>7}"
+   print(header)
+   for name, seconds in result["phases"].items():
+       row = f"{name:<22} {seconds:>10.4f}"
+       if baseline:
+           old = baseline["phases"].get(name)
+           if old:
+               row += f" {old:>10.4f} {seconds / old:>7.2f}"
+       print(row)
+   header = f"{'peak memory':<22} {'KB':>10}"
+   if baseline:
+       header += f" {'baseline':>10} {'ratio':>7}"
+   print(header)
+   for name, peak in result.get("memory", {}).items():
+       row = f"{name:<22} {peak / 1024:>10.1f}"
+       if baseline:
+           old = baseline.get("memory", {}).get(name)
+           if old:
+               row += f" {old / 1024:>10.1f} {peak / old:>7.2f}"
+       print(row)
+# ==============================
+# Прежняя (линейная) эвристика для сравнения
+# ==============================
+def linear_has_module(module, lang, project_files):
+   """
+   Сопоставление импорта перебором всех файлов проекта (как до ImportIndex;
+   суффикс сверяется целыми компонентами пути, как в ImportIndex).
+   """
+   if lang == "python":
+       for pf in project_files:
+           path = os.sep + pf
+           if path.endswith(os.sep + module.replace('.', os.sep) + ".py") or path.endswith(os.sep + module + ".py"):
+               return True
+   elif lang == "swift":
+       for pf in project_files:
+           if (os.sep + pf.lower()).endswith(os.sep + module.lower() + ".swift"):
+               return True
+   elif lang == "js":
+       for pf in project_files:
+           if (os.sep + pf.lower()).endswith(os.sep + module.lower() + ".js"):
+               return True
+   return False
+# ==============================
+# Бенчмарк сопоставления импортов
+# ==============================
+def bench_import_index(sizes, lookups, seed=0):
+   """
+   Для каждого размера проекта измеряет время линейного сопоставления
+   и сопоставления через ImportIndex (включая построение индекса).
+   Результаты обоих способов сверяются.
+   """
+   results = []
+   for size in sizes:
+       project_files = synthetic_project_files(size, seed)
+       imports = synthetic_imports(project_files, lookups, seed)
+       start = time.perf_counter()
+       linear = [linear_has_module(m, lang, project_files) for m, lang in imports]
+       linear_time = time.perf_counter() - start
+       start = time.perf_counter()
+       index = ua.ImportIndex(project_files)
+       build_time = time.perf_counter() - start
+       start = time.perf_counter()
+       indexed = [ua.project_has_module(m, lang, index) for m, lang in imports]
+       lookup_time = time.perf_counter() - start
+       if linear != indexed:
+           raise AssertionError(f"ImportIndex расходится с линейным перебором для {size} файлов")
+       results.append({
+           "files": size,
+           "lookups": lookups,
+           "linear_s": linear_time,
+           "index_build_s": build_time,
+           "index_lookup_s": lookup_time
+       })
+   return results
+# ==============================
+# Бенчмарк парсеров Python
+# ==============================
+def bench_python_backends(sizes, repeat=3, seed=0):
+   """
+   Для каждого размера модуля (в строках) измеряет parse_python_file_ast
+   и построчный parse_python_file (лучшее из repeat). Синтетические модули
+   содержат только конструкции, которые оба парсера понимают одинаково,
+   поэтому их результаты должны совпадать.
+   """
+   results = []
+   with tempfile.TemporaryDirectory(prefix="ua-bench-py-") as root:
+       for size in sizes:
+           rnd = random.Random(seed)
+           path = os.path.join(root, f"module{size}.py")
+           with open(path, "w", encoding="utf-8") as f:
+               f.write(_python_source(f"module{size}", size, ["os", "sys"], rnd))
+           ast_time, ast_result = _best_of(lambda: ua.parse_python_file_ast(path, root, []), repeat)
+           regex_time, regex_result = _best_of(lambda: ua.parse_python_file(path, root, []), repeat)
+           if ast_result != regex_result:
+               raise AssertionError(f"Парсеры ast и regex расходятся на модуле из {size} строк")
+           results.append({
+               "lines": size,
+               "elements": len(ast_result),
+               "ast_s": ast_time,
+               "regex_s": regex_time
+           })
+   return results
+# ==============================
+# Бенчмарк извлечения импортов из файла
+# ==============================
+def _peak_memory(fn):
+   """Пик памяти (tracemalloc, байты) при выполнении fn() и её результат."""
+   import tracemalloc
+   tracemalloc.start()
+   try:
+       result = fn()
+       return tracemalloc.get_traced_memory()[1], result
+   finally:
+       tracemalloc.stop()
+def bench_import_extraction(sizes, repeat=3, seed=0):
+   """
+   Для каждого размера файла (в строках) сравнивает extract_imports_from_file
+   по строкам readlines() и extract_imports_from_path (mmap, поиск по байтам):
+   лучшее время из repeat и пик памяти. Результаты сверяются.
+   """
+   def by_lines(path, lang):
+       with open(path, "r", encoding="utf-8") as f:
+           return ua.extract_imports_from_file(f.readlines(), lang, index)
+   results = []
+   index = ua.ImportIndex([])
+   with tempfile.TemporaryDirectory(prefix="ua-bench-extract-") as root:
+       for size in sizes:
+           rnd = random.Random(seed)
+           for lang, source, ext in (("python", _python_source, ".py"), ("js", _js_source, ".js")):
+               path = os.path.join(root, f"big{size}{ext}")
+               imports = [f"./dep{k}" for k in range(20)] if lang == "js" else [f".dep{k}" for k in range(20)]
+               with open(path, "w", encoding="utf-8") as f:
+                   f.write(source(f"big{size}", size, imports, rnd))
+               lines_time, lines_result = _best_of(lambda: by_lines(path, lang), repeat)
+               mmap_time, mmap_result = _best_of(lambda: ua.extract_imports_from_path(path, lang, index), repeat)
+               if lines_result != mmap_result:
+                   raise AssertionError(f"Извлечение импортов расходится для {path}")
+               results.append({
+                   "lang": lang,
+                   "lines": size,
+                   "bytes": os.path.getsize(path),
+                   "readlines_s": lines_time,
+                   "mmap_s": mmap_time,
+                   "readlines_peak": _peak_memory(lambda: by_lines(path, lang))[0],
+                   "mmap_peak": _peak_memory(lambda: ua.extract_imports_from_path(path, lang, index))[0]
+               })
+   return results
+# ==============================
+# Бенчмарк упреждающего чтения файлов
+# ==============================
+def delayed_reader(delay):
+   """Функция чтения для parse_files: read_file_bytes с задержкой delay секунд."""
+   def read(path, max_size):
+       time.sleep(delay)
+       return ua.read_file_bytes(path, max_size)
+   return read
+def bench_prefetch(files=500, delay=0.002, threads=(1, 4, 16), queues=(4, 32), seed=0):
+   """
+   Парсит синтетический репозиторий из files файлов без кэша, задерживая
+   каждое чтение на delay секунд: сначала с чтением в том же потоке, затем
+   с prefetch_files для каждого числа потоков и размера очереди. Для каждого
+   варианта – время и пик памяти (tracemalloc, отдельным запуском);
+   записи кэша сверяются.
+   """
+   reader = delayed_reader(delay)
+   results = []
+   with tempfile.TemporaryDirectory(prefix="ua-bench-prefetch-") as root:
+       generate_synthetic_repo(root, files=files, seed=seed)
+       model = ua.scan_directory_model(root)
+       index = ua.ImportIndex(ua.collect_project_files(model))
+       tasks = []
+       for rel_path in sorted(model):
+           tasks.extend(ua.collect_parse_tasks(rel_path, model[rel_path]))
+       def run(prefetch, queue):
+           start = time.perf_counter()
+           entries = ua.parse_files(tasks, root, index, {}, prefetch=prefetch,
+                                    prefetch_queue=queue, reader=reader)
+           return time.perf_counter() - start, entries
+       variants = [(0, 0)] + [(t, q) for t in threads for q in queues]
+       expected = None
+       for prefetch, queue in variants:
+           elapsed, entries = run(prefetch, queue)
+           peak = _peak_memory(lambda: run(prefetch, queue))[0]
+           if expected is None:
+               expected = entries
+           elif entries != expected:
+               raise AssertionError(f"Результаты расходятся при prefetch={prefetch}, queue={queue}")
+           results.append({
+               "threads": prefetch,
+               "queue": queue,
+               "files": len(tasks),
+               "time_s": elapsed,
+               "peak": peak
+           })
+   return results
+def parse_args(argv=None):
+   parser = argparse.ArgumentParser(description="Бенчмарки updateArchitecture.py.")
+   sub = parser.add_subparsers(dest="command")
+   phases = sub.add_parser("phases", help="Замер фаз на синтетическом репозитории (по умолчанию)")
+   phases.add_argument("--files", type=int, default=2000, help="Число файлов")
+   phases.add_argument("--depth", type=int, default=4, help="Максимальная вложенность папок")
+   phases.add_argument("--file-lines", type=int, default=120, help="Примерное число строк в файле")
+   phases.add_argument("--import-density", type=float, default=3.0,
+                       help="Среднее число импортов на файл")
+   phases.add_argument("--mix", type=float, nargs=3, default=[0.45, 0.45, 0.10],
+                       metavar=("PY", "JS", "HTML"), help="Доли Python/JS/HTML")
+   phases.add_argument("--repeat", type=int, default=3, help="Число повторов каждой фазы")
+   phases.add_argument("--seed", type=int, default=0, help="Зерно генератора")
+   phases.add_argument("--output", help="JSON-файл для результатов")
+   phases.add_argument("--compare", help="JSON-файл с результатами другого коммита для сравнения")
+   phases.add_argument("--keep", help="Сгенерировать репозиторий в этот каталог и не удалять его")
+   imports = sub.add_parser("imports", help="Линейное сопоставление импортов против ImportIndex")
+   imports.add_argument(
+       "--sizes",
+       type=int,
+       nargs="+",
+       default=[1000, 10000, 100000],
+       help="Размеры синтетических проектов (число файлов)",
+   )
+   imports.add_argument(
+       "--lookups",
+       type=int,
+       default=500,
+       help="Число проверяемых импортов на каждый размер",
+   )
+   imports.add_argument("--seed", type=int, default=0, help="Зерно генератора")
+   python = sub.add_parser("python", help="Парсеры Python: ast против регулярных выражений")
+   python.add_argument(
+       "--sizes",
+       type=int,
+       nargs="+",
+       default=[1000, 10000, 100000],
+       help="Размеры синтетических модулей (число строк)",
+   )
+   python.add_argument("--repeat", type=int, default=3, help="Число повторов")
+   python.add_argument("--seed", type=int, default=0, help="Зерно генератора")
+   extract = sub.add_parser("extract", help="Извлечение импортов: readlines() против mmap")
+   extract.add_argument(
+       "--sizes",
+       type=int,
+       nargs="+",
+       default=[10000, 100000, 1000000],
+       help="Размеры синтетических файлов (число строк)",
+   )
+   extract.add_argument("--repeat", type=int, default=3, help="Число повторов")
+   extract.add_argument("--seed", type=int, default=0, help="Зерно генератора")
+   prefetch = sub.add_parser("prefetch", help="Чтение файлов с задержкой: в том же потоке против --prefetch")
+   prefetch.add_argument("--files", type=int, default=500, help="Число файлов")
+   prefetch.add_argument("--delay", type=float, default=0.002,
+                         help="Задержка каждого чтения файла, секунды")
+   prefetch.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16],
+                         help="Числа потоков упреждающего чтения")
+   prefetch.add_argument("--queues", type=int, nargs="+", default=[4, 32],
+                         help="Размеры очереди прочитанных файлов")
+   prefetch.add_argument("--seed", type=int, default=0, help="Зерно генератора")
+   argv = list(sys.argv[1:] if argv is None else argv)
+   # Подкоманда по умолчанию – phases
+   if not argv or argv[0] not in ("phases", "imports", "python", "extract", "prefetch", "-h", "--help"):
+       argv.insert(0, "phases")
+   return parser.parse_args(argv)
+def main(argv=None):
+   args = parse_args(argv)
+   if args.command == "imports":
+       print(f"{'files':>8} {'lookups':>8} {'linear, s':>11} {'index build, s':>15} {'index lookup, s':>16}")
+       for row in bench_import_index(args.sizes, args.lookups, args.seed):
+           print(f"{row['files']:>8} {row['lookups']:>8} {row['linear_s']:>11.4f} "
+                 f"{row['index_build_s']:>15.4f} {row['index_lookup_s']:>16.4f}")
+       return 0
+   if args.command == "python":
+       print(f"{'lines':>8} {'elements':>9} {'ast, s':>9} {'regex, s':>9} {'ratio':>7}")
+       for row in bench_python_backends(args.sizes, args.repeat, args.seed):
+           print(f"{row['lines']:>8} {row['elements']:>9} {row['ast_s']:>9.4f} "
+                 f"{row['regex_s']:>9.4f} {row['ast_s'] / row['regex_s']:>7.2f}")
+       return 0
+   if args.command == "extract":
+       print(f"{'lang':<7} {'lines':>8} {'bytes':>10} {'readlines, s':>13} {'mmap, s':>9} "
+             f"{'readlines peak':>15} {'mmap peak':>10}")
+       for row in bench_import_extraction(args.sizes, args.repeat, args.seed):
+           print(f"{row['lang']:<7} {row['lines']:>8} {row['bytes']:>10} {row['readlines_s']:>13.4f} "
+                 f"{row['mmap_s']:>9.4f} {row['readlines_peak']:>15} {row['mmap_peak']:>10}")
+       return 0
+   if args.command == "prefetch":
+       print(f"{'threads':>8} {'queue':>6} {'files':>6} {'time, s':>9} {'peak':>10}")
+       for row in bench_prefetch(args.files, args.delay, args.threads, args.queues, args.seed):
+           threads = row["threads"] or "inline"
+           queue = row["queue"] or "-"
+           print(f"{threads:>8} {queue:>6} {row['files']:>6} {row['time_s']:>9.4f} {row['peak']:>10}")
+       return 0
+   result = run_phase_suite(args)
+   baseline = None
+   if args.compare:
+       with open(args.compare, "r", encoding="utf-8") as f:
+           baseline = json.load(f)
+   print_phases(result, baseline)
+   if args.output:
+       with open(args.output, "w", encoding="utf-8") as f:
+           json.dump(result, f, ensure_ascii=False, indent=2)
+   return 0
+if __name__ == "__main__":
+   sys.exit(main())
@@ -0,0 +1,4 @@
+# Тесты updateArchitecture.py (Python); тесты сервера – *.test.js (mocha)
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)))
@@ -0,0 +1,31 @@
+import Foundation
+/// Модель с членами уровня класса
+class Model {
+    var name: String = ""
+    class var shared: Model { return Model() }
+    class private(set) var count = 0
+    /// Фабрика
+    class func make() -> Model {
+        return Model()
+    }
+    class override func copy() -> Model {
+        return Model()
+    }
+    class final func reset() {
+    }
+    class subscript(index: Int) -> Model {
+        return Model()
+    }
+    func update() {
+    }
+    class Nested {
+        func inner() {
+        }
+    }
+}
+struct Point {
+    let x: Int
+    static func zero() -> Point {
+        return Point(x: 0)
+    }
+}
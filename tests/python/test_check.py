@@ -0,0 +1,75 @@
+import os
+import shutil
+import subprocess
+import sys
+import pytest
+import updateArchitecture as ua
+SOURCES = {
+   "app/main.py": "import helpers\n\ndef main():\n    pass\n",
+   "app/helpers.py": "def helper():\n    pass\n",
+   "web/index.js": "const util = require('./util');\nfunction start() {}\n",
+   "web/util.js": "module.exports = {};\n",
+   "notes.txt": "не разбирается\n",
+}
+def _write(root, rel_path, text):
+   path = root.joinpath(*rel_path.split("/"))
+   path.parent.mkdir(parents=True, exist_ok=True)
+   path.write_text(text, encoding="utf-8")
+   return path
+def _touch(path):
+   # Сдвиг mtime заметен и при грубом разрешении времени файловой системы
+   st = os.stat(path)
+   os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 2_000_000_000))
+@pytest.fixture
+def project(tmp_path):
+   """Проект с копией скрипта: корнем запуска считается папка скрипта."""
+   shutil.copy(ua.__file__, tmp_path / "updateArchitecture.py")
+   for rel_path, text in SOURCES.items():
+       _write(tmp_path, rel_path, text)
+   assert _main(tmp_path).returncode == 0
+   return tmp_path
+def _main(root, *args):
+   return subprocess.run([sys.executable, str(root / "updateArchitecture.py"), *args],
+                         cwd=root, capture_output=True, text=True, encoding="utf-8")
+def _check(root, *args):
+   return _main(root, "--check", *args).returncode
+def test_unchanged_project_is_fresh(project):
+   assert _check(project) == 0
+   assert _check(project) == 0
+def test_touch_without_changes_is_fresh(project):
+   _touch(project / "app" / "helpers.py")
+   assert _check(project) == 0
+def test_source_edit_is_stale(project):
+   _write(project, "app/helpers.py", "def helper():\n    pass\ndef other():\n    pass\n")
+   assert _check(project) == 1
+   assert _main(project).returncode == 0
+   assert _check(project) == 0
+def test_same_size_edit_is_stale(project):
+   path = _write(project, "app/helpers.py", SOURCES["app/helpers.py"].replace("helper", "worker"))
+   _touch(path)
+   assert _check(project) == 1
+def test_added_file_is_stale(project):
+   _write(project, "web/extra.js", "function extra() {}\n")
+   assert _check(project) == 1
+def test_added_unparsed_file_is_stale(project):
+   _write(project, "app/README", "текст\n")
+   assert _check(project) == 1
+def test_deleted_file_is_stale(project):
+   (project / "web" / "util.js").unlink()
+   assert _check(project) == 1
+def test_gitignore_change_is_stale(project):
+   _write(project, ".gitignore", "notes.txt\n")
+   assert _check(project) == 1
+   assert _main(project).returncode == 0
+   assert _check(project) == 0
+   _write(project, ".gitignore", "")
+   assert _check(project) == 1
+def test_ignore_option_change_is_stale(project):
+   assert _check(project, "--ignore", "*.js") == 1
+def test_edited_block_is_stale(project):
+   arch_file = project / "ARCHITECTURE.md"
+   arch_file.write_text(arch_file.read_text(encoding="utf-8").replace("helper", "HELPER"), encoding="utf-8")
+   assert _check(project) == 1
+def test_missing_fingerprint_is_stale(project):
+   os.remove(ua.fingerprint_path(str(project / "ARCHITECTURE.md")))
+   assert _check(project) == 1
@@ -0,0 +1,89 @@
+import pytest
+import updateArchitecture as ua
+# (шаблоны .gitignore, путь относительно папки правил, папка ли это, ожидаемый match):
+# True – игнорируется, False – возвращён "!", None – ни один шаблон не подошёл.
+# Ожидания – по описанию формата в документации git (gitignore(5)).
+CASES = [
+   # Шаблон без "/" совпадает с именем на любой глубине
+   (["*.log"], "a.log", False, True),
+   (["*.log"], "src/deep/a.log", False, True),
+   (["*.log"], "a.logx", False, None),
+   # "/" в начале или в середине привязывает шаблон к папке .gitignore
+   (["/build"], "build", True, True),
+   (["/build"], "src/build", True, None),
+   (["doc/frotz"], "doc/frotz", False, True),
+   (["doc/frotz"], "a/doc/frotz", False, None),
+   # "/" в конце – только папки
+   (["build/"], "build", True, True),
+   (["build/"], "build", False, None),
+   (["build/"], "src/build", True, True),
+   (["doc/frotz/"], "doc/frotz", True, True),
+   (["doc/frotz/"], "a/doc/frotz", True, None),
+   # "*", "?" и "[...]" не совпадают с "/"
+   (["a/*.txt"], "a/b.txt", False, True),
+   (["a/*.txt"], "a/b/c.txt", False, None),
+   (["foo?"], "foo1", False, True),
+   (["foo?"], "foo", False, None),
+   (["[a-c].txt"], "b.txt", False, True),
+   (["[a-c].txt"], "d.txt", False, None),
+   (["[!a].txt"], "b.txt", False, True),
+   (["[!a].txt"], "a.txt", False, None),
+   # "**/" в начале – любая папка, "/**/" – ноль или больше папок
+   (["**/foo"], "foo", False, True),
+   (["**/foo"], "a/b/foo", False, True),
+   (["**/foo/bar"], "foo/bar", False, True),
+   (["**/foo/bar"], "x/y/foo/bar", False, True),
+   (["a/**/b"], "a/b", False, True),
+   (["a/**/b"], "a/x/y/b", False, True),
+   (["a/**/b"], "ab", False, None),
+   # "/**" в конце – всё внутри папки, но не сама папка
+   (["abc/**"], "abc", True, None),
+   (["abc/**"], "abc/x", False, True),
+   (["abc/**"], "abc/d", True, True),
+   (["abc/**"], "abc/d/e", False, True),
+   # "!" возвращает путь; решает последний подходящий шаблон
+   (["*.log", "!keep.log"], "keep.log", False, False),
+   (["*.log", "!keep.log"], "x.log", False, True),
+   (["!keep.log", "*.log"], "keep.log", False, True),
+   (["abc/**", "!abc/keep.txt"], "abc/keep.txt", False, False),
+   # Комментарии, экранирование и пробелы в конце
+   (["# comment"], "# comment", False, None),
+   (["\\#comment"], "#comment", False, True),
+   (["\\!important"], "!important", False, True),
+   (["trailing   "], "trailing", False, True),
+   (["space\\ "], "space ", False, True),
+]
+@pytest.mark.parametrize("patterns, path, is_dir, expected", CASES)
+def test_match(patterns, path, is_dir, expected):
+   assert ua.IgnoreRules(patterns).match(path, is_dir) is expected
+def test_empty_rules():
+   rules = ua.IgnoreRules(["", "# только комментарий"])
+   assert not rules
+   assert rules.match("anything", False) is None
+def _write(root, rel_path, text=""):
+   path = root.joinpath(*rel_path.split("/"))
+   path.parent.mkdir(parents=True, exist_ok=True)
+   path.write_text(text, encoding="utf-8")
+def test_scan_follows_git(tmp_path):
+   # Результат сверен с "git status --ignored" на том же дереве
+   _write(tmp_path, ".gitignore", "dir/**\n!dir/keep.txt\n*.tmp\nbuild/\n!build/keep\n")
+   _write(tmp_path, "pkg/.gitignore", "!important.tmp\n")
+   for rel_path in ("top.txt", "dir/keep.txt", "dir/drop.txt", "dir/sub/x.txt",
+                    "pkg/important.tmp", "pkg/other.tmp", "build/keep"):
+       _write(tmp_path, rel_path)
+   model = ua.scan_directory_model(str(tmp_path))
+   assert sorted(model) == [".", "dir", "pkg"]
+   assert model["."]["dirs"] == ["dir", "pkg"]
+   assert model["."]["files"] == ["top.txt"]
+   # Папка из "dir/**" сама не исключена: "!dir/keep.txt" возвращает файл,
+   # а вложенная папка исключена целиком
+   assert model["dir"]["dirs"] == []
+   assert model["dir"]["files"] == ["keep.txt"]
+   # Вложенный .gitignore переопределяет родительский
+   assert model["pkg"]["files"] == ["important.tmp"]
+def test_override_patterns_win(tmp_path):
+   _write(tmp_path, ".gitignore", "!keep.log\n")
+   _write(tmp_path, "keep.log")
+   _write(tmp_path, "other.txt")
+   model = ua.scan_directory_model(str(tmp_path), ignore_patterns=["*.log"])
+   assert model["."]["files"] == ["other.txt"]
@@ -0,0 +1,120 @@
+import os
+import pytest
+import updateArchitecture as ua
+def _native(*paths):
+   return {os.path.join(*path.split("/")) for path in paths}
+@pytest.mark.parametrize("module, lang, files, expected", [
+   # Суффикс сверяется целыми компонентами пути
+   ("re", "python", ["./updateArchitecture.py"], False),
+   ("re", "python", ["./re.py"], True),
+   ("re", "python", ["lib/re.py"], True),
+   ("models.user", "python", ["app/models/user.py"], True),
+   ("models.user", "python", ["app/models/superuser.py"], False),
+   ("express", "js", ["lib/myexpress.js"], False),
+   ("Express", "js", ["lib/express.js"], True),
+   ("Kit", "swift", ["Sources/UIKit.swift"], False),
+   ("Kit", "swift", ["Sources/kit.swift"], True),
+   ("anything", "html", ["anything.html"], False),
+])
+def test_project_has_module(module, lang, files, expected):
+   assert ua.project_has_module(module, lang, ua.ImportIndex(_native(*files))) is expected
+def test_stdlib_import_is_not_a_project_import():
+   lines = ["import re\n", "import helpers\n", "from . import sibling\n"]
+   imports = ua.extract_imports_from_file(lines, "python", _native("./updateArchitecture.py", "./helpers.py"))
+   assert imports == ["helpers", "."]
+PROJECT = [
+   "pkg/__init__.py",
+   "pkg/common.py",
+   "pkg/sub/__init__.py",
+   "pkg/sub/a.py",
+   "pkg/sub/b.py",
+   "app/models/user.py",
+   "legacy/models/user.py",
+   "app/views.py",
+   "web/lib/util.js",
+   "web/lib/widgets/index.js",
+   "web/app.js",
+   "web/helpers.js",
+   "web/lib/helpers.js",
+   "static/app.js",
+   "index.html",
+]
+@pytest.mark.parametrize("module, lang, source, expected", [
+   # Относительные импорты Python: точки – уровни пакетов, пакет – __init__.py
+   (".b", "python", "pkg/sub/a.py", "pkg/sub/b.py"),
+   ("..common", "python", "pkg/sub/a.py", "pkg/common.py"),
+   (".", "python", "pkg/sub/a.py", "pkg/sub/__init__.py"),
+   ("..", "python", "pkg/sub/a.py", "pkg/__init__.py"),
+   (".missing", "python", "pkg/sub/a.py", None),
+   # Абсолютные: от папки файла, от корня, затем по окончанию пути
+   ("b", "python", "pkg/sub/a.py", "pkg/sub/b.py"),
+   ("pkg.common", "python", "app/views.py", "pkg/common.py"),
+   ("pkg.sub", "python", "app/views.py", "pkg/sub/__init__.py"),
+   ("re", "python", "app/views.py", None),
+   # JS: расширение и index.* подставляются, "/" – от корня
+   ("./lib/util", "js", "web/app.js", "web/lib/util.js"),
+   ("./lib/widgets", "js", "web/app.js", "web/lib/widgets/index.js"),
+   ("../app", "js", "web/lib/util.js", "web/app.js"),
+   ("/static/app.js", "js", "web/app.js", "static/app.js"),
+   ("./nothing", "js", "web/app.js", None),
+   # HTML: путь без параметров запроса и якоря
+   ("static/app.js?v=2", "html", "index.html", "static/app.js"),
+   ("/static/app.js#top", "html", "index.html", "static/app.js"),
+])
+def test_resolve(module, lang, source, expected):
+   assert ua.ImportResolver(PROJECT).resolve(module, lang, source) == expected
+@pytest.mark.parametrize("module, lang, source, expected", [
+   # Несколько файлов с тем же окончанием – ближайший к импортирующему
+   ("models.user", "python", "app/views.py", "app/models/user.py"),
+   ("models.user", "python", "legacy/tool.py", "legacy/models/user.py"),
+   ("helpers", "js", "web/lib/util.js", "web/lib/helpers.js"),
+   ("helpers", "js", "web/app.js", "web/helpers.js"),
+   # Равноудалённые кандидаты – первый по пути, результат не зависит от порядка файлов
+   ("models.user", "python", "main.py", "app/models/user.py"),
+])
+def test_resolve_ambiguous_suffix(module, lang, source, expected):
+   assert ua.ImportResolver(PROJECT).resolve(module, lang, source) == expected
+   assert ua.ImportResolver(reversed(PROJECT)).resolve(module, lang, source) == expected
+def _components(nodes, edges):
+   return sorted(sorted(component) for component in ua.strongly_connected_components(nodes, edges))
+def test_scc_multi_node_cycles_and_self_loops():
+   edges = {
+       "a": ["b"],
+       "b": ["c"],
+       "c": ["a", "d"],
+       "d": ["d", "e"],
+       "e": ["f"],
+       "f": ["e", "g"],
+   }
+   nodes = sorted(set(edges) | {"g"})
+   assert _components(nodes, edges) == [["a", "b", "c"], ["d"], ["e", "f"], ["g"]]
+def test_scc_long_cycle_without_recursion():
+   count = 20000
+   nodes = [f"n{i}" for i in range(count)]
+   edges = {nodes[i]: [nodes[(i + 1) % count]] for i in range(count)}
+   components = ua.strongly_connected_components(nodes, edges)
+   assert len(components) == 1 and len(components[0]) == count
+def _element(*imports):
+   return (ua.Element("file_imports", "", imports=imports),)
+def test_dependency_graph_cycles_and_unresolved():
+   files = [
+       ("pkg/sub/a.py", "python", _element(".b", "..common")),
+       ("pkg/sub/b.py", "python", _element(".a", "missing")),
+       ("pkg/common.py", "python", _element("pkg.common")),
+       # "from . import x" в __init__.py указывает на сам файл и не даёт ребра
+       ("pkg/sub/__init__.py", "python", _element(".")),
+   ]
+   graph = ua.build_dependency_graph(files, _native(*PROJECT))
+   assert graph["edges"] == {
+       "pkg/sub/a.py": ["pkg/sub/b.py", "pkg/common.py"],
+       "pkg/sub/b.py": ["pkg/sub/a.py"],
+   }
+   assert graph["reverse"] == {
+       "pkg/common.py": ["pkg/sub/a.py"],
+       "pkg/sub/a.py": ["pkg/sub/b.py"],
+       "pkg/sub/b.py": ["pkg/sub/a.py"],
+   }
+   assert graph["unresolved"] == {"pkg/sub/b.py": ["missing"]}
+   # Самоимпорт pkg/common.py не считается ни ребром, ни циклом
+   assert graph["cycles"] == [["pkg/sub/a.py", "pkg/sub/b.py"]]
+   assert graph["edge_count"] == 3
@@ -0,0 +1,43 @@
+import mmap
+import pytest
+import updateArchitecture as ua
+SOURCES = [
+   b"import os\nclass A:\n    x = 1\n",
+   b"import os\r\nclass A:\r\n    x = 1\r\n",
+   b"import os\rclass A:\r    x = 1",
+   b"\xef\xbb\xbfimport os\r\n\r\nclass A:\n",
+]
+@pytest.mark.parametrize("data", SOURCES)
+def test_source_lines_match_open(tmp_path, data):
+   path = tmp_path / "mod.py"
+   path.write_bytes(data)
+   expected = ua.read_source_lines(str(path))
+   assert ua.read_source_lines(str(path), data) == expected
+   with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+       assert ua.read_source_lines(str(path), buffer) == expected
+       assert ua.read_source_text(str(path), buffer) == "".join(expected)
+def test_undecodable_content_raises(tmp_path):
+   with pytest.raises(UnicodeDecodeError):
+       ua.read_source_text(str(tmp_path / "mod.py"), b"x = '\xff'\n")
+@pytest.mark.parametrize("parser", [ua.parse_python_file, ua.parse_python_file_ast])
+def test_mapped_and_prefetched_entries_match(tmp_path, parser):
+   (tmp_path / "helpers.py").write_text("def helper():\n    pass\n", encoding="utf-8")
+   path = tmp_path / "mod.py"
+   path.write_bytes(b"import helpers\r\nimport os\r\n\r\nclass A:\r\n    def f(self):\r\n        pass\r\n")
+   index = ua.ImportIndex({"./helpers.py", "./mod.py"})
+   mapped = ua.parse_file_entry(parser, "python", str(path), str(tmp_path), index)
+   prefetched = ua.parse_file_entry(parser, "python", str(path), str(tmp_path), index,
+                                    prefetched=ua.read_file_bytes(str(path)))
+   assert mapped == prefetched
+   assert mapped["lines"] == 6
+   assert mapped["lookups"] == ["helpers", "os"]
+   assert mapped["hits"] == ["helpers"]
+   imports = [elem for elem in mapped["elements"] if elem.type == "file_imports"]
+   assert imports[0].imports == ("helpers",)
+def test_empty_file(tmp_path):
+   path = tmp_path / "empty.py"
+   path.write_bytes(b"")
+   entry = ua.parse_file_entry(ua.parse_python_file, "python", str(path), str(tmp_path), ua.ImportIndex(()))
+   assert entry["lines"] == 0
+   assert entry["elements"] == ()
+   assert "skipped" not in entry
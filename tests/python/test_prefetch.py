@@ -0,0 +1,73 @@
+import threading
+import time
+import pytest
+import updateArchitecture as ua
+def _tasks(count, lang="python"):
+   return [{"path": f"file{i}.py", "lang": lang} for i in range(count)]
+def delayed_reader(delays, log=None):
+   """Заменитель read_file_bytes: ждёт delays[путь] секунд и возвращает путь."""
+   lock = threading.Lock()
+   def read(path, max_size):
+       if log is not None:
+           with lock:
+               log.append(path)
+       time.sleep(delays.get(path, 0))
+       return path, max_size
+   return read
+def test_results_in_task_order():
+   tasks = _tasks(20)
+   # Первые файлы читаются дольше всех: готовые раньше результаты ждут своей очереди
+   delays = {task["path"]: 0.02 * (20 - i) / 20 for i, task in enumerate(tasks)}
+   results = list(ua.prefetch_files(tasks, 8, queue_size=8, max_size=123, reader=delayed_reader(delays)))
+   assert [task for task, _ in results] == tasks
+   assert [result for _, result in results] == [(task["path"], 123) for task in tasks]
+def test_reads_in_flight_bounded_by_queue():
+   tasks = _tasks(30)
+   started = []
+   reader = delayed_reader({}, started)
+   most = 0
+   for consumed, (task, result) in enumerate(ua.prefetch_files(tasks, 16, queue_size=4, reader=reader), 1):
+       # Медленный потребитель: потоки успевают прочитать всё, что им разрешено
+       time.sleep(0.01)
+       most = max(most, len(started) - consumed)
+   # Прочитанных или читаемых, но ещё не отданных файлов не больше queue_size
+   assert 1 <= most <= 4
+   assert len(started) == len(tasks)
+def test_binary_files_are_not_read():
+   started = []
+   tasks = _tasks(2) + [{"path": "book.xlsx", "lang": "xlsx"}]
+   results = list(ua.prefetch_files(tasks, 2, reader=delayed_reader({}, started)))
+   assert results[2] == (tasks[2], None)
+   assert sorted(started) == ["file0.py", "file1.py"]
+def test_read_error_falls_back_to_none():
+   def reader(path, max_size):
+       if path == "file1.py":
+           raise FileNotFoundError(path)
+       return path, max_size
+   results = list(ua.prefetch_files(_tasks(3), 2, reader=reader))
+   assert [result for _, result in results] == [("file0.py", ua.MAX_PARSE_FILE_SIZE), None,
+                                               ("file2.py", ua.MAX_PARSE_FILE_SIZE)]
+def test_reader_exception_propagates():
+   def reader(path, max_size):
+       if path == "file2.py":
+           raise RuntimeError("сбой чтения")
+       return path, max_size
+   results = []
+   with pytest.raises(RuntimeError, match="сбой чтения"):
+       for task, result in ua.prefetch_files(_tasks(5), 2, queue_size=2, reader=reader):
+           results.append(task["path"])
+   # Файлы до сбойного успели отдаться по порядку
+   assert results == ["file0.py", "file1.py"]
+def test_parse_files_with_delayed_reader(tmp_path):
+   for i in range(6):
+       (tmp_path / f"mod{i}.py").write_text(f"import mod{(i + 1) % 6}\ndef func{i}():\n    pass\n", encoding="utf-8")
+   model = ua.scan_directory_model(str(tmp_path))
+   index = ua.ImportIndex(ua.collect_project_files(model))
+   tasks = ua.collect_parse_tasks(".", model["."])
+   expected = ua.parse_files(tasks, str(tmp_path), index, {})
+   delays = {task["path"]: 0.01 * (i % 3) for i, task in enumerate(tasks)}
+   def reader(path, max_size):
+       time.sleep(delays[path])
+       return ua.read_file_bytes(path, max_size)
+   entries = ua.parse_files(tasks, str(tmp_path), index, {}, prefetch=3, prefetch_queue=2, reader=reader)
+   assert entries == expected
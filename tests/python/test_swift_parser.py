@@ -0,0 +1,19 @@
+import os
+import updateArchitecture as ua
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+def _parse(name):
+   path = os.path.join(FIXTURES, name)
+   return {elem["name"]: elem for elem in ua.parse_swift_file(path, FIXTURES, set()) if elem["type"] != "file_imports"}
+def test_class_members_are_not_types():
+   elements = _parse("ClassMembers.swift")
+   assert sorted(elements) == ["Model", "Model.Nested", "Point"]
+def test_class_methods_belong_to_their_type():
+   elements = _parse("ClassMembers.swift")
+   assert elements["Model"]["type"] == "class"
+   assert elements["Model"]["description"] == "Модель с членами уровня класса"
+   assert elements["Model"]["methods"] == ["make", "copy", "reset", "update"]
+   assert elements["Model"]["fields"] == ["name", "shared", "count"]
+   assert elements["Model.Nested"]["methods"] == ["inner"]
+   assert elements["Point"]["type"] == "struct"
+   assert elements["Point"]["methods"] == ["zero"]
+   assert elements["Point"]["fields"] == ["x"]
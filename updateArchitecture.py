@@ -2,211 +2,977 @@
 # -*- coding: utf-8 -*-
 """
 Обновлённый скрипт для автоматического обновления ARCHITECTURE.md.
-Поддерживаются файлы: Swift, Python, JavaScript и HTML.
+Поддерживаются файлы: Swift, Python, JavaScript, HTML и книги Excel (.xlsx – листы и их диапазоны).
 Парсинг включает:
  - Извлечение комментариев (однострочных и многострочных) для файлов, классов и функций.
  - Для классов/структур – сохранение списка полей и методов.
  - По файлам и функциям – поиск импортов/подключений к другим файлам проекта.
-Добавлена возможность игнорировать указанные директории и файлы.
+Добавлена возможность игнорировать указанные директории и файлы (имена и glob-шаблоны),
+а также учитываются .gitignore (включая вложенные) и шаблоны --ignore.
+Для использования из других программ: build_architecture(root, ignore_dirs=..., ignore_files=...).
 """
 import os
 import re
+import sys
+import json
+import time
+import hashlib
+import io
 import argparse
+import ast
+import heapq
+import posixpath
+from bisect import bisect_left
+from collections import namedtuple
 # ==============================
 # Параметры командной строки для игнорирования
 # ==============================
-def parse_args():
+def parse_args(argv=None):
    parser = argparse.ArgumentParser(
        description="Обновление ARCHITECTURE.md с извлечением информации о проекте."
    )
+   parser.add_argument(
+       "--root",
+       action="append",
+       metavar="DIR",
+       help="Папка пакета (относительно папки скрипта; можно указывать несколько раз): "
+            "пакеты обрабатываются за один запуск с общими кэшем и индексами, "
+            "у каждого свой ARCHITECTURE.md",
+   )
+   parser.add_argument(
+       "--packages",
+       action="store_true",
+       help="Найти пакеты по файлам " + ", ".join(PACKAGE_MARKERS) + " и обработать их, как --root",
+   )
+   parser.add_argument(
+       "--summary",
+       action="store_true",
+       help="С --root/--packages: записать в ARCHITECTURE.md рядом со скриптом сводку по пакетам",
+   )
    parser.add_argument(
        "--ignore-dir",
        action="append",
-       help="Директория для игнорирования (можно указывать несколько раз)",
+       help="Директория для игнорирования: имя или glob-шаблон, например 'build*' "
+            "(можно указывать несколько раз)",
    )
    parser.add_argument(
        "--ignore-file",
        action="append",
-       help="Файл для игнорирования (можно указывать несколько раз)",
+       help="Файл для игнорирования: имя или glob-шаблон, например '*.min.js' "
+            "(можно указывать несколько раз)",
+   )
+   parser.add_argument(
+       "--ignore",
+       action="append",
+       metavar="PATTERN",
+       help="Шаблон в синтаксисе .gitignore относительно корня проекта, например "
+            "'dist/' или 'src/**/generated' (можно указывать несколько раз); "
+            "совпавшие файлы и папки не показываются и не обходятся",
+   )
+   parser.add_argument(
+       "--no-gitignore",
+       action="store_true",
+       help="Не учитывать файлы .gitignore",
+   )
+   parser.add_argument(
+       "--no-cache",
+       action="store_true",
+       help="Не использовать кэш результатов парсинга (" + CACHE_FILE_NAME + ")",
+   )
+   parser.add_argument(
+       "--no-index",
+       action="store_true",
+       help="Не обновлять индекс символов (" + SYMBOL_INDEX_FILE_NAME + ") для подкоманды query",
+   )
+   parser.add_argument(
+       "--jobs",
+       type=int,
+       default=1,
+       help="Число процессов для парсинга файлов (0 – по числу ядер CPU, по умолчанию 1)",
+   )
+   parser.add_argument(
+       "--prefetch",
+       type=int,
+       default=0,
+       metavar="THREADS",
+       help="Читать файлы впереди парсера в THREADS потоках – для медленных и сетевых "
+            "файловых систем; только с --jobs 1 (по умолчанию 0 – без упреждающего чтения)",
+   )
+   parser.add_argument(
+       "--prefetch-queue",
+       type=int,
+       default=PREFETCH_QUEUE_FILES,
+       metavar="FILES",
+       help="Сколько прочитанных заранее файлов может ждать парсинга "
+            f"(ограничивает память, по умолчанию {PREFETCH_QUEUE_FILES})",
+   )
+   parser.add_argument(
+       "--watch",
+       action="store_true",
+       help="Следить за изменениями и обновлять ARCHITECTURE.md инкрементально",
+   )
+   parser.add_argument(
+       "--interval",
+       type=float,
+       default=1.0,
+       help="Период опроса файловой системы в режиме --watch, секунды (по умолчанию 1.0)",
+   )
+   parser.add_argument(
+       "--debounce",
+       type=float,
+       default=0.5,
+       help="Пауза без изменений перед перегенерацией в режиме --watch, секунды (по умолчанию 0.5)",
+   )
+   parser.add_argument(
+       "--format",
+       choices=("markdown", "json", "jsonl"),
+       default="markdown",
+       help="Формат вывода: markdown – обновить ARCHITECTURE.md (по умолчанию); "
+            "json/jsonl – выгрузить структуру проекта, по записи на файл",
    )
-   return parser.parse_args()
-# Глобальные переменные для игнорируемых директорий и файлов
-ARGS = parse_args()
-IGNORED_DIRS = ARGS.ignore_dir if ARGS.ignore_dir else []
-IGNORED_FILES = ARGS.ignore_file if ARGS.ignore_file else []
+   parser.add_argument(
+       "--output",
+       default="-",
+       help="Файл для выгрузки json/jsonl (по умолчанию stdout)",
+   )
+   parser.add_argument(
+       "--max-file-size",
+       type=int,
+       default=MAX_PARSE_FILE_SIZE,
+       metavar="BYTES",
+       help="Файлы больше этого размера перечисляются, но не парсятся; не относится "
+            "к двоичным форматам вроде .xlsx, которые читаются частично "
+            f"(0 – без ограничения, по умолчанию {MAX_PARSE_FILE_SIZE})",
+   )
+   parser.add_argument(
+       "--tree-depth",
+       type=int,
+       default=0,
+       metavar="N",
+       help="Раскрывать в дереве папок не больше N уровней, содержимое глубже "
+            "сворачивается в строку с числом папок, файлов и их размером (0 – без ограничения)",
+   )
+   parser.add_argument(
+       "--tree-max-files",
+       type=int,
+       default=0,
+       metavar="N",
+       help="Показывать в дереве не больше N файлов каждой папки, остальные – "
+            "строкой \"… ещё файлов: K (M КБ)\" (0 – без ограничения)",
+   )
+   parser.add_argument(
+       "--python-backend",
+       choices=("regex", "ast"),
+       default="regex",
+       help="Парсер Python-файлов: regex – построчный на регулярных выражениях (по умолчанию, быстрее); "
+            "ast – через модули ast/tokenize (вложенные классы, async-функции, поля после методов)",
+   )
+   parser.add_argument(
+       "--fragments-dir",
+       metavar="DIR",
+       help="Писать раздел каждой папки в отдельный файл DIR/<папка>/" + FRAGMENT_FILE_NAME +
+            ", а в ARCHITECTURE.md оставить дерево, ссылки на фрагменты и зависимости",
+   )
+   parser.add_argument(
+       "--check",
+       action="store_true",
+       help="Только проверить по отпечатку (.ARCHITECTURE.md.fingerprint), актуален ли "
+            "ARCHITECTURE.md, не перезаписывая его; код возврата 1, если устарел (для pre-commit)",
+   )
+   parser.add_argument(
+       "--stats",
+       action="store_true",
+       help="Вывести в stderr статистику запуска: время по фазам, распарсенные и взятые "
+            "из кэша файлы, объём чтения, итоги по языкам и самые медленные файлы",
+   )
+   parser.add_argument(
+       "--stats-top",
+       type=int,
+       default=10,
+       help="Сколько самых медленных файлов показывать в --stats (по умолчанию 10)",
+   )
+   parser.add_argument(
+       "--profile",
+       metavar="FILE",
+       help="Сохранить профиль cProfile всего запуска в FILE (смотреть через pstats)",
+   )
+   args = parser.parse_args(argv)
+   if args.watch and args.format != "markdown":
+       parser.error("--watch поддерживает только --format markdown")
+   if args.check and (args.watch or args.format != "markdown"):
+       parser.error("--check несовместим с --watch и --format json/jsonl")
+   if args.fragments_dir and (args.watch or args.format != "markdown"):
+       parser.error("--fragments-dir несовместим с --watch и --format json/jsonl")
+   if args.prefetch and (args.jobs != 1 or args.watch or args.check):
+       parser.error("--prefetch работает только с --jobs 1 и несовместим с --watch и --check")
+   if args.root and args.packages:
+       parser.error("укажите либо --root, либо --packages")
+   if (args.root or args.packages) and (args.watch or args.check or args.fragments_dir
+                                        or args.format != "markdown"):
+       parser.error("--root/--packages несовместимы с --watch, --check, --fragments-dir и --format json/jsonl")
+   if args.summary and not (args.root or args.packages):
+       parser.error("--summary используется только с --root или --packages")
+   return args
+def parse_query_args(argv=None):
+   parser = argparse.ArgumentParser(
+       prog="updateArchitecture.py query",
+       description="Поиск по индексу символов (" + SYMBOL_INDEX_FILE_NAME + "), который "
+                   "обновляется при каждом запуске updateArchitecture.py."
+   )
+   parser.add_argument("name", nargs="?", help="Точное имя класса, функции, поля, метода или экспорта")
+   parser.add_argument("--prefix", help="Символы, имя которых начинается с PREFIX")
+   parser.add_argument("--file", help="Символы, объявленные в файле (путь от корня проекта)")
+   parser.add_argument(
+       "--importers",
+       metavar="TARGET",
+       help="Файлы, импортирующие TARGET: файл проекта (можно без расширения) или имя модуля",
+   )
+   parser.add_argument("--kind", help="Только символы этого вида: class, def, function, field, method, export, ...")
+   parser.add_argument("--limit", type=int, default=50, help="Максимум результатов (0 – без ограничения, по умолчанию 50)")
+   args = parser.parse_args(argv)
+   if args.importers is None and args.name is None and args.prefix is None and args.file is None:
+       parser.error("укажите имя, --prefix, --file или --importers")
+   if args.importers is not None and (args.name or args.prefix or args.file or args.kind):
+       parser.error("--importers не сочетается с поиском символов")
+   return args
+# Файл кэша результатов парсинга (лежит рядом с ARCHITECTURE.md)
+CACHE_FILE_NAME = ".ARCHITECTURE.cache.json"
+CACHE_VERSION = 2
+# Предварительная проверка файла перед парсингом: читаются только первые
+# SNIFF_BYTES байт. Двоичные, минифицированные, сгенерированные файлы
+# и файлы больше MAX_PARSE_FILE_SIZE (--max-file-size) перечисляются
+# в ARCHITECTURE.md, но не парсятся.
+SNIFF_BYTES = 8192
+MAX_PARSE_FILE_SIZE = 2 * 1024 * 1024
+# Минифицированный файл: строка длиннее MINIFIED_MAX_LINE или средняя длина
+# строки больше MINIFIED_AVG_LINE (проверяется, если прочитано не меньше 1 КБ)
+MINIFIED_MAX_LINE = 2000
+MINIFIED_AVG_LINE = 300
+# Сгенерированный файл: метка в первых GENERATED_HEADER_LINES строках
+GENERATED_HEADER_LINES = 5
+GENERATED_MARKER_REGEX = rb'@generated\b|\bDO NOT EDIT\b|\bCode generated\b'
+# Категории пропущенных файлов и их подписи в ARCHITECTURE.md
+SKIP_CATEGORIES = {
+   "binary": "двоичный файл",
+   "undecodable": "не UTF-8",
+   "minified": "минифицирован",
+   "generated": "сгенерирован",
+   "oversized": "слишком большой",
+   "corrupt": "повреждён или имеет другой формат"
+}
 # ==============================
 # Регулярные выражения
 # ------------------------------
-# Swift
-SWIFT_CLASS_REGEX = r'^\s*(class|struct)\s+([A-Za-z0-9_]+)'
-SWIFT_FUNC_REGEX = r'^\s*func\s+([A-Za-z0-9_]+)\('
-SWIFT_FIELD_REGEX = r'^\s*(var|let)\s+([A-Za-z0-9_]+)\s*[:=]'
+# Swift (допускаются атрибуты @... и модификаторы доступа перед объявлением)
+# Ключевые слова объявлений и модификаторы: после "class" они означают
+# член типа ("class func", "class override func", "class private(set) var"),
+# а не объявление класса
+SWIFT_DECL_KEYWORDS = (
+   "func", "var", "let", "subscript", "init", "deinit", "typealias", "static", "class",
+   "override", "final", "required", "convenience", "dynamic", "lazy", "weak", "unowned",
+   "mutating", "nonmutating", "optional", "indirect", "nonisolated", "isolated",
+   "public", "private", "fileprivate", "internal", "open", "package"
+)
+SWIFT_CLASS_REGEX = (
+   r'^\s*(?:@\w+(?:\([^)]*\))?\s+)*(?:(?:public|private|fileprivate|internal|open|final)\s+)*(class|struct)\s+'
+   r'(?!(?:' + '|'.join(SWIFT_DECL_KEYWORDS) + r')\b)([A-Za-z0-9_]+)'
+)
+SWIFT_FUNC_REGEX = r'^\s*(?:@\w+(?:\([^)]*\))?\s+)*(?:(?:public|private|fileprivate|internal|open|final|static|class|override|mutating|nonmutating)\s+)*func\s+([A-Za-z0-9_]+)\s*[<(]'
+SWIFT_FIELD_REGEX = r'^\s*(?:@\w+(?:\([^)]*\))?\s+)*(?:(?:public|private|fileprivate|internal|open|final|static|class|override|lazy|weak|unowned)(?:\([^)]*\))?\s+)*(var|let)\s+([A-Za-z0-9_]+)\s*[:=]'
 SWIFT_DOC_REGEX = r'^\s*///\s*(.*)'
+# Лексемы, влияющие на подсчёт скобок: строки, комментарии и сами скобки
+SWIFT_TOKEN_REGEX = r'"""|"(?:\\.|[^"\\\n])*"|//|/\*|\*/|[{}]'
 # Python
 PYTHON_CLASS_REGEX = r'^\s*class\s+([A-Za-z0-9_]+)\s*(\(|:)'
 PYTHON_FUNC_REGEX = r'^\s*def\s+([A-Za-z0-9_]+)\('
+PYTHON_FIELD_REGEX = r'^\s*([A-Za-z0-9_]+)\s*=\s*.+'
+# Объявление кодировки (PEP 263) – не часть описания файла
+PYTHON_CODING_REGEX = r'^#.*?coding[:=]\s*[-\w.]+'
+# Импорты по языкам: шаблоны над байтами всего файла, скомпилированные один
+# раз при загрузке модуля. Благодаря re.M "^" совпадает с началом каждой
+# строки; [^\S\n] – пробельный символ, кроме перевода строки, чтобы
+# совпадение не переходило на следующую строку.
+# Имя модуля – в последней совпавшей группе.
+IMPORT_REGEXES = {
+   "python": re.compile(
+       rb'^[^\S\n]*(?:import[^\S\n]+([A-Za-z0-9_.]+)|from[^\S\n]+([A-Za-z0-9_.]+)[^\S\n]+import)', re.M),
+   "swift": re.compile(rb'^[^\S\n]*import[^\S\n]+([A-Za-z0-9_]+)', re.M),
+   "js": re.compile(rb'^[^\S\n]*(?:import[^\S\n]+.*[^\S\n]+from[^\S\n]+[\'"](.+?)[\'"]'
+                    rb'|(?:const|let|var)[^\S\n]+.*=[^\S\n]+require\([\'"](.+?)[\'"]\))', re.M),
+   "html": re.compile(rb'<script[^\S\n]+[^>\n]*src=["\'](.+?)["\']|<link[^\S\n]+[^>\n]*href=["\'](.+?)["\']',
+                      re.I),
+}
 # JavaScript
-JS_CLASS_REGEX = r'^\s*class\s+([A-Za-z0-9_]+)\s*(?:extends\s+[A-Za-z0-9_]+\s*)?{'
-JS_FUNC_REGEX = r'^\s*function\s+([A-Za-z0-9_]+)\s*\('
-# Обновлённый шаблон для методов: исключаем зарезервированные слова (if, for, while, switch, catch, function)
-JS_METHOD_REGEX = r'^\s*(?!if\b|for\b|while\b|switch\b|catch\b|function\b)([A-Za-z_$][A-Za-z0-9_$]*)\s*\([^)]*\)\s*{'
-JS_FIELD_REGEX = r'^\s*([A-Za-z0-9_]+)\s*=\s*.+;'
+JS_IDENT = r'[A-Za-z_$][A-Za-z0-9_$]*'
+# Объявления в начале строки (с необязательным export / export default):
+# классы, функции (в т.ч. async и генераторы) и константы со стрелочными функциями
+JS_DECL_REGEX = (
+   r'^\s*(?:export\s+(?:default\s+)?)?(?:'
+   r'class\s+(?P<cls>' + JS_IDENT + r')\b'
+   r'|(?:async\s+)?function\s*\*?\s*(?P<func>' + JS_IDENT + r')\s*\('
+   r'|(?:const|let|var)\s+(?P<arrow>' + JS_IDENT + r')\s*=\s*(?:async\s+)?'
+   r'(?:function\b|\([^()]*\)\s*=>|' + JS_IDENT + r'\s*=>))'
+)
+# Члены тела класса: методы (исключаем зарезервированные слова) и поля
+JS_METHOD_REGEX = (
+   r'^\s*(?:(?:static|async|get|set)\s+)*\*?\s*'
+   r'(?!(?:if|for|while|switch|catch|function|return)\b)(?P<name>#?' + JS_IDENT + r')\s*\('
+)
+JS_FIELD_REGEX = r'^\s*(?:static\s+)?(?P<name>#?' + JS_IDENT + r')\s*(?:=(?![=>])|;)'
+JS_THIS_FIELD_REGEX = r'\bthis\.(' + JS_IDENT + r')\s*=(?![=>])'
+# Экспорт
+JS_MODULE_EXPORTS_REGEX = r'^\s*module\.exports\s*=\s*(?P<value>.*)$'
+JS_NAMED_EXPORT_REGEX = r'^\s*(?:module\.)?exports\.(?P<name>' + JS_IDENT + r')\s*=(?!=)'
+JS_ES_EXPORT_REGEX = (
+   r'^\s*export\s+(?P<default>default\s+)?(?:(?:async\s+)?function\s*\*?\s*|class\s+|const\s+|let\s+|var\s+)?'
+   r'(?P<name>' + JS_IDENT + r')?'
+)
+JS_ES_EXPORT_LIST_REGEX = r'^\s*export\s*\{(?P<names>[^}]*)\}'
+# Лексемы, влияющие на состояние сканера: строки, начало шаблона, комментарии,
+# возможный литерал регулярного выражения и фигурные скобки
+JS_TOKEN_REGEX = r'"(?:\\.|[^"\\\n])*"|' + r"'(?:\\.|[^'\\\n])*'" + r'|`|//|/\*|/|[{}]'
+JS_TEMPLATE_REGEX = r'\\.|`|\$\{'
+JS_REGEX_LITERAL_REGEX = r'/(?![*/])(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/[A-Za-z]*'
+# После этих слов "/" начинает регулярное выражение, а не деление
+JS_REGEX_KEYWORDS = frozenset((
+   "return", "typeof", "case", "do", "else", "in", "of", "new",
+   "delete", "void", "throw", "yield", "await", "instanceof"
+))
+# ==============================
+# Компактные записи элементов
+# ==============================
+# Парсеры возвращают словари; при сохранении результата они переводятся
+# в кортежи (namedtuple), чтобы элементы всех файлов проекта не держали
+# в памяти по словарю на объект. В JSON-кэше записи хранятся списками.
+# type – "class", "struct", "def", "function", "file_comment", "file_imports",
+# "exports", "html"; fields, imports и exports – кортежи строк;
+# methods – кортеж Method (или строк – имён методов без описания).
+Element = namedtuple(
+   "Element",
+   ("type", "name", "description", "fields", "methods", "imports", "exports"),
+   defaults=("", (), (), (), ())
+)
+Method = namedtuple("Method", ("name", "description"), defaults=("",))
+# Сведения о файле в разделе папки; skipped – категория из SKIP_CATEGORIES
+FileDetail = namedtuple("FileDetail", ("filename", "lang", "elements", "skipped"), defaults=(None,))
+def _compact_method(method):
+   if isinstance(method, str):
+       return method
+   if isinstance(method, dict):
+       return Method(method.get("name", ""), method.get("description", ""))
+   return Method(*method)
+def compact_element(elem):
+   """Element из словаря парсера или из списка, прочитанного из кэша."""
+   if isinstance(elem, Element):
+       return elem
+   if isinstance(elem, dict):
+       return Element(
+           elem.get("type", ""),
+           elem.get("name", ""),
+           elem.get("description", ""),
+           tuple(elem.get("fields", ())),
+           tuple(_compact_method(m) for m in elem.get("methods", ())),
+           tuple(elem.get("imports", ())),
+           tuple(elem.get("exports", ()))
+       )
+   elem_type, name, description, fields, methods, imports, exports = elem
+   return Element(elem_type, name, description, tuple(fields),
+                  tuple(_compact_method(m) for m in methods), tuple(imports), tuple(exports))
+def compact_elements(elements):
+   """Кортеж Element для списка элементов файла."""
+   return tuple(compact_element(elem) for elem in elements)
+def _cached_elements(rows):
+   """
+   Кортеж Element из строк кэша: каждая строка – поля Element по порядку
+   (так их записывает json.dumps), поэтому разбор словарей, как
+   в compact_element, не нужен.
+   """
+   return tuple(
+       Element(elem_type, name, description, tuple(fields),
+               tuple([m if m.__class__ is str else Method._make(m) for m in methods]) if methods else (),
+               tuple(imports), tuple(exports))
+       for elem_type, name, description, fields, methods, imports, exports in rows
+   )
+# ==============================
+# Реестр парсеров
+# ==============================
+# Расширение -> (язык, парсер). Парсер задаётся функцией или строкой:
+# "имя" – функция этого модуля, "пакет.модуль:имя" – функция другого модуля.
+# Строки разрешаются при первом обращении, поэтому парсеры, которые
+# не понадобились в проекте, не загружаются.
+PARSER_REGISTRY = {
+   ".swift": ("swift", "parse_swift_file"),
+   ".py": ("python", "parse_python_file"),
+   ".js": ("js", "parse_js_file"),
+   ".html": ("html", "parse_html_file"),
+   ".xlsx": ("xlsx", "parse_xlsx_file"),
+}
+# Языки двоичных форматов: их парсеры сами читают нужные части файла, поэтому
+# такие файлы не проверяются sniff_file, не ограничиваются по размеру
+# и не читаются целиком для хеша, подсчёта строк и поиска импортов
+BINARY_LANGS = {"xlsx"}
+def register_parser(extension, lang, parser, binary=False):
+   """
+   Регистрирует парсер для расширения файла (например, ".ts").
+   Парсер вызывается как parser(file_path, root_dir, project_files)
+   и возвращает список элементов. Если он принимает аргумент content,
+   ему передаётся содержимое файла, уже открытого при разборе: bytes при
+   --prefetch, иначе mmap, действующий только до возврата из парсера
+   (встроенные парсеры декодируют его через read_source_text
+   и read_source_lines), а если аргумент modules –
+   уже найденные в файле пары (module, is_local) (см. _iter_import_matches;
+   встроенные парсеры передают их в extract_imports_from_path), и файл
+   не открывается и не просматривается повторно. Чтобы файл считался пропущенным,
+   парсер может выбросить SkipFile. binary=True – двоичный формат
+   (см. BINARY_LANGS).
+   """
+   PARSER_REGISTRY[extension.lower()] = (lang, parser)
+   if binary:
+       BINARY_LANGS.add(lang)
+def get_parser(file_name):
+   """
+   Возвращает (язык, функция-парсер) для файла или None, если парсер
+   для его расширения не зарегистрирован.
+   """
+   ext = os.path.splitext(file_name)[1].lower()
+   spec = PARSER_REGISTRY.get(ext)
+   if spec is None:
+       return None
+   lang, parser = spec
+   if isinstance(parser, str):
+       module_name, _, attr = parser.rpartition(":")
+       if module_name:
+           import importlib
+           parser = getattr(importlib.import_module(module_name), attr)
+       else:
+           parser = globals()[attr]
+       PARSER_REGISTRY[ext] = (lang, parser)
+   return lang, parser
 # ==============================
 # Вспомогательная функция для поиска импортов
 # ==============================
+def _iter_import_matches(buffer, lang):
+   """
+   Перебирает импорты/подключения в байтах файла (bytes или mmap) для
+   указанного языка: регулярные выражения из IMPORT_REGEXES применяются
+   ко всему буферу, декодируются только найденные имена модулей.
+   Возвращает пары (module, is_local): is_local означает относительный путь,
+   который не нужно сверять со списком файлов проекта.
+   """
+   pattern = IMPORT_REGEXES.get(lang)
+   if pattern is None:
+       return
+   for m in pattern.finditer(buffer):
+       module = m.group(m.lastindex).decode("utf-8", "replace")
+       if lang == "python":
+           yield module, module.startswith('.')
+       elif lang == "swift":
+           yield module, False
+       elif lang == "js":
+           yield module, module.startswith('.') or module.startswith('/')
+       elif not (module.startswith("http://") or module.startswith("https://") or module.startswith("//")):
+           yield module, True
+def _iter_import_modules(lines, lang):
+   """
+   Импорты/подключения в уже прочитанных строках файла
+   (см. _iter_import_matches).
+   """
+   return _iter_import_matches("".join(lines).encode("utf-8"), lang)
+def _map_file(f):
+   """Отображение открытого файла в память только для чтения (None для пустого файла)."""
+   import mmap
+   try:
+       return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+   except ValueError:
+       return None
+def file_import_modules(file_path, lang):
+   """
+   Список пар (module, is_local) для файла: файл отображается в память
+   через mmap и не декодируется и не делится на строки целиком.
+   """
+   with open(file_path, "rb") as f:
+       buffer = _map_file(f)
+       if buffer is None:
+           return []
+       with buffer:
+           return list(_iter_import_matches(buffer, lang))
+class ImportIndex:
+   """
+   Индекс файлов проекта для сопоставления неотносительных импортов:
+   есть ли файл, путь которого оканчивается на суффикс целыми компонентами
+   пути (как ImportResolver: "re.py" – это "re.py" или ".../re.py", но не
+   "updateArchitecture.py"). Пути с os.sep в начале хранятся перевёрнутыми
+   в отсортированных списках, поэтому проверка суффикса сводится
+   к бинарному поиску, а повторные запросы берутся из memo.
+   Строится один раз за запуск.
+   """
+   __slots__ = ("_reversed", "_reversed_lower", "_memo")
+   def __init__(self, project_files):
+       self._reversed = sorted((os.sep + pf)[::-1] for pf in project_files)
+       self._reversed_lower = sorted((os.sep + pf.lower())[::-1] for pf in project_files)
+       self._memo = {}
+   def has_suffix(self, suffix, ignore_case=False):
+       """
+       Есть ли файл проекта, путь которого оканчивается на os.sep + suffix
+       (при ignore_case сравнение идёт по pf.lower(), suffix должен быть в нижнем регистре).
+       """
+       key = (suffix, ignore_case)
+       found = self._memo.get(key)
+       if found is None:
+           reversed_paths = self._reversed_lower if ignore_case else self._reversed
+           reversed_suffix = (os.sep + suffix)[::-1]
+           i = bisect_left(reversed_paths, reversed_suffix)
+           found = i < len(reversed_paths) and reversed_paths[i].startswith(reversed_suffix)
+           self._memo[key] = found
+       return found
+def _as_import_index(project_files):
+   """Принимает множество файлов проекта или готовый ImportIndex."""
+   if isinstance(project_files, ImportIndex):
+       return project_files
+   return ImportIndex(project_files)
+def project_has_module(module, lang, project_files):
+   """
+   Проверяет по эвристике, соответствует ли неотносительный импорт
+   какому-либо файлу проекта. project_files – ImportIndex (или множество путей).
+   """
+   index = _as_import_index(project_files)
+   if lang == "python":
+       return (index.has_suffix(module.replace('.', os.sep) + ".py")
+               or index.has_suffix(module + ".py"))
+   if lang == "swift":
+       return index.has_suffix(module.lower() + ".swift", ignore_case=True)
+   if lang == "js":
+       return index.has_suffix(module.lower() + ".js", ignore_case=True)
+   return False
+def _filter_imports(modules, lang, project_files):
+   imports = []
+   index = _as_import_index(project_files)
+   for module, is_local in modules:
+       if is_local or project_has_module(module, lang, index):
+           imports.append(module)
+   return list(dict.fromkeys(imports))  # Убираем дубли, сохраняя порядок
 def extract_imports_from_file(lines, lang, project_files):
    """
    Извлекает строки импортов/подключений из переданных строк файла
    для указанного языка. Фильтрует только те импорты, которые, по
    эвристике, относятся к файлам проекта.
    """
-   imports = []
-   if lang == "python":
-       import_regex = re.compile(r'^\s*(import\s+([A-Za-z0-9_\.]+)|from\s+([A-Za-z0-9_\.]+)\s+import)')
-       for line in lines:
-           m = import_regex.match(line)
-           if m:
-               module = m.group(2) or m.group(3)
-               # Если относительный импорт или если по имени найден файл
-               if module.startswith('.'):
-                   imports.append(module)
-               else:
-                   for pf in project_files:
-                       if pf.endswith(module.replace('.', os.sep) + ".py") or pf.endswith(module + ".py"):
-                           imports.append(module)
-                           break
-   elif lang == "swift":
-       import_regex = re.compile(r'^\s*import\s+([A-Za-z0-9_]+)')
-       for line in lines:
-           m = import_regex.match(line)
-           if m:
-               module = m.group(1)
-               for pf in project_files:
-                   if pf.lower().endswith(module.lower() + ".swift"):
-                       imports.append(module)
-                       break
-   elif lang == "js":
-       import_regex = re.compile(r'^\s*import\s+.*\s+from\s+[\'"](.+?)[\'"]')
-       require_regex = re.compile(r'^\s*(?:const|let|var)\s+.*=\s+require\([\'"](.+?)[\'"]\)')
-       for line in lines:
-           m = import_regex.match(line)
-           if m:
-               module = m.group(1)
-               if module.startswith('.') or module.startswith('/'):
-                   imports.append(module)
+   return _filter_imports(_iter_import_modules(lines, lang), lang, project_files)
+def extract_imports_from_path(file_path, lang, project_files, content=None, modules=None):
+   """
+   То же, что extract_imports_from_file, но читает файл сам через mmap
+   (см. file_import_modules), не создавая список строк. Если передан content
+   (байты файла, прочитанные заранее), поиск идёт по нему; если переданы
+   modules (пары из _iter_import_matches, найденные заранее) – файл
+   не просматривается совсем.
+   """
+   if modules is not None:
+       return _filter_imports(modules, lang, project_files)
+   if content is not None:
+       return _filter_imports(list(_iter_import_matches(content, lang)), lang, project_files)
+   return _filter_imports(file_import_modules(file_path, lang), lang, project_files)
+def read_source_text(file_path, content=None):
+   """
+   Текст файла так же, как при open(file_path, 'r', encoding='utf-8'):
+   из content (bytes или mmap – декодируется прямо из буфера, без копии)
+   или с диска. Переводы строк "\r\n" и "\r" заменяются на "\n", как в open().
+   """
+   if content is None:
+       with open(file_path, 'r', encoding='utf-8') as f:
+           return f.read()
+   text = str(content, 'utf-8')
+   if "\r" in text:
+       text = text.replace("\r\n", "\n").replace("\r", "\n")
+   return text
+def read_source_lines(file_path, content=None):
+   """Строки файла, как readlines() (см. read_source_text)."""
+   if content is None:
+       with open(file_path, 'r', encoding='utf-8') as f:
+           return f.readlines()
+   return io.StringIO(read_source_text(file_path, content)).readlines()
+# ==============================
+# Правила игнорирования (.gitignore и шаблоны)
+# ==============================
+GITIGNORE_FILE_NAME = ".gitignore"
+def _gitignore_regex(pattern):
+   """
+   Переводит шаблон .gitignore (без "!" и завершающего "/") в регулярное
+   выражение для пути относительно папки, где лежит .gitignore.
+   Шаблон без "/" совпадает с именем на любой глубине, с "/" – привязан к папке.
+   """
+   anchored = "/" in pattern
+   pattern = pattern[1:] if pattern.startswith("/") else pattern
+   out = []
+   i = 0
+   n = len(pattern)
+   while i < n:
+       c = pattern[i]
+       if c == "*":
+           if pattern.startswith("**", i) and (i == 0 or pattern[i - 1] == "/"):
+               if i + 2 == n:
+                   # "dir/**" – всё внутри папки, но не сама папка: git заходит
+                   # в неё, и "!dir/файл" возвращает отдельные файлы
+                   out.append(".+")
+                   i += 2
+                   continue
+               if pattern[i + 2] == "/":
+                   out.append("(?:.*/)?")  # "**/" – любое число папок
+                   i += 3
+                   continue
+           while i + 1 < n and pattern[i + 1] == "*":
+               i += 1
+           out.append("[^/]*")
+       elif c == "?":
+           out.append("[^/]")
+       elif c == "[":
+           j = pattern.find("]", i + 2)
+           if j == -1:
+               out.append(re.escape(c))
+           else:
+               body = pattern[i + 1:j]
+               if body[0] in "!^":
+                   body = "^" + body[1:]
+               out.append("[" + body.replace("\\", "\\\\") + "]")
+               i = j
+       elif c == "\\" and i + 1 < n:
+           i += 1
+           out.append(re.escape(pattern[i]))
+       else:
+           out.append(re.escape(c))
+       i += 1
+   body = "".join(out)
+   return body if anchored else "(?:.*/)?" + body
+class IgnoreRules:
+   """
+   Шаблоны в синтаксисе .gitignore (комментарии, "!", "/" в начале и в конце,
+   "*", "?", "[...]", "**"), скомпилированные в одно регулярное выражение.
+   Шаблоны идут в нём в обратном порядке, поэтому первая совпавшая
+   альтернатива – последний подходящий шаблон, как в git.
+   """
+   __slots__ = ("_regex", "_negated")
+   def __init__(self, patterns):
+       alternatives = []
+       negated = []
+       for line in patterns:
+           line = line.rstrip("\r\n")
+           if not line or line.startswith("#"):
+               continue
+           # Пробелы в конце игнорируются, если не экранированы
+           if not line.endswith("\\ "):
+               line = line.rstrip(" ")
+           is_negated = line.startswith("!")
+           if is_negated or line.startswith(("\\!", "\\#")):
+               line = line[1:]
+           dir_only = line.endswith("/")
+           line = line.rstrip("/")
+           if not line:
+               continue
+           # Путь папки сверяется с завершающим "/", поэтому шаблоны
+           # вида "build/" не совпадают с файлами
+           alternatives.append("(" + _gitignore_regex(line) + ("/" if dir_only else "/?") + ")")
+           negated.append(is_negated)
+       alternatives.reverse()
+       negated.reverse()
+       self._regex = re.compile("|".join(alternatives)) if alternatives else None
+       self._negated = negated
+   def __bool__(self):
+       return self._regex is not None
+   def match(self, rel_path, is_dir):
+       """
+       True – путь (через "/", относительно папки правил) игнорируется,
+       False – явно возвращён шаблоном "!", None – ни один шаблон не подошёл.
+       """
+       if self._regex is None:
+           return None
+       m = self._regex.fullmatch(rel_path + "/" if is_dir else rel_path)
+       if m is None:
+           return None
+       return not self._negated[m.lastindex - 1]
+def load_gitignore(dir_path):
+   """Правила из .gitignore папки dir_path или None, если файла нет или он пуст."""
+   try:
+       with open(os.path.join(dir_path, GITIGNORE_FILE_NAME), "r", encoding="utf-8", errors="replace") as f:
+           rules = IgnoreRules(f)
+   except OSError:
+       return None
+   return rules or None
+def _compile_name_patterns(names):
+   """
+   Имена или glob-шаблоны (fnmatch) для --ignore-dir/--ignore-file,
+   объединённые в одно регулярное выражение; None, если список пуст.
+   """
+   import fnmatch
+   names = list(names)
+   if not names:
+       return None
+   return re.compile("|".join("(?:" + fnmatch.translate(name) + ")" for name in names))
+def _is_ignored(scopes, rel_path, is_dir, override=None):
+   """
+   Проверяет путь (через "/", относительно корня) по цепочке правил:
+   scopes – список (префикс папки, IgnoreRules) от корня вглубь.
+   Решает самое глубокое совпадение: вложенный .gitignore переопределяет
+   родительский. Правила override (шаблоны --ignore) важнее любого .gitignore.
+   """
+   if override is not None:
+       result = override.match(rel_path, is_dir)
+       if result is not None:
+           return result
+   for prefix, rules in reversed(scopes):
+       if prefix:
+           if not rel_path.startswith(prefix):
+               continue
+           sub_path = rel_path[len(prefix):]
+       else:
+           sub_path = rel_path
+       result = rules.match(sub_path, is_dir)
+       if result is not None:
+           return result
+   return False
+# ==============================
+# Модель файловой системы
+# ==============================
+def scan_directory_model(root_dir, ignore_dirs=(), ignore_files=(), with_stats=False,
+                         ignore_patterns=(), use_gitignore=True):
+   """
+   Один обход дерева проекта через os.scandir. Тип записи берётся из
+   DirEntry без дополнительных вызовов stat. Возвращает словарь
+   {относительный путь папки: {"path", "dirs", "files", "ignored_dirs", "ignored_files"}},
+   где списки отсортированы, скрытые записи исключены, а игнорируемые
+   директории не раскрываются. Из этой модели строятся множество файлов
+   проекта, списки файлов по папкам и дерево папок.
+   ignore_dirs/ignore_files – имена или glob-шаблоны: такие записи попадают
+   в "ignored_dirs"/"ignored_files" (в дереве папка показывается свёрнутой).
+   Записи, исключённые файлами .gitignore (в том числе вложенными; при
+   use_gitignore) и шаблонами ignore_patterns в синтаксисе .gitignore,
+   в модель не попадают вовсе; в исключённые папки обход не заходит.
+   При with_stats для каждой папки добавляется "stats": {имя файла: (mtime_ns, размер)}
+   по неигнорируемым файлам.
+   """
+   dir_regex = _compile_name_patterns(ignore_dirs)
+   file_regex = _compile_name_patterns(ignore_files)
+   override = IgnoreRules(ignore_patterns) or None
+   model = {}
+   stack = [(".", root_dir, [])]
+   while stack:
+       rel_path, current_path, scopes = stack.pop()
+       dirs, files, ignored_dirs, ignored_files = [], [], [], []
+       stats = {}
+       try:
+           with os.scandir(current_path) as it:
+               entries = list(it)
+       except OSError:
+           continue
+       prefix = "" if rel_path == "." else rel_path.replace(os.sep, "/") + "/"
+       if use_gitignore and any(entry.name == GITIGNORE_FILE_NAME for entry in entries):
+           rules = load_gitignore(current_path)
+           if rules is not None:
+               scopes = scopes + [(prefix, rules)]
+       check_rules = override is not None or bool(scopes)
+       for entry in entries:
+           name = entry.name
+           if name.startswith('.'):
+               continue
+           try:
+               is_dir = entry.is_dir()
+           except OSError:
+               is_dir = False
+           if check_rules and _is_ignored(scopes, prefix + name, is_dir, override):
+               continue
+           if is_dir:
+               if dir_regex is not None and dir_regex.match(name):
+                   ignored_dirs.append(name)
                else:
-                   for pf in project_files:
-                       if pf.lower().endswith(module.lower() + ".js"):
-                           imports.append(module)
-                           break
+                   dirs.append(name)
+                   # Как и os.walk, не заходим в символические ссылки на папки
+                   if not entry.is_symlink():
+                       child_rel = name if rel_path == "." else os.path.join(rel_path, name)
+                       stack.append((child_rel, entry.path, scopes))
+           elif file_regex is not None and file_regex.match(name):
+               ignored_files.append(name)
            else:
-               m = require_regex.match(line)
-               if m:
-                   module = m.group(1)
-                   if module.startswith('.') or module.startswith('/'):
-                       imports.append(module)
-                   else:
-                       for pf in project_files:
-                           if pf.lower().endswith(module.lower() + ".js"):
-                               imports.append(module)
-                               break
-   elif lang == "html":
-       script_regex = re.compile(r'<script\s+[^>]*src=["\'](.+?)["\']', re.IGNORECASE)
-       link_regex = re.compile(r'<link\s+[^>]*href=["\'](.+?)["\']', re.IGNORECASE)
-       for line in lines:
-           m = script_regex.search(line)
-           if m:
-               src = m.group(1)
-               if not (src.startswith("http://") or src.startswith("https://") or src.startswith("//")):
-                   imports.append(src)
-           m = link_regex.search(line)
-           if m:
-               href = m.group(1)
-               if not (href.startswith("http://") or href.startswith("https://") or href.startswith("//")):
-                   imports.append(href)
-   return list(set(imports))  # Убираем дубли
+               files.append(name)
+               if with_stats:
+                   try:
+                       st = entry.stat()
+                       stats[name] = (st.st_mtime_ns, st.st_size)
+                   except OSError:
+                       pass
+       model[rel_path] = {
+           "path": current_path,
+           "dirs": sorted(dirs),
+           "files": sorted(files),
+           "ignored_dirs": sorted(ignored_dirs),
+           "ignored_files": sorted(ignored_files)
+       }
+       if with_stats:
+           model[rel_path]["stats"] = stats
+   return model
 # ==============================
 # Функция генерации дерева папок
 # ==============================
-def generate_directory_tree(root_dir):
+def _file_sizes(folder, names):
+   """Суммарный размер файлов names папки модели: из "stats", иначе через os.stat."""
+   stats = folder.get("stats") or {}
+   total = 0
+   for name in names:
+       stat = stats.get(name)
+       if stat is not None:
+           total += stat[1]
+           continue
+       try:
+           total += os.stat(os.path.join(folder["path"], name)).st_size
+       except OSError:
+           pass
+   return total
+def _subtree_totals(model, rel_path):
+   """(папок, файлов, байт) во всём поддереве папки rel_path по модели (без рекурсии)."""
+   dirs = files = size = 0
+   stack = [rel_path]
+   while stack:
+       current = stack.pop()
+       folder = model.get(current)
+       if folder is None:
+           continue
+       names = folder["files"] + folder["ignored_files"]
+       dirs += len(folder["dirs"]) + len(folder["ignored_dirs"])
+       files += len(names)
+       size += _file_sizes(folder, names)
+       stack.extend(name if current == "." else os.path.join(current, name) for name in folder["dirs"])
+   return dirs, files, size
+def _collapsed_label(files, size, dirs=0, more=False):
+   """Подпись свёрнутых записей: "… ещё файлов: N (M КБ)" или "… папок: D, файлов: N (M КБ)"."""
+   counts = f"папок: {dirs}, файлов: {files}" if dirs else f"файлов: {files}"
+   return f"… {'ещё ' if more else ''}{counts} ({(size + 1023) // 1024} КБ)"
+def _tree_rows(model, rel_path, prefix, depth, max_depth, max_files):
+   """
+   Строки дерева для содержимого папки rel_path: пары (строка, папка для
+   раскрытия или None). Вложенные папки раскрывает вызывающий код
+   (generate_directory_tree), поэтому глубина дерева не ограничена стеком вызовов.
+   """
+   folder = model.get(rel_path)
+   if folder is None:
+       return
+   ignored = set(folder["ignored_dirs"])
+   subdirs = ignored.union(folder["dirs"])
+   entries = sorted(folder["dirs"] + folder["ignored_dirs"] + folder["files"] + folder["ignored_files"])
+   hidden = ()
+   if max_files:
+       # ARCHITECTURE.md не сворачивается: его размер меняется при каждой записи,
+       # и подпись с размером никогда не совпала бы с только что записанной
+       file_names = [entry for entry in entries if entry not in subdirs and entry != "ARCHITECTURE.md"]
+       if len(file_names) > max_files:
+           hidden = file_names[max_files:]
+           hidden_set = set(hidden)
+           entries = [entry for entry in entries if entry not in hidden_set]
+   entries_count = len(entries) + (1 if hidden else 0)
+   for idx, entry in enumerate(entries):
+       last = idx == entries_count - 1
+       connector = "└── " if last else "├── "
+       if entry not in subdirs:
+           yield prefix + connector + entry, None
+           continue
+       extension = prefix + ("    " if last else "│   ")
+       child = entry if rel_path == "." else os.path.join(rel_path, entry)
+       if entry in ignored:
+           # Если директория игнорируется, вместо содержимого выводим "..."
+           yield prefix + connector + entry + "/", None
+           yield extension + "└── ...", None
+       elif max_depth and depth >= max_depth:
+           dirs, files, size = _subtree_totals(model, child)
+           yield prefix + connector + entry + "/", None
+           if dirs or files:
+               yield extension + "└── " + _collapsed_label(files, size, dirs), None
+       else:
+           yield prefix + connector + entry + "/", (child, extension, depth + 1)
+   if hidden:
+       yield prefix + "└── " + _collapsed_label(len(hidden), _file_sizes(folder, hidden), more=True), None
+def generate_directory_tree(root_dir, model=None, ignore_dirs=(), ignore_files=(),
+                            ignore_patterns=(), use_gitignore=True, max_depth=0, max_files=0):
    """
-   Рекурсивно генерирует строковое представление структуры папок
+   Генерирует строковое представление структуры папок
    в виде дерева, аналогичного выводу команды tree.
-   Если директория указана в IGNORED_DIRS, то ее содержимое не раскрывается,
+   Если директория указана в ignore_dirs, то ее содержимое не раскрывается,
    а отображается как "└── ..." в дереве.
+   Дерево строится по модели из scan_directory_model; если она не передана,
+   выполняется новый обход (исключённые .gitignore и ignore_patterns папки
+   отсекаются ещё при обходе).
+   max_depth – сколько уровней папок раскрывать (0 – все): содержимое более
+   глубоких папок сворачивается в "… папок: D, файлов: N (M КБ)".
+   max_files – сколько файлов показывать в одной папке (0 – все), остальные
+   сворачиваются в "… ещё файлов: N (M КБ)"; вложенные папки и ARCHITECTURE.md
+   показываются всегда.
+   Размеры берутся из "stats" модели (with_stats), иначе через os.stat.
+   Папки обходятся стеком генераторов без рекурсии.
    """
-   tree_lines = []
-   def _tree(current_dir, prefix=""):
-       try:
-           entries = sorted(os.listdir(current_dir))
-       except PermissionError:
-           return
-       # Исключаем скрытые файлы/директории
-       entries = [e for e in entries if not e.startswith('.')]
-       entries_count = len(entries)
-       for idx, entry in enumerate(entries):
-           path = os.path.join(current_dir, entry)
-           connector = "└── " if idx == entries_count - 1 else "├── "
-           if os.path.isdir(path):
-               # Если директория игнорируется, показываем её и вместо содержимого выводим "..."
-               if entry in IGNORED_DIRS:
-                   tree_lines.append(prefix + connector + entry + "/")
-                   extension = "    " if idx == entries_count - 1 else "│   "
-                   tree_lines.append(prefix + extension + "└── ...")
-               else:
-                   tree_lines.append(prefix + connector + entry + "/")
-                   extension = "    " if idx == entries_count - 1 else "│   "
-                   _tree(path, prefix + extension)
-           else:
-               tree_lines.append(prefix + connector + entry)
-   tree_lines.append(os.path.basename(root_dir) + "/")
-   _tree(root_dir)
+   if model is None:
+       model = scan_directory_model(root_dir, ignore_dirs, ignore_files,
+                                    ignore_patterns=ignore_patterns, use_gitignore=use_gitignore)
+   tree_lines = [os.path.basename(root_dir) + "/"]
+   stack = [_tree_rows(model, ".", "", 1, max_depth, max_files)]
+   while stack:
+       for line, child in stack[-1]:
+           tree_lines.append(line)
+           if child is not None:
+               stack.append(_tree_rows(model, *child, max_depth, max_files))
+               break
+       else:
+           stack.pop()
    return "\n".join(tree_lines)
 # ==============================
 # Обновлённый парсер Python-файлов
 # ==============================
-def parse_python_file(file_path, root_dir, project_files):
+def _py_doc_block(stripped, j, end):
+   """
+   Docstring или блок #-комментариев, начинающийся со строки j (строки уже
+   очищены strip()). Возвращает (описание, индекс строки после блока);
+   если блока нет, индекс не меняется.
+   """
+   if j >= end:
+       return "", j
+   s = stripped[j]
+   if s.startswith('"""') or s.startswith("'''"):
+       delimiter = s[:3]
+       if s.count(delimiter) >= 2 and len(s) > 6:
+           return s.strip(delimiter).strip(), j + 1
+       doc_lines = []
+       j += 1
+       while j < end and delimiter not in stripped[j]:
+           doc_lines.append(stripped[j])
+           j += 1
+       if j < end:
+           last_line = stripped[j].replace(delimiter, "").strip()
+           if last_line:
+               doc_lines.append(last_line)
+           j += 1
+       return " ".join(doc_lines), j
+   if s.startswith("#"):
+       comment_lines = []
+       while j < end and stripped[j].startswith("#"):
+           comment_lines.append(stripped[j][1:].strip())
+           j += 1
+       return " ".join(comment_lines), j
+   return "", j
+def parse_python_file(file_path, root_dir, project_files, content=None, modules=None):
    """
    Парсит Python-файл: ищет классы и функции, для классов дополнительно
    извлекает поля (присваивания) и методы, а также пытается вычленить docstring
    или блок комментариев. Также собирает строки импортов и комментарии уровня файла.
+   Построчный парсер на регулярных выражениях; альтернатива – parse_python_file_ast
+   (--python-backend ast).
    """
    results = []
-   with open(file_path, 'r', encoding='utf-8') as f:
-       lines = f.readlines()
-   file_imports = extract_imports_from_file(lines, "python", project_files)
+   lines = read_source_lines(file_path, content)
+   file_imports = extract_imports_from_path(file_path, "python", project_files, content, modules)
    total_lines = len(lines)
+   stripped_lines = [line.strip() for line in lines]
+   class_re = re.compile(PYTHON_CLASS_REGEX)
+   func_re = re.compile(PYTHON_FUNC_REGEX)
+   field_re = re.compile(PYTHON_FIELD_REGEX)
    # Извлечение комментариев уровня файла (docstring или комментарии с #)
-   file_description = ""
    idx = 0
-   while idx < total_lines and lines[idx].strip() == "":
+   while idx < total_lines and stripped_lines[idx] == "":
        idx += 1
-   if idx < total_lines:
-       stripped = lines[idx].strip()
-       if stripped.startswith('"""') or stripped.startswith("'''"):
-           delimiter = stripped[:3]
-           if stripped.count(delimiter) >= 2 and len(stripped) > 6:
-               file_description = stripped.strip(delimiter).strip()
-               idx += 1
-           else:
-               doc_lines = []
-               idx += 1
-               while idx < total_lines and delimiter not in lines[idx]:
-                   doc_lines.append(lines[idx].strip())
-                   idx += 1
-               if idx < total_lines:
-                   last_line = lines[idx].strip().replace(delimiter, "").strip()
-                   if last_line:
-                       doc_lines.append(last_line)
-                   idx += 1
-               file_description = " ".join(doc_lines)
-       elif stripped.startswith("#"):
-           comment_lines = []
-           while idx < total_lines and lines[idx].strip().startswith("#"):
-               comment_lines.append(lines[idx].strip()[1:].strip())
-               idx += 1
-           file_description = " ".join(comment_lines)
- 
+   file_description, idx = _py_doc_block(stripped_lines, idx, total_lines)
    if file_description:
        results.append({
            "type": "file_comment",
@@ -216,96 +982,46 @@ def parse_python_file(file_path, root_dir, project_files):
    i = idx
    while i < total_lines:
        line = lines[i]
-       stripped = line.strip()
+       stripped = stripped_lines[i]
        # Обнаружение класса
-       class_match = re.match(PYTHON_CLASS_REGEX, stripped)
+       class_match = class_re.match(stripped)
        if class_match:
            class_name = class_match.group(1)
-           class_description = ""
            j = i + 1
-           while j < total_lines and lines[j].strip() == "":
+           while j < total_lines and stripped_lines[j] == "":
                j += 1
-           if j < total_lines:
-               if lines[j].strip().startswith('"""') or lines[j].strip().startswith("'''"):
-                   delimiter = lines[j].strip()[:3]
-                   if lines[j].strip().count(delimiter) >= 2 and len(lines[j].strip()) > 6:
-                       class_description = lines[j].strip().strip(delimiter).strip()
-                       j += 1
-                   else:
-                       doc_lines = []
-                       j += 1
-                       while j < total_lines and delimiter not in lines[j]:
-                           doc_lines.append(lines[j].strip())
-                           j += 1
-                       if j < total_lines:
-                           last_line = lines[j].strip().replace(delimiter, "").strip()
-                           if last_line:
-                               doc_lines.append(last_line)
-                           j += 1
-                       class_description = " ".join(doc_lines)
-               elif lines[j].strip().startswith("#"):
-                   comment_lines = []
-                   while j < total_lines and lines[j].strip().startswith("#"):
-                       comment_lines.append(lines[j].strip()[1:].strip())
-                       j += 1
-                   class_description = " ".join(comment_lines)
+           class_description, j = _py_doc_block(stripped_lines, j, total_lines)
            # Считываем блок класса по отступам
            class_indent = len(line) - len(line.lstrip())
            block_lines = []
+           block_stripped = []
            while j < total_lines:
-               if lines[j].strip() == "":
+               if stripped_lines[j] == "":
                    j += 1
                    continue
                current_indent = len(lines[j]) - len(lines[j].lstrip())
                if current_indent <= class_indent:
                    break
                block_lines.append(lines[j])
+               block_stripped.append(stripped_lines[j])
                j += 1
            # Извлечение методов и полей из блока класса
            methods = []
            fields = []
            k = 0
-           while k < len(block_lines):
-               sub_line = block_lines[k]
-               sub_stripped = sub_line.strip()
-               func_match = re.match(PYTHON_FUNC_REGEX, sub_stripped)
+           block_total = len(block_lines)
+           while k < block_total:
+               func_match = func_re.match(block_stripped[k])
                if func_match:
-                   method_name = func_match.group(1)
-                   method_doc = ""
-                   if k+1 < len(block_lines) and (block_lines[k+1].strip().startswith('"""') or block_lines[k+1].strip().startswith("'''")):
-                       delimiter = block_lines[k+1].strip()[:3]
-                       if block_lines[k+1].strip().count(delimiter) >= 2 and len(block_lines[k+1].strip()) > 6:
-                           method_doc = block_lines[k+1].strip().strip(delimiter).strip()
-                           k += 2
-                       else:
-                           doc_lines = []
-                           k += 2
-                           while k < len(block_lines) and delimiter not in block_lines[k]:
-                               doc_lines.append(block_lines[k].strip())
-                               k += 1
-                           if k < len(block_lines):
-                               last_line = block_lines[k].strip().replace(delimiter, "").strip()
-                               if last_line:
-                                   doc_lines.append(last_line)
-                               k += 1
-                           method_doc = " ".join(doc_lines)
-                   elif k+1 < len(block_lines) and block_lines[k+1].strip().startswith("#"):
-                       comment_lines = []
-                       k += 1
-                       while k < len(block_lines) and block_lines[k].strip().startswith("#"):
-                           comment_lines.append(block_lines[k].strip()[1:].strip())
-                           k += 1
-                       method_doc = " ".join(comment_lines)
-                   else:
-                       k += 1
+                   method_doc, k = _py_doc_block(block_stripped, k + 1, block_total)
                    methods.append({
-                       "name": method_name,
+                       "name": func_match.group(1),
                        "description": method_doc,
                        "imports": []  # Для простоты не ищем импорты внутри методов
                    })
                else:
                    # Поиск полей – строки с присваиванием на уровне класса
-                   field_match = re.match(r'^\s*([A-Za-z0-9_]+)\s*=\s*.+', sub_line)
+                   field_match = field_re.match(block_lines[k])
                    if field_match:
                        fields.append(field_match.group(1))
                    k += 1
@@ -320,40 +1036,15 @@ def parse_python_file(file_path, root_dir, project_files):
            i = j
            continue
        # Обнаружение функции на верхнем уровне
-       func_match = re.match(PYTHON_FUNC_REGEX, stripped)
+       func_match = func_re.match(stripped)
        if func_match:
-           func_name = func_match.group(1)
-           func_doc = ""
            j = i + 1
-           while j < total_lines and lines[j].strip() == "":
+           while j < total_lines and stripped_lines[j] == "":
                j += 1
-           if j < total_lines:
-               if lines[j].strip().startswith('"""') or lines[j].strip().startswith("'''"):
-                   delimiter = lines[j].strip()[:3]
-                   if lines[j].strip().count(delimiter) >= 2 and len(lines[j].strip()) > 6:
-                       func_doc = lines[j].strip().strip(delimiter).strip()
-                       j += 1
-                   else:
-                       doc_lines = []
-                       j += 1
-                       while j < total_lines and delimiter not in lines[j]:
-                           doc_lines.append(lines[j].strip())
-                           j += 1
-                       if j < total_lines:
-                           last_line = lines[j].strip().replace(delimiter, "").strip()
-                           if last_line:
-                               doc_lines.append(last_line)
-                           j += 1
-                       func_doc = " ".join(doc_lines)
-               elif lines[j].strip().startswith("#"):
-                   comment_lines = []
-                   while j < total_lines and lines[j].strip().startswith("#"):
-                       comment_lines.append(lines[j].strip()[1:].strip())
-                       j += 1
-                   func_doc = " ".join(comment_lines)
+           func_doc, j = _py_doc_block(stripped_lines, j, total_lines)
            results.append({
                "type": "def",
-               "name": func_name,
+               "name": func_match.group(1),
                "description": func_doc,
                "imports": []
            })
@@ -367,95 +1058,485 @@ def parse_python_file(file_path, root_dir, project_files):
            "imports": file_imports
        })
    return results
-# ==============================
-# Парсинг JavaScript
-# ==============================
-def parse_js_file(file_path, root_dir, project_files):
+def _py_docstring(node):
+   """Docstring узла ast одной строкой (непустые строки через пробел)."""
+   doc = ast.get_docstring(node, clean=False)
+   if not doc:
+       return ""
+   return " ".join(part for part in (line.strip() for line in doc.splitlines()) if part)
+def _py_leading_comments(source):
    """
-   Парсит JS-файл: ищет объявления классов (с методами и полями) и функций.
-   Для накопления комментариев учитываются как однострочные (//) так и многострочные (/* … */).
-   Также собираются импорты.
+   Блок #-комментариев в начале файла (через tokenize). Строка shebang
+   и объявление кодировки в описание не входят.
    """
-   results = []
-   with open(file_path, 'r', encoding='utf-8') as f:
-       lines = f.readlines()
-   file_imports = extract_imports_from_file(lines, "js", project_files)
-   doc_buffer = []
-   i = 0
-   total_lines = len(lines)
-   while i < total_lines:
-       line = lines[i]
-       stripped = line.strip()
-       # Накопление однострочных комментариев
-       if stripped.startswith("//"):
-           doc_buffer.append(stripped[2:].strip())
-           i += 1
-           continue
-       # Накопление многострочных комментариев
-       if stripped.startswith("/*"):
-           comment_content = stripped.lstrip("/*").strip()
-           while i < total_lines and "*/" not in lines[i]:
-               i += 1
-               if i < total_lines:
-                   comment_line = lines[i].strip()
-                   if "*/" in comment_line:
-                       comment_line = comment_line.split("*/")[0]
-                   comment_content += " " + comment_line
-           doc_buffer.append(comment_content.strip())
-           i += 1
+   import io
+   import tokenize
+   comments = []
+   last_row = 0
+   try:
+       for tok in tokenize.generate_tokens(io.StringIO(source).readline):
+           if tok.type == tokenize.COMMENT:
+               if last_row and tok.start[0] > last_row + 1:
+                   break
+               last_row = tok.start[0]
+               if (tok.start[0] == 1 and tok.string.startswith("#!")) or re.match(PYTHON_CODING_REGEX, tok.string):
+                   continue
+               comments.append(tok.string[1:].strip())
+           elif tok.type != tokenize.NL:
+               break
+   except (tokenize.TokenError, SyntaxError):
+       pass
+   return " ".join(comments)
+def _py_body_comments(node, stripped_lines):
+   """
+   Описание объявления без docstring: блок #-комментариев между заголовком
+   (class/def ...:) и первой инструкцией тела.
+   """
+   body_row = node.body[0].lineno - 1
+   header_row = node.lineno - 1
+   k = body_row - 1
+   while k > header_row and (stripped_lines[k] == "" or stripped_lines[k].startswith("#")):
+       k -= 1
+   k += 1
+   while k < body_row and stripped_lines[k] == "":
+       k += 1
+   return _py_doc_block(stripped_lines, k, body_row)[0]
+def _py_description(node, stripped_lines):
+   return _py_docstring(node) or _py_body_comments(node, stripped_lines)
+def _py_target_names(target):
+   """Имена, которым присваивается значение (включая распаковку кортежей)."""
+   if isinstance(target, ast.Name):
+       return [target.id]
+   if isinstance(target, (ast.Tuple, ast.List)):
+       return [name for elt in target.elts for name in _py_target_names(elt)]
+   return []
+def _py_self_fields(func):
+   """Атрибуты self.x, которым присваивается значение в методе."""
+   if not func.args.args:
+       return []
+   self_name = func.args.args[0].arg
+   names = []
+   for sub in ast.walk(func):
+       if isinstance(sub, ast.Assign):
+           targets = sub.targets
+       elif isinstance(sub, (ast.AnnAssign, ast.AugAssign)):
+           targets = [sub.target]
+       else:
            continue
-       # Обнаружение класса
-       class_match = re.match(JS_CLASS_REGEX, stripped)
-       if class_match:
-           class_name = class_match.group(1)
-           description = " ".join(doc_buffer) if doc_buffer else ""
-           doc_buffer = []
-           # Извлекаем тело класса (подсчёт фигурных скобок)
-           body_lines = []
-           brace_count = 0
-           if "{" in line:
-               brace_count += line.count("{") - line.count("}")
-           j = i + 1
-           while j < total_lines and brace_count > 0:
-               body_line = lines[j]
-               brace_count += body_line.count("{") - body_line.count("}")
-               body_lines.append(body_line)
-               j += 1
-           methods = []
-           fields = []
-           for bl in body_lines:
-               bl_stripped = bl.strip()
-               m_method = re.match(JS_METHOD_REGEX, bl_stripped)
-               if m_method:
-                   methods.append(m_method.group(1))
-               m_field = re.match(JS_FIELD_REGEX, bl_stripped)
-               if m_field:
-                   fields.append(m_field.group(1))
-           results.append({
-               "type": "class",
-               "name": class_name,
-               "description": description,
-               "fields": fields,
-               "methods": methods,
+       for target in targets:
+           if (isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name)
+                   and target.value.id == self_name):
+               names.append(target.attr)
+   return names
+def _py_class_elements(node, prefix, stripped_lines, results):
+   """Добавляет в results элемент класса и следом – элементы вложенных классов."""
+   fields = []
+   methods = []
+   nested = []
+   for stmt in node.body:
+       if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef)):
+           methods.append({
+               "name": stmt.name,
+               "description": _py_description(stmt, stripped_lines),
                "imports": []
            })
-           i = j
-           continue
-       # Обнаружение функции (топ-левел)
-       func_match = re.match(JS_FUNC_REGEX, stripped)
-       if func_match:
-           func_name = func_match.group(1)
-           description = " ".join(doc_buffer) if doc_buffer else ""
-           doc_buffer = []
+           if stmt.name == "__init__":
+               fields.extend(_py_self_fields(stmt))
+       elif isinstance(stmt, ast.Assign):
+           for target in stmt.targets:
+               fields.extend(_py_target_names(target))
+       elif isinstance(stmt, ast.AnnAssign):
+           fields.extend(_py_target_names(stmt.target))
+       elif isinstance(stmt, ast.ClassDef):
+           nested.append(stmt)
+   name = prefix + node.name
+   results.append({
+       "type": "class",
+       "name": name,
+       "description": _py_description(node, stripped_lines),
+       "fields": list(dict.fromkeys(fields)),
+       "methods": methods,
+       "imports": []
+   })
+   for stmt in nested:
+       _py_class_elements(stmt, name + ".", stripped_lines, results)
+def _py_module_elements(body, stripped_lines, results):
+   """
+   Классы и функции уровня модуля, в том числе внутри if/try/with
+   (например, "if TYPE_CHECKING:" или альтернативные реализации).
+   """
+   for stmt in body:
+       if isinstance(stmt, ast.ClassDef):
+           _py_class_elements(stmt, "", stripped_lines, results)
+       elif isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef)):
            results.append({
-               "type": "function",
-               "name": func_name,
-               "description": description,
+               "type": "def",
+               "name": stmt.name,
+               "description": _py_description(stmt, stripped_lines),
                "imports": []
            })
-           i += 1
+       elif isinstance(stmt, (ast.If, ast.Try, ast.With, ast.AsyncWith)):
+           for block in (getattr(stmt, "body", []), getattr(stmt, "orelse", []),
+                         getattr(stmt, "finalbody", [])):
+               _py_module_elements(block, stripped_lines, results)
+           for handler in getattr(stmt, "handlers", []):
+               _py_module_elements(handler.body, stripped_lines, results)
+def parse_python_file_ast(file_path, root_dir, project_files, content=None, modules=None):
+   """
+   Парсит Python-файл через модуль ast: классы (включая вложенные, с полями
+   уровня класса и self.x из __init__, и методами, в том числе async
+   и с декораторами) и функции уровня модуля. Описанием служит docstring,
+   а при его отсутствии – блок #-комментариев в начале тела (для файла –
+   комментарии в начале, которые читаются через tokenize).
+   Также собирает импорты. Файлы, которые ast не разбирает (синтаксис
+   другой версии Python), обрабатываются построчным parse_python_file.
+   Точнее построчного парсера, но медленнее: ast.parse сам по себе
+   дольше всего построчного прохода (см. benchmarkArchitecture.py python).
+   """
+   source = read_source_text(file_path, content)
+   try:
+       tree = ast.parse(source, filename=file_path)
+   except (SyntaxError, ValueError):
+       return parse_python_file(file_path, root_dir, project_files, content, modules)
+   lines = source.splitlines(True)
+   stripped_lines = [line.strip() for line in lines]
+   results = []
+   file_description = _py_docstring(tree) or _py_leading_comments(source)
+   if file_description:
+       results.append({
+           "type": "file_comment",
+           "name": os.path.basename(file_path),
+           "description": file_description
+       })
+   _py_module_elements(tree.body, stripped_lines, results)
+   file_imports = extract_imports_from_path(file_path, "python", project_files, content, modules)
+   if file_imports:
+       results.append({
+           "type": "file_imports",
+           "name": os.path.basename(file_path),
+           "imports": file_imports
+       })
+   return results
+# ==============================
+# Парсинг JavaScript
+# ==============================
+def _js_regex_allowed(line, start, prev_tail):
+   """
+   Может ли "/" в позиции start начинать литерал регулярного выражения:
+   смотрим на предыдущий значимый символ (или на конец предыдущей строки).
+   """
+   i = start - 1
+   while i >= 0 and line[i] in " \t":
+       i -= 1
+   c = line[i] if i >= 0 else prev_tail
+   if not c:
+       return True
+   if c.isalnum() or c in "_$":
+       j = i
+       while j >= 0 and (line[j].isalnum() or line[j] in "_$"):
+           j -= 1
+       return line[j + 1:i + 1] in JS_REGEX_KEYWORDS
+   return c in "(,=:[!&|?{};+-*%<>~^"
+def _js_export_names(value):
+   """Имена из "module.exports = ..." (идентификатор или ключи объекта в одной строке)."""
+   value = value.strip().rstrip(";").strip()
+   if re.fullmatch(JS_IDENT, value):
+       return [value]
+   if value.startswith("{"):
+       body = value[1:value.rfind("}")] if "}" in value else value[1:]
+       names = []
+       for part in body.split(","):
+           key = part.split(":")[0].strip()
+           if re.fullmatch(JS_IDENT, key):
+               names.append(key)
+       return names
+   return ["module.exports"] if value else []
+def parse_js_file(file_path, root_dir, project_files, content=None, modules=None):
+   """
+   Парсит JS-файл одним линейным проходом: ищет объявления классов (с методами
+   и полями, включая this.поле в конструкторе), функций (в т.ч. async),
+   констант со стрелочными функциями на верхнем уровне и экспортов
+   (module.exports, exports.x, export). Сканер учитывает строки, шаблонные
+   строки, литералы регулярных выражений и комментарии, поэтому скобки внутри
+   них не сбивают определение границ классов. Описанием объявления служат
+   комментарии (// и /* … */), стоящие непосредственно перед ним.
+   Также собираются импорты.
+   """
+   results = []
+   lines = read_source_lines(file_path, content)
+   file_imports = extract_imports_from_path(file_path, "js", project_files, content, modules)
+   decl_re = re.compile(JS_DECL_REGEX)
+   method_re = re.compile(JS_METHOD_REGEX)
+   field_re = re.compile(JS_FIELD_REGEX)
+   this_field_re = re.compile(JS_THIS_FIELD_REGEX)
+   module_exports_re = re.compile(JS_MODULE_EXPORTS_REGEX)
+   named_export_re = re.compile(JS_NAMED_EXPORT_REGEX)
+   es_export_re = re.compile(JS_ES_EXPORT_REGEX)
+   es_export_list_re = re.compile(JS_ES_EXPORT_LIST_REGEX)
+   token_re = re.compile(JS_TOKEN_REGEX)
+   template_re = re.compile(JS_TEMPLATE_REGEX)
+   regex_literal_re = re.compile(JS_REGEX_LITERAL_REGEX)
+   CODE, BLOCK_COMMENT, TEMPLATE = 0, 1, 2
+   mode = CODE
+   stack = []            # открытые скобки: True – "${" шаблона, False – обычная "{"
+   class_elem = None     # текущий класс и глубина его тела
+   class_depth = 0
+   pending_class = None  # класс, чья "{" ещё не встретилась
+   ctor_pending = False
+   ctor_depth = 0        # глубина тела конструктора (0 – вне конструктора)
+   exports_depth = 0     # глубина объекта "module.exports = {" (0 – вне его)
+   exports = []
+   doc_buffer = []
+   prev_tail = ""
+   for line in lines:
+       depth = len(stack)
+       if mode == BLOCK_COMMENT:
+           end = line.find("*/")
+           text = line if end == -1 else line[:end]
+           text = text.strip().lstrip("*").strip()
+           if text:
+               doc_buffer.append(text)
+       elif mode == CODE:
+           stripped = line.strip()
+           if stripped.startswith("//"):
+               doc_buffer.append(stripped[2:].strip())
+           elif stripped.startswith("/*"):
+               text = stripped[2:]
+               if "*/" in text:
+                   text = text[:text.find("*/")]
+               text = text.strip().lstrip("*").strip()
+               if text:
+                   doc_buffer.append(text)
+           elif stripped:
+               description = " ".join(doc_buffer)
+               doc_buffer = []
+               if class_elem is not None and depth == class_depth:
+                   m = method_re.match(line)
+                   if m:
+                       class_elem["methods"].append(m.group("name"))
+                       ctor_pending = m.group("name") == "constructor"
+                   else:
+                       m = field_re.match(line)
+                       if m:
+                           class_elem["fields"].append(m.group("name"))
+               elif class_elem is not None:
+                   if ctor_depth and depth >= ctor_depth:
+                       for name in this_field_re.findall(line):
+                           if name not in class_elem["fields"]:
+                               class_elem["fields"].append(name)
+               else:
+                   m = decl_re.match(line)
+                   if m and m.group("cls"):
+                       pending_class = {
+                           "type": "class",
+                           "name": m.group("cls"),
+                           "description": description,
+                           "fields": [],
+                           "methods": [],
+                           "imports": []
+                       }
+                       results.append(pending_class)
+                   elif m and (m.group("func") or (m.group("arrow") and depth == 0)):
+                       results.append({
+                           "type": "function",
+                           "name": m.group("func") or m.group("arrow"),
+                           "description": description,
+                           "imports": []
+                       })
+                   if depth == 0:
+                       m_exp = module_exports_re.match(line)
+                       if m_exp:
+                           value = m_exp.group("value")
+                           exports.extend(_js_export_names(value))
+                           if value.strip().startswith("{") and "}" not in value:
+                               exports_depth = 1
+                       elif stripped.startswith(("exports.", "module.exports.")):
+                           m_exp = named_export_re.match(line)
+                           if m_exp:
+                               exports.append(m_exp.group("name"))
+                       elif stripped.startswith("export"):
+                           m_exp = es_export_list_re.match(line)
+                           if m_exp:
+                               for part in m_exp.group("names").split(","):
+                                   name = part.split(" as ")[-1].strip()
+                                   if name:
+                                       exports.append(name)
+                           else:
+                               m_exp = es_export_re.match(line)
+                               if m_exp:
+                                   exports.append("default" if m_exp.group("default") else (m_exp.group("name") or "default"))
+                   elif exports_depth and depth == exports_depth:
+                       m_exp = re.match(JS_IDENT, stripped)
+                       if m_exp:
+                           exports.append(m_exp.group())
+       # Лексический проход по строке: обновляем глубину скобок и режим сканера
+       pos = 0
+       n = len(line)
+       while pos < n:
+           if mode == TEMPLATE:
+               m = template_re.search(line, pos)
+               if m is None:
+                   break
+               pos = m.end()
+               tok = m.group()
+               if tok == "`":
+                   mode = CODE
+               elif tok == "${":
+                   stack.append(True)
+                   mode = CODE
+               continue
+           if mode == BLOCK_COMMENT:
+               end = line.find("*/", pos)
+               if end == -1:
+                   break
+               pos = end + 2
+               mode = CODE
+               continue
+           m = token_re.search(line, pos)
+           if m is None:
+               break
+           tok = m.group()
+           start = m.start()
+           pos = m.end()
+           if tok == "{":
+               stack.append(False)
+               if pending_class is not None:
+                   class_elem = pending_class
+                   class_depth = len(stack)
+                   pending_class = None
+               elif ctor_pending:
+                   ctor_depth = len(stack)
+                   ctor_pending = False
+           elif tok == "}":
+               if stack and stack.pop():
+                   mode = TEMPLATE
+               depth_now = len(stack)
+               if ctor_depth and depth_now < ctor_depth:
+                   ctor_depth = 0
+               if class_elem is not None and depth_now < class_depth:
+                   class_elem = None
+               if exports_depth and depth_now < exports_depth:
+                   exports_depth = 0
+           elif tok == "`":
+               mode = TEMPLATE
+           elif tok == "//":
+               break
+           elif tok == "/*":
+               mode = BLOCK_COMMENT
+           elif tok == "/":
+               if _js_regex_allowed(line, start, prev_tail):
+                   m = regex_literal_re.match(line, start)
+                   if m:
+                       pos = m.end()
+       if mode == CODE:
+           tail = line.rstrip()
+           if tail:
+               prev_tail = tail[-1]
+   if exports:
+       results.append({
+           "type": "exports",
+           "name": os.path.basename(file_path),
+           "exports": list(dict.fromkeys(exports))
+       })
+   if file_imports:
+       results.append({
+           "type": "file_imports",
+           "name": os.path.basename(file_path),
+           "imports": file_imports
+       })
+   return results
+# ==============================
+# Парсинг Swift
+# ==============================
+def parse_swift_file(file_path, root_dir, project_files, content=None, modules=None):
+   """
+   Парсит Swift-файл за один линейный проход: классы и структуры с полями
+   и методами, функции верхнего уровня и документирующие комментарии ///.
+   Фигурные скобки считаются без учёта строк и комментариев; вложенные
+   типы выводятся отдельными элементами с именем Внешний.Внутренний.
+   Формат результата совпадает с parse_js_file.
+   """
+   results = []
+   lines = read_source_lines(file_path, content)
+   file_imports = extract_imports_from_path(file_path, "swift", project_files, content, modules)
+   class_re = re.compile(SWIFT_CLASS_REGEX)
+   func_re = re.compile(SWIFT_FUNC_REGEX)
+   field_re = re.compile(SWIFT_FIELD_REGEX)
+   doc_re = re.compile(SWIFT_DOC_REGEX)
+   token_re = re.compile(SWIFT_TOKEN_REGEX)
+   depth = 0
+   containers = []  # открытые типы: (элемент, глубина их тела)
+   pending = None   # объявленный тип, чья "{" ещё не встретилась
+   doc_buffer = []
+   in_block_comment = False
+   in_multiline_string = False
+   for line in lines:
+       if not in_block_comment and not in_multiline_string:
+           doc_match = doc_re.match(line)
+           if doc_match:
+               doc_buffer.append(doc_match.group(1).strip())
+               continue
+           stripped = line.strip()
+           if stripped:
+               container, body_depth = containers[-1] if containers else (None, 0)
+               class_match = class_re.match(line)
+               if class_match:
+                   name = class_match.group(2)
+                   if container is not None:
+                       name = container["name"] + "." + name
+                   pending = {
+                       "type": class_match.group(1),
+                       "name": name,
+                       "description": " ".join(doc_buffer),
+                       "fields": [],
+                       "methods": [],
+                       "imports": []
+                   }
+                   results.append(pending)
+               elif depth == body_depth:
+                   func_match = func_re.match(line)
+                   if func_match:
+                       if container is not None:
+                           container["methods"].append(func_match.group(1))
+                       else:
+                           results.append({
+                               "type": "function",
+                               "name": func_match.group(1),
+                               "description": " ".join(doc_buffer),
+                               "imports": []
+                           })
+                   elif container is not None:
+                       field_match = field_re.match(line)
+                       if field_match:
+                           container["fields"].append(field_match.group(2))
+               # Атрибуты (@objc, @available ...) не отрывают документацию от объявления
+               if not stripped.startswith("@"):
+                   doc_buffer = []
+       if "{" not in line and "}" not in line and '"' not in line and "/" not in line:
            continue
-       i += 1
+       for token in token_re.finditer(line):
+           tok = token.group()
+           if in_block_comment:
+               if tok == "*/":
+                   in_block_comment = False
+           elif in_multiline_string:
+               if tok == '"""':
+                   in_multiline_string = False
+           elif tok == "{":
+               depth += 1
+               if pending is not None:
+                   containers.append((pending, depth))
+                   pending = None
+           elif tok == "}":
+               depth -= 1
+               while containers and depth < containers[-1][1]:
+                   containers.pop()
+           elif tok == "//":
+               break
+           elif tok == "/*":
+               in_block_comment = True
+           elif tok == '"""':
+               in_multiline_string = True
    if file_imports:
        results.append({
            "type": "file_imports",
@@ -466,16 +1547,14 @@ def parse_js_file(file_path, root_dir, project_files):
 # ==============================
 # Парсинг HTML
 # ==============================
-def parse_html_file(file_path, root_dir, project_files):
+def parse_html_file(file_path, root_dir, project_files, content=None, modules=None):
    """
    Для HTML-файлов парсинг сводится к извлечению внешних подключений –
    тегов <script src="..."> и <link href="...">, которые являются ссылками на
    файлы проекта.
    """
    results = []
-   with open(file_path, 'r', encoding='utf-8') as f:
-       lines = f.readlines()
-   file_imports = extract_imports_from_file(lines, "html", project_files)
+   file_imports = extract_imports_from_path(file_path, "html", project_files, content, modules)
    results.append({
        "type": "html",
        "name": os.path.basename(file_path),
@@ -484,62 +1563,808 @@ def parse_html_file(file_path, root_dir, project_files):
    })
    return results
 # ==============================
-# Основная функция
+# Парсинг книг Excel (.xlsx)
 # ==============================
-def main():
-   root_dir = os.path.dirname(os.path.abspath(__file__))
-   arch_file = os.path.join(root_dir, "ARCHITECTURE.md")
-   structure_data = {}
-   # Собираем множество файлов проекта (относительные пути)
-   project_files = set()
-   for current_path, dirs, files in os.walk(root_dir):
-       dirs[:] = [d for d in dirs if not d.startswith('.') and d not in IGNORED_DIRS]
-       rel_path = os.path.relpath(current_path, root_dir)
-       if rel_path == ".":
-           rel_path = "."
-       for file_name in files:
-           if file_name.startswith('.') or file_name in IGNORED_FILES:
-               continue
-           rel_file = os.path.join(rel_path, file_name)
-           project_files.add(rel_file)
-   # Второй обход для сбора подробной информации
-   for current_path, dirs, files in os.walk(root_dir):
-       dirs[:] = [d for d in dirs if not d.startswith('.') and d not in IGNORED_DIRS]
-       rel_path = os.path.relpath(current_path, root_dir)
-       if rel_path == ".":
-           rel_path = "."
-       if rel_path not in structure_data:
-           structure_data[rel_path] = {
-               "files": [],
-               "details": []
-           }
-       for file_name in files:
-           if file_name.startswith('.') or file_name in IGNORED_FILES:
-               continue
-           file_path = os.path.join(current_path, file_name)
-           structure_data[rel_path]["files"].append(file_name)
-           lower_name = file_name.lower()
-           parsed = None
-           if lower_name.endswith(".swift"):
-               parsed = parse_swift_file(file_path, root_dir, project_files)
-               lang = "swift"
-           elif lower_name.endswith(".py"):
-               parsed = parse_python_file(file_path, root_dir, project_files)
-               lang = "python"
-           elif lower_name.endswith(".js"):
-               parsed = parse_js_file(file_path, root_dir, project_files)
-               lang = "js"
-           elif lower_name.endswith(".html"):
-               parsed = parse_html_file(file_path, root_dir, project_files)
-               lang = "html"
-           if parsed:
-               structure_data[rel_path]["details"].append({
-                   "filename": file_name,
-                   "lang": lang,
-                   "elements": parsed
+# Книга .xlsx – zip-архив с XML-частями. Читаются только центральный каталог
+# архива, связи (_rels), workbook.xml и начало каждого листа до элемента
+# <dimension>: сами ячейки не распаковываются, поэтому время и память
+# не зависят от размера листов.
+XLSX_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+XLSX_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+XLSX_PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+XLSX_CELL_REGEX = r'^\$?([A-Za-z]{1,3})\$?(\d+)$'
+def _xlsx_iter_elements(zf, name):
+   """
+   Элементы XML-части архива по мере распаковки (события start: атрибуты
+   уже доступны). Когда вызывающий выходит из цикла, чтение прекращается.
+   """
+   from xml.etree.ElementTree import iterparse
+   with zf.open(name) as f:
+       for _, elem in iterparse(f, events=("start",)):
+           yield elem
+def _xlsx_relationships(zf, names, rels_name, base_dir):
+   """Связи части книги: {Id: (путь в архиве, тип связи)}."""
+   relationships = {}
+   if rels_name not in names:
+       return relationships
+   for elem in _xlsx_iter_elements(zf, rels_name):
+       if elem.tag == XLSX_PACKAGE_REL_NS + "Relationship":
+           target = elem.get("Target", "")
+           if target.startswith("/"):
+               path = target.lstrip("/")
+           else:
+               path = posixpath.normpath(posixpath.join(base_dir, target))
+           relationships[elem.get("Id")] = (path, elem.get("Type", "").rsplit("/", 1)[-1])
+   return relationships
+def _xlsx_dimension(zf, sheet_name):
+   """Значение <dimension ref="..."> листа или None, если его нет до <sheetData>."""
+   for elem in _xlsx_iter_elements(zf, sheet_name):
+       if elem.tag == XLSX_MAIN_NS + "dimension":
+           return elem.get("ref")
+       if elem.tag == XLSX_MAIN_NS + "sheetData":
+           return None
+   return None
+def _xlsx_cell(ref):
+   """(номер столбца, номер строки) ячейки вида "C12" или None."""
+   match = re.match(XLSX_CELL_REGEX, ref)
+   if not match:
+       return None
+   column = 0
+   for char in match.group(1).upper():
+       column = column * 26 + ord(char) - ord("A") + 1
+   return column, int(match.group(2))
+def _xlsx_range_description(ref):
+   """Описание используемого диапазона листа: адрес, число строк и столбцов."""
+   first, _, last = ref.partition(":")
+   start = _xlsx_cell(first)
+   end = _xlsx_cell(last or first)
+   if start is None or end is None:
+       return f"диапазон {ref}"
+   rows = end[1] - start[1] + 1
+   columns = end[0] - start[0] + 1
+   return f"диапазон {ref}, строк: {rows}, столбцов: {columns}"
+def parse_xlsx_file(file_path, root_dir, project_files, content=None):
+   """
+   Парсит книгу Excel: для каждого листа (элемент "sheet") выводит имя,
+   используемый диапазон из <dimension> с числом строк и столбцов, а также
+   отметки о листах диаграмм и скрытых листах. content не используется:
+   книга всегда читается с диска частично. Повреждённые архивы и файлы,
+   не являющиеся zip (например, файлы блокировки "~$Книга.xlsx"),
+   пропускаются с категорией "corrupt".
+   """
+   import zipfile
+   import zlib
+   from xml.etree.ElementTree import ParseError
+   results = []
+   try:
+       with zipfile.ZipFile(file_path) as zf:
+           names = set(zf.namelist())
+           # Главная часть книги указана в корневых связях пакета
+           workbook = "xl/workbook.xml"
+           for path, rel_type in _xlsx_relationships(zf, names, "_rels/.rels", "").values():
+               if rel_type == "officeDocument":
+                   workbook = path
+                   break
+           base_dir = posixpath.dirname(workbook)
+           rels_name = posixpath.join(base_dir, "_rels", posixpath.basename(workbook) + ".rels")
+           relationships = _xlsx_relationships(zf, names, rels_name, base_dir)
+           sheets = []
+           for elem in _xlsx_iter_elements(zf, workbook):
+               if elem.tag == XLSX_MAIN_NS + "sheet":
+                   sheets.append((elem.get("name", ""), elem.get("state", "visible"),
+                                  elem.get(XLSX_REL_NS + "id")))
+           for sheet_name, state, rel_id in sheets:
+               path, rel_type = relationships.get(rel_id, (None, None))
+               parts = []
+               if rel_type == "chartsheet":
+                   parts.append("лист диаграммы")
+               elif path in names:
+                   ref = _xlsx_dimension(zf, path)
+                   parts.append(_xlsx_range_description(ref) if ref else "диапазон не указан")
+               if state == "hidden":
+                   parts.append("скрытый")
+               elif state == "veryHidden":
+                   parts.append("скрыт из интерфейса")
+               results.append({
+                   "type": "sheet",
+                   "name": sheet_name,
+                   "description": ", ".join(parts)
                })
-   # Генерируем дерево папок проекта и вставляем его в начало контента
-   tree_text = generate_directory_tree(root_dir)
+   except (zipfile.BadZipFile, KeyError, ParseError, EOFError, zlib.error):
+       raise SkipFile("corrupt")
+   return results
+# ==============================
+# Кэш результатов парсинга
+# ==============================
+def _tool_signature():
+   """
+   Хеш исходного кода скрипта: любое изменение парсеров делает кэш недействительным.
+   """
+   with open(os.path.abspath(__file__), "rb") as f:
+       return hashlib.sha1(f.read()).hexdigest()
+def load_parse_cache(cache_path):
+   """
+   Загружает кэш результатов парсинга: словарь
+   {относительный путь: {"mtime", "size", "hash", "lookups", "hits", "elements"}}.
+   Если файла нет, он повреждён или создан другой версией скрипта,
+   возвращается пустой кэш.
+   """
+   try:
+       with open(cache_path, "r", encoding="utf-8") as f:
+           data = json.loads(f.read())
+   except (OSError, ValueError):
+       return {}
+   if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+       return {}
+   if data.get("tool") != _tool_signature():
+       return {}
+   files = data.get("files", {})
+   for entry in files.values():
+       entry["elements"] = _cached_elements(entry["elements"])
+   return files
+def save_parse_cache(cache_path, entries, previous=None):
+   """
+   Сохраняет кэш через временный файл, чтобы прерванный запуск не оставил
+   повреждённый JSON. В кэш попадают только файлы текущего запуска,
+   поэтому записи удалённых файлов вытесняются. previous – кэш, загруженный
+   в начале запуска: если ни одна запись не изменилась (записи из кэша
+   переиспользуются теми же объектами), файл не перезаписывается.
+   Возвращает True, если кэш записан.
+   """
+   if previous is not None and entries.keys() == previous.keys() and all(
+           entry is previous[rel_file] for rel_file, entry in entries.items()):
+       return False
+   data = {
+       "version": CACHE_VERSION,
+       "tool": _tool_signature(),
+       "files": entries
+   }
+   tmp_path = cache_path + ".tmp"
+   # json.dumps кодирует целиком на C; json.dump в файл идёт через
+   # _iterencode на Python и на большом кэше многократно медленнее
+   with open(tmp_path, "w", encoding="utf-8") as f:
+       f.write(json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+   os.replace(tmp_path, cache_path)
+   return True
+def _lookups_unchanged(entry, lang, project_files):
+   """
+   Результат парсинга зависит от набора файлов проекта только через
+   неотносительные импорты. Проверяем, что они сопоставляются так же,
+   как при создании записи кэша.
+   """
+   hits = [m for m in entry["lookups"] if project_has_module(m, lang, project_files)]
+   return hits == entry["hits"]
+def _parser_name(parser):
+   """Имя парсера для кэша и статистики."""
+   return getattr(parser, "__name__", str(parser))
+def _oversized_mismatch(entry, lang, size, max_size):
+   """Запись о пропуске из-за размера не соответствует размеру файла (или наоборот)."""
+   limited = lang not in BINARY_LANGS and max_size and size > max_size
+   return (entry.get("skipped") == "oversized") != bool(limited)
+def cached_entry(lang, file_path, rel_file, project_files, old_entries, stats=None, parser=None,
+                max_size=MAX_PARSE_FILE_SIZE, file_stat=None):
+   """
+   Возвращает действительную запись кэша для файла или None.
+   Запись действительна, если совпадают mtime и размер (или, при изменившемся
+   mtime, хеш содержимого) и неотносительные импорты сопоставляются так же.
+   Если передан parser, запись должна быть создана этим же парсером
+   (например, при смене --python-backend кэш файла не используется).
+   Запись о пропуске из-за размера действительна, только пока файл
+   превышает max_size, и наоборот. file_stat – (mtime_ns, размер),
+   собранные при обходе (см. scan_directory_model с with_stats): тогда
+   stat повторно не вызывается.
+   """
+   entry = old_entries.get(rel_file)
+   if entry is None or entry.get("lang") != lang:
+       return None
+   if parser is not None and entry.get("parser") != _parser_name(parser):
+       return None
+   if file_stat is None:
+       st = os.stat(file_path)
+       file_stat = (st.st_mtime_ns, st.st_size)
+   mtime, size = file_stat
+   if _oversized_mismatch(entry, lang, size, max_size):
+       return None
+   if entry["mtime"] == mtime and entry["size"] == size:
+       return entry if _lookups_unchanged(entry, lang, project_files) else None
+   if entry["hash"] is None:
+       return None
+   with open(file_path, "rb") as f:
+       data = f.read()
+   if stats is not None:
+       stats["bytes_read"] += len(data)
+   digest = hashlib.sha1(data).hexdigest()
+   if entry["hash"] == digest and _lookups_unchanged(entry, lang, project_files):
+       return dict(entry, mtime=mtime, size=size)
+   return None
+class SkipFile(Exception):
+   """Парсер не может разобрать файл; args[0] – категория из SKIP_CATEGORIES."""
+def sniff_file(head):
+   """
+   Классифицирует файл по первым байтам head: "binary" (есть NUL),
+   "undecodable" (не UTF-8), "generated" (метка в заголовке), "minified"
+   (слишком длинные строки) или None, если файл можно парсить.
+   """
+   if b"\0" in head:
+       return "binary"
+   try:
+       head.decode("utf-8")
+   except UnicodeDecodeError as e:
+       # Многобайтовый символ может быть обрезан на границе прочитанного
+       if e.start < len(head) - 3:
+           return "undecodable"
+   lines = head.split(b"\n")
+   for line in lines[:GENERATED_HEADER_LINES]:
+       if re.search(GENERATED_MARKER_REGEX, line):
+           return "generated"
+   if len(head) >= 1024 and (max(map(len, lines)) > MINIFIED_MAX_LINE
+                             or len(head) / len(lines) > MINIFIED_AVG_LINE):
+       return "minified"
+   return None
+def _skipped_entry(lang, parser, st, category, read):
+   """Запись кэша для файла, который не парсился (category – из SKIP_CATEGORIES)."""
+   return {
+       "lang": lang,
+       "parser": _parser_name(parser),
+       "mtime": st.st_mtime_ns,
+       "size": st.st_size,
+       "lines": 0,
+       "hash": None,
+       "lookups": [],
+       "hits": [],
+       "elements": (),
+       "skipped": category,
+       "read": read
+   }
+def _binary_entry(parser, lang, file_path, root_dir, project_files, st):
+   """
+   Запись кэша для файла двоичного формата. Хеша нет (при смене mtime файл
+   перепарсивается), строки не считаются; объём прочитанного парсером
+   не измерить, и в статистику он не попадает.
+   """
+   try:
+       elements = compact_elements(parser(file_path, root_dir, project_files))
+   except SkipFile as e:
+       return _skipped_entry(lang, parser, st, e.args[0], 0)
+   return {
+       "lang": lang,
+       "parser": _parser_name(parser),
+       "mtime": st.st_mtime_ns,
+       "size": st.st_size,
+       "lines": 0,
+       "hash": None,
+       "lookups": [],
+       "hits": [],
+       "elements": elements,
+       "read": 0
+   }
+# Парсер -> принимает ли он аргумент content (см. register_parser)
+_PARSER_ARGUMENTS = {}
+def _parser_arguments(parser):
+   """Имена аргументов парсера (для content и modules, см. register_parser)."""
+   names = _PARSER_ARGUMENTS.get(parser)
+   if names is None:
+       import inspect
+       try:
+           names = frozenset(inspect.signature(parser).parameters)
+       except (TypeError, ValueError):
+           names = frozenset()
+       _PARSER_ARGUMENTS[parser] = names
+   return names
+def _accepts_content(parser):
+   """Принимает ли парсер байты файла, прочитанные заранее (аргумент content)."""
+   return "content" in _parser_arguments(parser)
+def parse_file_entry(parser, lang, file_path, root_dir, project_files, max_size=MAX_PARSE_FILE_SIZE,
+                     prefetched=None):
+   """
+   Парсит файл и формирует для него запись кэша. Файлы больше max_size
+   (0 – без ограничения) не читаются; у остальных сначала проверяются первые
+   SNIFF_BYTES байт (см. sniff_file). Пропущенные файлы, а также файлы,
+   в которых ошибка декодирования встретилась дальше, получают запись
+   с "skipped" и пустым списком элементов. Файлы двоичных форматов
+   (BINARY_LANGS) передаются парсеру без этих проверок.
+   prefetched – результат read_file_bytes (stat и байты файла, прочитанные
+   заранее, см. prefetch_files): тогда файл повторно не открывается.
+   Иначе файл отображается в память (mmap) один раз: по отображению
+   считаются хеш, число строк и импорты, оно же передаётся парсеру
+   как content, а найденные импорты – как modules (см. register_parser).
+   """
+   data = None
+   if prefetched is not None:
+       st, data = prefetched
+   else:
+       st = os.stat(file_path)
+   if lang in BINARY_LANGS:
+       return _binary_entry(parser, lang, file_path, root_dir, project_files, st)
+   if max_size and st.st_size > max_size:
+       return _skipped_entry(lang, parser, st, "oversized", 0)
+   if data is not None:
+       category = sniff_file(data[:SNIFF_BYTES])
+       if category is not None:
+           return _skipped_entry(lang, parser, st, category, len(data))
+       return _parsed_entry(parser, lang, file_path, root_dir, project_files, st, data)
+   with open(file_path, "rb") as f:
+       head = f.read(SNIFF_BYTES)
+       category = sniff_file(head)
+       if category is not None:
+           return _skipped_entry(lang, parser, st, category, len(head))
+       buffer = _map_file(f)
+       if buffer is None:
+           return _parsed_entry(parser, lang, file_path, root_dir, project_files, st, b"")
+       with buffer:
+           return _parsed_entry(parser, lang, file_path, root_dir, project_files, st, buffer)
+def _parsed_entry(parser, lang, file_path, root_dir, project_files, st, buffer):
+   """
+   Запись кэша для файла, прошедшего проверки parse_file_entry; buffer –
+   его содержимое (bytes или mmap), которое не копируется целиком.
+   """
+   digest = hashlib.sha1(buffer)
+   line_count = 0
+   for start in range(0, len(buffer), 1 << 20):
+       line_count += buffer[start:start + (1 << 20)].count(b"\n")
+   modules = list(_iter_import_matches(buffer, lang))
+   arguments = {}
+   if _accepts_content(parser):
+       arguments["content"] = buffer
+   if "modules" in _parser_arguments(parser):
+       arguments["modules"] = modules
+   try:
+       elements = compact_elements(parser(file_path, root_dir, project_files, **arguments))
+   except UnicodeDecodeError:
+       return _skipped_entry(lang, parser, st, "undecodable", st.st_size)
+   except SkipFile as e:
+       return _skipped_entry(lang, parser, st, e.args[0], st.st_size)
+   lookups = []
+   for module, is_local in modules:
+       if not is_local and module not in lookups:
+           lookups.append(module)
+   return {
+       "lang": lang,
+       "parser": _parser_name(parser),
+       "mtime": st.st_mtime_ns,
+       "size": st.st_size,
+       "lines": line_count,
+       "hash": digest.hexdigest(),
+       "lookups": lookups,
+       "hits": [m for m in lookups if project_has_module(m, lang, project_files)],
+       "elements": elements
+   }
+# ==============================
+# Чтение файлов впереди парсера (--prefetch)
+# ==============================
+# На медленных (сетевых) файловых системах каждое открытие и чтение файла
+# ждёт ответа сервера. Пул потоков читает файлы заранее, пока основной поток
+# парсит уже прочитанные; очередь ограничена, поэтому память не растёт.
+PREFETCH_QUEUE_FILES = 32
+def read_file_bytes(file_path, max_size=MAX_PARSE_FILE_SIZE):
+   """
+   (stat, байты) файла за одно открытие; вместо байтов None, если файл
+   больше max_size (0 – без ограничения): такой файл не парсится.
+   """
+   with open(file_path, "rb") as f:
+       st = os.fstat(f.fileno())
+       if max_size and st.st_size > max_size:
+           return st, None
+       return st, f.read()
+def _prefetch_one(task, max_size, reader):
+   """Результат reader для задачи или None (двоичный формат, ошибка чтения)."""
+   if task["lang"] in BINARY_LANGS:
+       return None
+   try:
+       return reader(task["path"], max_size)
+   except OSError:
+       return None
+def prefetch_files(tasks, threads, queue_size=PREFETCH_QUEUE_FILES, max_size=MAX_PARSE_FILE_SIZE,
+                   reader=read_file_bytes):
+   """
+   Отдаёт (задача, результат reader или None) в порядке tasks, читая файлы
+   пулом из threads потоков. Прочитанных или читаемых, но ещё не отданных
+   файлов не больше queue_size: следующее чтение ставится в очередь, только
+   когда потребитель забирает файл (обратное давление), поэтому в памяти
+   одновременно не больше queue_size файлов размером до max_size.
+   Файлы двоичных форматов не читаются (см. BINARY_LANGS), а ошибки чтения
+   дают None: тогда файл читается при парсинге как обычно.
+   """
+   from collections import deque
+   from concurrent.futures import ThreadPoolExecutor
+   queue_size = max(1, queue_size)
+   with ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="prefetch") as pool:
+       pending = deque()
+       remaining = iter(tasks)
+       for task in remaining:
+           pending.append((task, pool.submit(_prefetch_one, task, max_size, reader)))
+           if len(pending) >= queue_size:
+               break
+       while pending:
+           task, future = pending.popleft()
+           result = future.result()
+           for next_task in remaining:
+               pending.append((next_task, pool.submit(_prefetch_one, next_task, max_size, reader)))
+               break
+           yield task, result
+# ==============================
+# Параллельный парсинг
+# ==============================
+# Множество файлов проекта в процессе-обработчике (передаётся один раз при старте)
+_WORKER_PROJECT_FILES = None
+def _init_parse_worker(project_files):
+   """Инициализация процесса-обработчика."""
+   global _WORKER_PROJECT_FILES
+   _WORKER_PROJECT_FILES = project_files
+def _timed_parse(parser, lang, file_path, root_dir, project_files, max_size=MAX_PARSE_FILE_SIZE,
+                prefetched=None):
+   """Парсит файл; возвращает (запись кэша, время парсинга в секундах)."""
+   start = time.perf_counter()
+   entry = parse_file_entry(parser, lang, file_path, root_dir, project_files, max_size, prefetched)
+   return entry, time.perf_counter() - start
+def _parse_worker(job):
+   """Парсит один файл в процессе-обработчике."""
+   parser, lang, file_path, root_dir, max_size = job
+   return _timed_parse(parser, lang, file_path, root_dir, _WORKER_PROJECT_FILES, max_size)
+def parse_files(tasks, root_dir, project_files, old_entries, jobs=1, stats=None,
+                max_size=MAX_PARSE_FILE_SIZE, prefetch=0, prefetch_queue=PREFETCH_QUEUE_FILES,
+                reader=None):
+   """
+   Возвращает записи кэша для задач парсинга в том же порядке, что и tasks.
+   Файлы, которых нет в кэше, при jobs > 1 парсятся в пуле процессов;
+   порядок результатов от этого не зависит. Файлы больше max_size
+   и не прошедшие проверку sniff_file не парсятся.
+   При jobs = 1 и prefetch > 0 файлы читаются впереди парсера пулом из
+   prefetch потоков (см. prefetch_files, не больше prefetch_queue файлов
+   в очереди). reader – функция чтения (по умолчанию read_file_bytes); если
+   она передана без prefetch, файлы читаются ею же в том же потоке.
+   Если передан stats (см. new_run_stats), в него добавляются счётчики
+   и время парсинга по файлам.
+   """
+   entries = [
+       cached_entry(task["lang"], task["path"], task["rel_file"], project_files, old_entries, stats,
+                    task["parser"], max_size, task.get("stat"))
+       for task in tasks
+   ]
+   missing = [i for i, entry in enumerate(entries) if entry is None]
+   timings = {}
+   if jobs > 1 and len(missing) > 1:
+       from concurrent.futures import ProcessPoolExecutor
+       job_args = [
+           (tasks[i]["parser"], tasks[i]["lang"], tasks[i]["path"], root_dir, max_size)
+           for i in missing
+       ]
+       chunksize = max(1, len(job_args) // (jobs * 4))
+       with ProcessPoolExecutor(max_workers=jobs, initializer=_init_parse_worker,
+                                initargs=(project_files,)) as executor:
+           for i, (entry, seconds) in zip(missing, executor.map(_parse_worker, job_args, chunksize=chunksize)):
+               entries[i] = entry
+               timings[i] = seconds
+   else:
+       missing_tasks = [tasks[i] for i in missing]
+       if prefetch > 0:
+           source = prefetch_files(missing_tasks, prefetch, prefetch_queue, max_size,
+                                   reader or read_file_bytes)
+       elif reader is not None:
+           source = ((task, _prefetch_one(task, max_size, reader)) for task in missing_tasks)
+       else:
+           source = ((task, None) for task in missing_tasks)
+       for i, (task, prefetched) in zip(missing, source):
+           entries[i], timings[i] = _timed_parse(task["parser"], task["lang"], task["path"],
+                                                 root_dir, project_files, max_size, prefetched)
+   if stats is not None:
+       for i, (task, entry) in enumerate(zip(tasks, entries)):
+           lang_stats = stats["languages"].setdefault(
+               task["lang"], {"files": 0, "parsed": 0, "lines": 0, "bytes": 0, "seconds": 0.0})
+           lang_stats["files"] += 1
+           lang_stats["lines"] += entry.get("lines", 0)
+           lang_stats["bytes"] += entry["size"]
+           if entry.get("skipped"):
+               stats["skipped"][entry["skipped"]] += 1
+           if i in timings:
+               stats["files"]["parsed"] += 1
+               stats["bytes_read"] += entry.get("read", entry["size"])
+               lang_stats["parsed"] += 1
+               lang_stats["seconds"] += timings[i]
+               stats["_timings"].append((timings[i], task["rel_file"], task["lang"],
+                                         _parser_name(task["parser"]),
+                                         entry.get("lines", 0)))
+           else:
+               stats["files"]["cached"] += 1
+   return entries
+# ==============================
+# Статистика запуска (--stats)
+# ==============================
+def new_run_stats():
+   """
+   Пустая статистика запуска: время по фазам, счётчики файлов,
+   пропущенные при парсинге файлы по категориям (см. SKIP_CATEGORIES),
+   объём прочитанных данных и итоги по языкам.
+   """
+   return {
+       "phases": {},
+       "files": {"total": 0, "parsed": 0, "cached": 0, "unparsed": 0},
+       "skipped": dict.fromkeys(SKIP_CATEGORIES, 0),
+       "bytes_read": 0,
+       "languages": {},
+       "slowest": [],
+       "_timings": []
+   }
+def finish_run_stats(stats, top=10):
+   """
+   Оставляет в stats["slowest"] top самых медленных файлов и убирает
+   служебные данные. Возвращает stats.
+   """
+   timings = stats.pop("_timings", [])
+   stats["slowest"] = [
+       {"path": path, "lang": lang, "parser": parser, "seconds": seconds, "lines": lines}
+       for seconds, path, lang, parser, lines in heapq.nlargest(top, timings)
+   ]
+   return stats
+def format_run_stats(stats):
+   """
+   Человекочитаемый отчёт по статистике запуска (список строк).
+   """
+   files = stats["files"]
+   lines = ["[STATS] Время по фазам:"]
+   for phase, seconds in stats["phases"].items():
+       lines.append(f"  {phase:<12} {seconds:9.4f} с")
+   lines.append(
+       f"[STATS] Файлов: {files['total']}, распарсено: {files['parsed']}, "
+       f"из кэша: {files['cached']}, без парсера: {files['unparsed']}; "
+       f"прочитано байт: {stats['bytes_read']}"
+   )
+   if any(stats["skipped"].values()):
+       lines.append("[STATS] Не парсились: " + ", ".join(
+           f"{SKIP_CATEGORIES[category]} – {count}"
+           for category, count in stats["skipped"].items() if count
+       ))
+   if "symbol_index" in stats:
+       lines.append(f"[STATS] Индекс символов: обновлено файлов {stats['symbol_index']['updated']}, "
+                    f"удалено {stats['symbol_index']['removed']}")
+   if "sections" in stats:
+       lines.append(f"[STATS] Разделы папок: изменилось {stats['sections']['changed']}, "
+                    f"без изменений {stats['sections']['unchanged']}")
+   if stats["languages"]:
+       lines.append("[STATS] По языкам:")
+       for lang, lang_stats in sorted(stats["languages"].items()):
+           lines.append(
+               f"  {lang:<8} файлов: {lang_stats['files']}, распарсено: {lang_stats['parsed']}, "
+               f"строк: {lang_stats['lines']}, байт: {lang_stats['bytes']}, "
+               f"парсинг: {lang_stats['seconds']:.4f} с"
+           )
+   if stats["slowest"]:
+       lines.append("[STATS] Самые медленные файлы:")
+       for item in stats["slowest"]:
+           lines.append(
+               f"  {item['seconds']:9.4f} с  {item['path']} ({item['parser']}, строк: {item['lines']})"
+           )
+   return lines
+# ==============================
+# Граф зависимостей между файлами
+# ==============================
+# Расширения, которые подставляются к импорту JS без расширения (и к index)
+JS_RESOLVE_EXTENSIONS = (".js", ".mjs", ".cjs", ".jsx", ".ts", ".tsx", ".json")
+def _posix_path(rel_file):
+   """Путь файла от корня проекта через "/" и без "./"."""
+   return os.path.normpath(rel_file).replace(os.sep, "/")
+class ImportResolver:
+   """
+   Сопоставляет импорт конкретному файлу проекта: относительные пути
+   (с подстановкой расширения и index.* для JS, __init__.py для пакетов
+   Python), пути от корня и, для неотносительных импортов, файл с тем же
+   окончанием пути (предпочтительно ближайший к импортирующему файлу).
+   """
+   __slots__ = ("_paths", "_by_name")
+   def __init__(self, paths):
+       self._paths = set(paths)
+       self._by_name = {}
+       for path in self._paths:
+           self._by_name.setdefault(path.rsplit("/", 1)[-1].lower(), []).append(path)
+   def _first_existing(self, candidates):
+       for candidate in candidates:
+           if candidate in self._paths:
+               return candidate
+       return None
+   def _by_suffix(self, suffix, source, ignore_case=False):
+       """Файл, путь которого оканчивается на suffix (целыми компонентами)."""
+       name = suffix.rsplit("/", 1)[-1].lower()
+       key = suffix.lower() if ignore_case else suffix
+       matches = [
+           path for path in self._by_name.get(name, ())
+           if (path.lower() if ignore_case else path) == key
+           or (path.lower() if ignore_case else path).endswith("/" + key)
+       ]
+       if not matches:
+           return None
+       if len(matches) == 1:
+           return matches[0]
+       # Несколько кандидатов – берём ближайший к импортирующему файлу
+       source_dir = posixpath.dirname(source)
+       return min(matches, key=lambda path: (
+           -len(posixpath.commonpath([source_dir, posixpath.dirname(path)])) if source_dir else 0, path))
+   def resolve(self, module, lang, source):
+       """Путь файла проекта для импорта module из файла source или None."""
+       source_dir = posixpath.dirname(source)
+       if lang == "python":
+           stripped = module.lstrip(".")
+           rel = stripped.replace(".", "/")
+           if len(stripped) != len(module):
+               base = posixpath.join(source_dir, *([".."] * (len(module) - len(stripped) - 1)))
+               base = posixpath.normpath(posixpath.join(base, rel)) if rel else posixpath.normpath(base)
+               return self._first_existing([base + ".py", posixpath.join(base, "__init__.py")])
+           found = self._first_existing([
+               posixpath.normpath(posixpath.join(source_dir, rel + ".py")),
+               posixpath.normpath(posixpath.join(source_dir, rel, "__init__.py")),
+               rel + ".py",
+               rel + "/__init__.py"
+           ])
+           return found or self._by_suffix(rel + ".py", source)
+       if lang == "js":
+           if module.startswith((".", "/")):
+               base = module.lstrip("/") if module.startswith("/") else posixpath.join(source_dir, module)
+               base = posixpath.normpath(base)
+               candidates = [base]
+               candidates.extend(base + ext for ext in JS_RESOLVE_EXTENSIONS)
+               candidates.extend(posixpath.join(base, "index" + ext) for ext in JS_RESOLVE_EXTENSIONS)
+               return self._first_existing(candidates)
+           return self._by_suffix(module + ".js", source, ignore_case=True)
+       if lang == "html":
+           src = module.split("?", 1)[0].split("#", 1)[0]
+           base = src.lstrip("/") if src.startswith("/") else posixpath.join(source_dir, src)
+           return self._first_existing([posixpath.normpath(base)])
+       if lang == "swift":
+           return self._by_suffix(module + ".swift", source, ignore_case=True)
+       return None
+def strongly_connected_components(nodes, edges):
+   """
+   Компоненты сильной связности графа (алгоритм Тарьяна без рекурсии, O(V+E)).
+   edges – {вершина: [вершины, в которые ведут рёбра]}.
+   """
+   index = {}
+   low = {}
+   on_stack = set()
+   stack = []
+   components = []
+   counter = 0
+   for root in nodes:
+       if root in index:
+           continue
+       index[root] = low[root] = counter
+       counter += 1
+       stack.append(root)
+       on_stack.add(root)
+       work = [(root, 0)]
+       while work:
+           node, i = work[-1]
+           targets = edges.get(node, ())
+           if i < len(targets):
+               work[-1] = (node, i + 1)
+               target = targets[i]
+               if target not in index:
+                   index[target] = low[target] = counter
+                   counter += 1
+                   stack.append(target)
+                   on_stack.add(target)
+                   work.append((target, 0))
+               elif target in on_stack:
+                   low[node] = min(low[node], index[target])
+               continue
+           work.pop()
+           if work:
+               parent = work[-1][0]
+               low[parent] = min(low[parent], low[node])
+           if low[node] == index[node]:
+               component = []
+               while True:
+                   member = stack.pop()
+                   on_stack.discard(member)
+                   component.append(member)
+                   if member == node:
+                       break
+               components.append(component)
+   return components
+def build_dependency_graph(files, project_files):
+   """
+   Граф зависимостей по результатам парсинга. files – пары
+   (относительный путь файла, язык, элементы), project_files – все файлы
+   проекта. Импорты из элементов (поле "imports") сопоставляются файлам
+   через ImportResolver. Возвращает словарь:
+    - "edges" / "reverse": {файл: [файлы, которые он импортирует / которые импортируют его]};
+    - "unresolved": {файл: [импорты, не найденные среди файлов проекта]};
+    - "cycles": циклы импортов – компоненты сильной связности из нескольких
+      файлов (списки путей, отсортированы);
+    - "edge_count".
+   Пути – от корня проекта через "/". Всё считается за O(V+E).
+   """
+   resolver = ImportResolver(_posix_path(pf) for pf in project_files)
+   edges = {}
+   unresolved = {}
+   for rel_file, lang, elements in files:
+       source = _posix_path(rel_file)
+       targets = []
+       missing = []
+       for elem in elements:
+           for module in elem.imports:
+               target = resolver.resolve(module, lang, source)
+               if target is None:
+                   missing.append(module)
+               elif target != source:
+                   # "from . import x" в __init__.py указывает на сам файл
+                   targets.append(target)
+       if targets:
+           edges[source] = list(dict.fromkeys(targets))
+       if missing:
+           unresolved[source] = list(dict.fromkeys(missing))
+   reverse = {}
+   for source in sorted(edges):
+       for target in edges[source]:
+           reverse.setdefault(target, []).append(source)
+   nodes = sorted(set(edges) | set(reverse))
+   cycles = []
+   for component in strongly_connected_components(nodes, edges):
+       if len(component) > 1:
+           cycles.append(sorted(component))
+   cycles.sort()
+   return {
+       "edges": edges,
+       "reverse": reverse,
+       "unresolved": unresolved,
+       "cycles": cycles,
+       "edge_count": sum(len(targets) for targets in edges.values())
+   }
+# ==============================
+# Формирование содержимого ARCHITECTURE.md
+# ==============================
+def render_folder_section(path_key, folder_data):
+   """
+   Формирует строки раздела "### Папка: ..." для одной папки.
+   """
+   lines = []
+   lines.append(f"### Папка: {path_key}")
+   files_list = folder_data["files"]
+   details_list = folder_data["details"]
+   if files_list:
+       lines.append("Содержимые файлы:")
+       for fn in sorted(files_list):
+           lines.append(f"- {fn}")
+   else:
+       lines.append("*(Нет файлов)*")
+   if details_list:
+       lines.append("\n**Детали по файлам:**")
+       for detail in details_list:
+           fname = detail.filename
+           lang = detail.lang
+           # Оборачиваем обработку файла в try/except для логирования имени файла при ошибке
+           try:
+               if detail.skipped:
+                   lines.append(f"- **Файл**: {fname} (язык: {lang}) – не разобран: "
+                                f"{SKIP_CATEGORIES.get(detail.skipped, detail.skipped)}")
+                   continue
+               lines.append(f"- **Файл**: {fname} (язык: {lang})")
+               for elem in detail.elements:
+                   lines.append(f"  - {elem.type.capitalize()}: **{elem.name}**")
+                   if elem.description:
+                       lines.append(f"    - *Описание:* {elem.description}")
+                   if elem.fields:
+                       lines.append(f"    - *Поля:* {', '.join(elem.fields)}")
+                   for m in elem.methods:
+                       if isinstance(m, str):
+                           # Имя метода без описания (парсеры JS и Swift)
+                           lines.append(f"    - *Метод:* {m}")
+                       elif m.description:
+                           lines.append(f"    - *Метод:* {m.name} - {m.description}")
+                       else:
+                           lines.append(f"    - *Метод:* {m.name}")
+                   if elem.exports:
+                       lines.append(f"    - *Экспорт:* {', '.join(elem.exports)}")
+                   if elem.imports:
+                       lines.append(f"    - *Импорты:* {', '.join(elem.imports)}")
+           except Exception as e:
+               lines.append(f"**Ошибка при обработке файла {fname}: {str(e)}**")
+   lines.append("")
+   return lines
+def render_tree_section(root_dir, model, max_depth=0, max_files=0):
+   """
+   Формирует строки раздела "## Структура проекта" с деревом папок
+   (max_depth, max_files – см. generate_directory_tree).
+   """
+   tree_text = generate_directory_tree(root_dir, model, max_depth=max_depth, max_files=max_files)
    lines = []
    lines.append("## Структура проекта")
    lines.append("")
@@ -547,99 +2372,1523 @@ def main():
    lines.extend(tree_text.splitlines())
    lines.append("```")
    lines.append("")
-   # Формируем оставшуюся часть содержимого ARCHITECTURE.md как список строк
-   for path_key in sorted(structure_data.keys()):
-       lines.append(f"### Папка: {path_key}")
-       files_list = structure_data[path_key]["files"]
-       details_list = structure_data[path_key]["details"]
-       if files_list:
-           lines.append("Содержимые файлы:")
-           for fn in sorted(files_list):
-               lines.append(f"- {fn}")
+   return lines
+def render_dependency_section(graph):
+   """
+   Формирует строки раздела "## Зависимости между файлами" по графу
+   из build_dependency_graph: циклы импортов и для каждого файла со связями –
+   что он импортирует (fan-out), где используется (fan-in) и какие
+   импорты не удалось сопоставить файлам проекта.
+   """
+   edges = graph["edges"]
+   reverse = graph["reverse"]
+   unresolved = graph["unresolved"]
+   files = sorted(set(edges) | set(reverse) | set(unresolved))
+   lines = ["## Зависимости между файлами"]
+   lines.append(
+       f"Файлов со связями: {len(files)}, связей: {graph['edge_count']}, "
+       f"неразрешённых импортов: {sum(len(modules) for modules in unresolved.values())}."
+   )
+   lines.append("\n**Циклы импортов:**")
+   if graph["cycles"]:
+       for cycle in graph["cycles"]:
+           lines.append(f"- {', '.join(cycle)}")
+   else:
+       lines.append("*(Циклов нет)*")
+   if files:
+       lines.append("\n**Связи по файлам:**")
+       for path in files:
+           targets = edges.get(path, [])
+           sources = reverse.get(path, [])
+           lines.append(f"- **{path}** (импортирует: {len(targets)}, используется в: {len(sources)})")
+           if targets:
+               lines.append(f"  - *Импортирует:* {', '.join(targets)}")
+           if sources:
+               lines.append(f"  - *Используется в:* {', '.join(sources)}")
+           if path in unresolved:
+               lines.append(f"  - *Не найдены:* {', '.join(unresolved[path])}")
+   lines.append("")
+   return lines
+def iter_architecture_lines(root_dir, model, structure_data, graph=None, sections=None,
+                            fragments_dir=None, tree_depth=0, tree_max_files=0):
+   """
+   Строки автогенерируемого блока по мере формирования: дерево папок,
+   разделы по папкам (каждый строится, только когда до него дошла запись)
+   и, если передан граф зависимостей, раздел о связях между файлами.
+   sections – разделы папок (см. FolderSections); при fragments_dir
+   вместо разделов выводятся ссылки на файлы-фрагменты. tree_depth
+   и tree_max_files ограничивают дерево (см. generate_directory_tree).
+   """
+   # Дерево папок проекта идёт в начале контента
+   yield from render_tree_section(root_dir, model, tree_depth, tree_max_files)
+   if fragments_dir is not None:
+       yield from render_fragment_links(root_dir, fragments_dir, structure_data)
+   elif sections is not None:
+       for _, lines, _ in sections:
+           yield from lines
+   else:
+       for path_key in sorted(structure_data.keys()):
+           yield from render_folder_section(path_key, structure_data[path_key])
+   if graph is not None:
+       yield from render_dependency_section(graph)
+def render_architecture(root_dir, model, structure_data, graph=None, sections=None, fragments_dir=None,
+                        tree_depth=0, tree_max_files=0):
+   """
+   Список строк автогенерируемого блока (см. iter_architecture_lines).
+   """
+   return list(iter_architecture_lines(root_dir, model, structure_data, graph, sections, fragments_dir,
+                                       tree_depth, tree_max_files))
+# ==============================
+# Разделы папок: кэш и файлы-фрагменты
+# ==============================
+# Раздел "### Папка: ..." зависит только от списка файлов папки и от записей
+# парсинга её файлов. Разделы всегда формируются заново (это дешевле, чем
+# хранить и разбирать их строки), а в SECTIONS_CACHE_FILE_NAME для каждой
+# папки хранятся ключ из этих данных и хеш текста раздела: по ним без
+# сравнения текста видно, изменился ли раздел (нужно для файлов-фрагментов).
+SECTIONS_CACHE_FILE_NAME = ".ARCHITECTURE.sections.json"
+FRAGMENT_FILE_NAME = "ARCHITECTURE.md"
+# Список фрагментов, записанных прошлым запуском: удаляются только они
+FRAGMENTS_MANIFEST_NAME = ".ARCHITECTURE.fragments.json"
+def _entry_identity(entry):
+   """
+   Данные записи кэша парсинга, определяющие её элементы: парсер, хеш
+   содержимого (или mtime и размер), сопоставленные импорты и категория пропуска.
+   """
+   content = entry.get("hash") or [entry["mtime"], entry["size"]]
+   return [entry.get("parser"), content, entry.get("hits", []), entry.get("skipped")]
+def section_key(files, tasks, entries):
+   """
+   Ключ раздела папки: список файлов и для каждого разбираемого файла –
+   язык и _entry_identity: запись кэша парсинга с теми же данными даёт
+   те же элементы.
+   """
+   data = [list(files)]
+   for task in tasks:
+       data.append([task["filename"], task["lang"]] + _entry_identity(entries[task["rel_file"]]))
+   return hashlib.sha1(json.dumps(data, ensure_ascii=False).encode("utf-8")).hexdigest()
+def load_section_cache(cache_path):
+   """
+   Ключи и хеши разделов прошлого запуска: {папка: [key, hash]}. Пустой,
+   если файла нет, он повреждён или создан другой версией скрипта
+   (тогда и текст разделов мог измениться).
+   """
+   try:
+       with open(cache_path, "r", encoding="utf-8") as f:
+           data = json.loads(f.read())
+   except (OSError, ValueError):
+       return {}
+   if (not isinstance(data, dict) or data.get("version") != CACHE_VERSION
+           or data.get("tool") != _tool_signature() or not isinstance(data.get("folders"), dict)):
+       return {}
+   return data["folders"]
+class FolderSections:
+   """
+   Разделы "### Папка: ..." всех папок в порядке папок; обход
+   (for folder, lines, changed in sections) формирует их по одному, поэтому
+   в памяти одновременно только один раздел. changed – изменился ли текст
+   раздела относительно прошлого запуска: если ключ папки (см. section_key)
+   тот же, текст тот же, иначе сравнивается sha1 текста с сохранённым
+   в cache_path. Кэш перезаписывается после полного обхода, если что-то
+   изменилось. Обходится один раз; после обхода changed – папки
+   с изменившимся текстом, unchanged – число остальных (они же
+   в stats["sections"], если передан stats).
+   """
+   def __init__(self, structure_data, folder_tasks, entries, cache_path=None, stats=None):
+       self._structure = structure_data
+       self._folder_tasks = folder_tasks
+       self._entries = entries
+       self._cache_path = cache_path
+       self._old = load_section_cache(cache_path) if cache_path else {}
+       self._stats = stats
+       self.changed = set()
+       self.unchanged = 0
+   def __iter__(self):
+       folders = {}
+       completed = False
+       try:
+           for folder in sorted(self._structure):
+               folder_data = self._structure[folder]
+               key = section_key(folder_data["files"], self._folder_tasks.get(folder, ()), self._entries)
+               lines = render_folder_section(folder, folder_data)
+               old = self._old.get(folder)
+               if old is not None and old[0] == key:
+                   digest = old[1]
+                   changed = False
+               else:
+                   digest = hashlib.sha1("\n".join(lines).encode("utf-8")).hexdigest()
+                   changed = old is None or old[1] != digest
+               if changed:
+                   self.changed.add(folder)
+               else:
+                   self.unchanged += 1
+               folders[folder] = [key, digest]
+               yield folder, lines, changed
+           completed = True
+       finally:
+           if completed and self._cache_path and folders != self._old:
+               tmp_path = self._cache_path + ".tmp"
+               with open(tmp_path, "w", encoding="utf-8") as f:
+                   f.write(json.dumps({"version": CACHE_VERSION, "tool": _tool_signature(), "folders": folders},
+                                      ensure_ascii=False, separators=(",", ":")))
+               os.replace(tmp_path, self._cache_path)
+           if self._stats is not None:
+               self._stats["sections"] = {"changed": len(self.changed), "unchanged": self.unchanged}
+def fragment_path(fragments_dir, folder):
+   """Файл-фрагмент папки: та же структура папок внутри fragments_dir."""
+   return os.path.normpath(os.path.join(fragments_dir, folder, FRAGMENT_FILE_NAME))
+def render_fragment_links(root_dir, fragments_dir, structure_data):
+   """
+   Вместо разделов папок в сгенерированный блок попадают ссылки
+   на их файлы-фрагменты (пути относительно root_dir).
+   """
+   lines = ["## Разделы по папкам", ""]
+   for folder in sorted(structure_data):
+       link = os.path.relpath(fragment_path(fragments_dir, folder), root_dir).replace(os.sep, "/")
+       lines.append(f"- [{folder}]({link})")
+   lines.append("")
+   return lines
+def write_fragments(fragments_dir, sections):
+   """
+   Пишет раздел каждой папки в свой файл-фрагмент; sections – тройки
+   (папка, строки, изменился ли текст), например FolderSections. Файл
+   перезаписывается, только если текст раздела изменился или файла нет.
+   Фрагменты исчезнувших папок удаляются, как и опустевшие после этого
+   каталоги, но только если их записал прошлый запуск (список –
+   в FRAGMENTS_MANIFEST_NAME): чужие ARCHITECTURE.md в fragments_dir
+   не трогаются. Возвращает число записанных файлов.
+   """
+   manifest_path = os.path.join(fragments_dir, FRAGMENTS_MANIFEST_NAME)
+   try:
+       with open(manifest_path, "r", encoding="utf-8") as f:
+           previous = {os.path.normpath(os.path.join(fragments_dir, rel)) for rel in json.load(f)}
+   except (OSError, ValueError, TypeError):
+       previous = set()
+   written = 0
+   keep = set()
+   for folder, lines, changed in sections:
+       path = fragment_path(fragments_dir, folder)
+       keep.add(path)
+       if not changed and os.path.exists(path):
+           continue
+       os.makedirs(os.path.dirname(path), exist_ok=True)
+       tmp_path = path + ".tmp"
+       with open(tmp_path, "w", encoding="utf-8") as f:
+           f.write("\n".join(lines))
+       os.replace(tmp_path, path)
+       written += 1
+   for path in sorted(previous - keep, reverse=True):
+       if not _is_inside(path, fragments_dir):
+           continue
+       try:
+           os.unlink(path)
+       except OSError:
+           continue
+       dir_path = os.path.dirname(path)
+       while dir_path != fragments_dir and _is_inside(dir_path, fragments_dir) and not os.listdir(dir_path):
+           os.rmdir(dir_path)
+           dir_path = os.path.dirname(dir_path)
+   os.makedirs(fragments_dir, exist_ok=True)
+   with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+       json.dump(sorted(os.path.relpath(path, fragments_dir) for path in keep), f, ensure_ascii=False)
+   os.replace(manifest_path + ".tmp", manifest_path)
+   return written
+# ==============================
+# Индекс символов (SQLite)
+# ==============================
+# Классы, функции, поля, методы, экспорты и импорты всех файлов хранятся
+# в SYMBOL_INDEX_FILE_NAME. Запуск обновляет только файлы, у которых
+# изменились результат парсинга или сопоставление импортов; подкоманда
+# query ищет по индексу без обхода проекта.
+SYMBOL_INDEX_FILE_NAME = ".ARCHITECTURE.index.sqlite"
+SYMBOL_INDEX_VERSION = 1
+SYMBOL_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS files (
+   id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE, lang TEXT, key TEXT
+);
+CREATE TABLE IF NOT EXISTS symbols (
+   file_id INTEGER NOT NULL, kind TEXT NOT NULL, name TEXT NOT NULL, parent TEXT, description TEXT
+);
+CREATE TABLE IF NOT EXISTS imports (file_id INTEGER NOT NULL, module TEXT NOT NULL, target TEXT);
+CREATE INDEX IF NOT EXISTS symbols_name ON symbols (name);
+CREATE INDEX IF NOT EXISTS symbols_file ON symbols (file_id);
+CREATE INDEX IF NOT EXISTS imports_file ON imports (file_id);
+CREATE INDEX IF NOT EXISTS imports_target ON imports (target);
+CREATE INDEX IF NOT EXISTS imports_module ON imports (module);
+"""
+# Верхняя граница для поиска по префиксу через индекс: name >= p AND name < p + MAX_CHAR
+_MAX_CHAR = "\U0010ffff"
+def open_symbol_index(db_path):
+   """
+   Открывает (и при необходимости создаёт) индекс символов. Индекс другой
+   версии схемы пересоздаётся; если изменился скрипт, все файлы
+   переиндексируются, так как парсеры могли измениться.
+   """
+   import sqlite3
+   conn = sqlite3.connect(db_path)
+   if conn.execute("PRAGMA user_version").fetchone()[0] != SYMBOL_INDEX_VERSION:
+       conn.executescript(
+           "DROP TABLE IF EXISTS meta; DROP TABLE IF EXISTS files;"
+           "DROP TABLE IF EXISTS symbols; DROP TABLE IF EXISTS imports;"
+       )
+       conn.executescript(SYMBOL_INDEX_SCHEMA)
+       conn.execute(f"PRAGMA user_version = {SYMBOL_INDEX_VERSION}")
+   # Индекс восстанавливается следующим запуском, полная синхронизация не нужна
+   conn.execute("PRAGMA synchronous = OFF")
+   tool = _tool_signature()
+   row = conn.execute("SELECT value FROM meta WHERE key = 'tool'").fetchone()
+   if row is None or row[0] != tool:
+       with conn:
+           conn.execute("DELETE FROM files")
+           conn.execute("DELETE FROM symbols")
+           conn.execute("DELETE FROM imports")
+           conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('tool', ?)", (tool,))
+   return conn
+def iter_element_symbols(elements):
+   """
+   Символы файла: (вид, имя, родитель, описание). Вид – тип элемента
+   ("class", "struct", "def", "function", ...), "field", "method" или "export";
+   родитель – имя класса для полей и методов.
+   """
+   for elem in elements:
+       if elem.type in ("file_comment", "file_imports"):
+           continue
+       if elem.type == "exports":
+           for name in elem.exports:
+               yield "export", name, None, ""
+           continue
+       yield elem.type, elem.name, None, elem.description
+       for field in elem.fields:
+           yield "field", field, elem.name, ""
+       for m in elem.methods:
+           if isinstance(m, str):
+               yield "method", m, elem.name, ""
+           else:
+               yield "method", m.name, elem.name, m.description
+def update_symbol_index(db_path, tasks, entries, graph, project_files):
+   """
+   Обновляет индекс символов по результатам запуска: файлы, ключ которых
+   (запись парсинга и сопоставленные импорты) не изменился, не трогаются,
+   остальные переписываются, исчезнувшие удаляются – всё в одной транзакции.
+   Возвращает {"updated": число переписанных файлов, "removed": число удалённых}.
+   """
+   conn = open_symbol_index(db_path)
+   try:
+       known = {path: (file_id, key) for file_id, path, key in conn.execute("SELECT id, path, key FROM files")}
+       seen = set()
+       resolver = None
+       updated = 0
+       with conn:
+           for task in tasks:
+               entry = entries[task["rel_file"]]
+               path = _posix_path(task["rel_file"])
+               seen.add(path)
+               key = hashlib.sha1(json.dumps([
+                   task["lang"], _entry_identity(entry),
+                   graph["edges"].get(path), graph["unresolved"].get(path)
+               ], ensure_ascii=False).encode("utf-8")).hexdigest()
+               old = known.get(path)
+               if old is not None and old[1] == key:
+                   continue
+               if old is not None:
+                   file_id = old[0]
+                   conn.execute("DELETE FROM symbols WHERE file_id = ?", (file_id,))
+                   conn.execute("DELETE FROM imports WHERE file_id = ?", (file_id,))
+                   conn.execute("UPDATE files SET lang = ?, key = ? WHERE id = ?", (task["lang"], key, file_id))
+               else:
+                   file_id = conn.execute("INSERT INTO files (path, lang, key) VALUES (?, ?, ?)",
+                                          (path, task["lang"], key)).lastrowid
+               conn.executemany(
+                   "INSERT INTO symbols (file_id, kind, name, parent, description) VALUES (?, ?, ?, ?, ?)",
+                   ((file_id,) + symbol for symbol in iter_element_symbols(entry["elements"]))
+               )
+               modules = list(dict.fromkeys(m for elem in entry["elements"] for m in elem.imports))
+               if modules:
+                   if resolver is None:
+                       resolver = ImportResolver(_posix_path(pf) for pf in project_files)
+                   conn.executemany(
+                       "INSERT INTO imports (file_id, module, target) VALUES (?, ?, ?)",
+                       ((file_id, m, resolver.resolve(m, task["lang"], path)) for m in modules)
+                   )
+               updated += 1
+           removed = [(file_id,) for path, (file_id, _) in known.items() if path not in seen]
+           conn.executemany("DELETE FROM symbols WHERE file_id = ?", removed)
+           conn.executemany("DELETE FROM imports WHERE file_id = ?", removed)
+           conn.executemany("DELETE FROM files WHERE id = ?", removed)
+   finally:
+       conn.close()
+   return {"updated": updated, "removed": len(removed)}
+def query_symbols(conn, name=None, prefix=None, file=None, kind=None, limit=50):
+   """
+   Символы по точному имени, префиксу имени и/или файлу (путь от корня
+   через "/"): список (путь, вид, имя, родитель, описание).
+   """
+   conditions = []
+   params = []
+   if name is not None:
+       conditions.append("s.name = ?")
+       params.append(name)
+   if prefix is not None:
+       conditions.append("s.name >= ? AND s.name < ?")
+       params.extend((prefix, prefix + _MAX_CHAR))
+   if file is not None:
+       conditions.append("f.path = ?")
+       params.append(_posix_path(file))
+   if kind is not None:
+       conditions.append("s.kind = ?")
+       params.append(kind)
+   sql = ("SELECT f.path, s.kind, s.name, s.parent, s.description"
+          " FROM symbols s JOIN files f ON f.id = s.file_id")
+   if conditions:
+       sql += " WHERE " + " AND ".join(conditions)
+   sql += " ORDER BY f.path, s.rowid"
+   if limit:
+       sql += f" LIMIT {int(limit)}"
+   return conn.execute(sql, params).fetchall()
+def query_importers(conn, target, limit=50):
+   """
+   Файлы, импортирующие target: путь файла проекта (можно без расширения)
+   или имя модуля как в импорте. Список (импортирующий файл, импорт, файл-цель).
+   """
+   target = _posix_path(target)
+   stem = os.path.splitext(target)[0]
+   rows = conn.execute(
+       "SELECT f.path, i.module, i.target FROM imports i JOIN files f ON f.id = i.file_id"
+       " WHERE i.target = ? OR (i.target >= ? AND i.target < ?) OR i.module = ?"
+       " ORDER BY f.path",
+       (target, stem + ".", stem + "." + _MAX_CHAR, target)
+   )
+   result = []
+   for path, module, resolved in rows:
+       # По префиксу отбираются и "x.test.js" для "x": путь без расширения должен совпасть
+       if (resolved != target and module != target
+               and (stem != target or resolved is None or os.path.splitext(resolved)[0] != stem)):
+           continue
+       result.append((path, module, resolved))
+       if limit and len(result) >= limit:
+           break
+   return result
+# ==============================
+# Программная точка входа
+# ==============================
+def _phase_time(start):
+   """Возвращает (время с момента start, текущий момент) для замера фаз подряд."""
+   now = time.perf_counter()
+   return now - start, now
+def collect_project_files(model):
+   """
+   Множество файлов проекта (относительные пути) по модели папок.
+   """
+   project_files = set()
+   for rel_path, folder in model.items():
+       for file_name in folder["files"]:
+           project_files.add(os.path.join(rel_path, file_name))
+   return project_files
+def collect_parse_tasks(rel_path, folder):
+   """
+   Задачи парсинга для файлов одной папки модели, для которых
+   зарегистрирован парсер. stat – (mtime_ns, размер) из обхода, если
+   модель собрана с with_stats, иначе None.
+   """
+   tasks = []
+   file_stats = folder.get("stats", {})
+   for file_name in folder["files"]:
+       parser_spec = get_parser(file_name)
+       if parser_spec is None:
+           continue
+       lang, parser = parser_spec
+       tasks.append({
+           "folder": rel_path,
+           "filename": file_name,
+           "path": os.path.join(folder["path"], file_name),
+           "rel_file": os.path.join(rel_path, file_name),
+           "parser": parser,
+           "lang": lang,
+           "stat": file_stats.get(file_name)
+       })
+   return tasks
+def file_detail(task, entry):
+   """
+   Сведения о файле для раздела папки (FileDetail); skipped заполняется
+   для файлов, которые не парсились. None, если сообщать нечего.
+   """
+   if entry.get("skipped"):
+       return FileDetail(task["filename"], task["lang"], (), entry["skipped"])
+   if not entry["elements"]:
+       return None
+   return FileDetail(task["filename"], task["lang"], entry["elements"])
+def build_architecture(root, ignore_dirs=(), ignore_files=(), use_cache=True, jobs=1, stats_top=10,
+                      ignore_patterns=(), use_gitignore=True, max_file_size=MAX_PARSE_FILE_SIZE,
+                      stream=False, fingerprint=False, fragments_dir=None, symbol_index=None,
+                      prefetch=0, prefetch_queue=PREFETCH_QUEUE_FILES, tree_depth=0, tree_max_files=0):
+   """
+   Собирает информацию о проекте в каталоге root без побочных эффектов,
+   кроме обновления кэшей парсинга и разделов (use_cache=False отключает их,
+   кэш разделов ведётся только при fragments_dir).
+   jobs – число процессов для парсинга (0 – по числу ядер CPU).
+   prefetch – число потоков, читающих файлы впереди парсера при jobs = 1
+   (очередь не больше prefetch_queue файлов, см. prefetch_files).
+   Файлы больше max_file_size байт (0 – без ограничения) не парсятся.
+   Параметры игнорирования – см. scan_directory_model; tree_depth
+   и tree_max_files ограничивают дерево папок (см. generate_directory_tree).
+   При symbol_index (путь файла SQLite) обновляется индекс символов
+   (см. update_symbol_index), итог – в stats["symbol_index"].
+   Возвращает словарь:
+    - "structure": {папка: {"files": [...], "details": [FileDetail, ...]}};
+    - "graph": граф зависимостей между файлами (см. build_dependency_graph);
+    - "lines": строки автогенерируемого блока ARCHITECTURE.md; при stream=True –
+      ленивый итератор: разделы формируются папка за папкой по мере записи,
+      и фазы "render" в статистике нет (её время входит в запись);
+    - "fingerprint": при fingerprint=True – отпечаток входных данных для --check
+      (см. build_fingerprint, сохраняется через save_fingerprint);
+    - "sections": при fragments_dir – разделы папок (FolderSections), иначе None.
+      Блок содержит ссылки на файлы-фрагменты вместо разделов, а сами
+      фрагменты пишет write_fragments(fragments_dir, result["sections"]);
+      разделы формируются по одному во время записи, с кэшем перезаписываются
+      только фрагменты, текст которых изменился;
+    - "stats": статистика запуска (см. new_run_stats), stats_top самых медленных файлов.
+   """
+   stats = new_run_stats()
+   phase_start = time.perf_counter()
+   root_dir = os.path.abspath(root)
+   # Единственный обход файловой системы: из модели строятся
+   # множество файлов проекта, списки файлов по папкам и дерево
+   # stat, собранный при обходе, нужен отпечатку, сверке с кэшем (cached_entry
+   # не вызывает stat повторно) и размерам свёрнутых в дереве файлов
+   model = scan_directory_model(root_dir, ignore_dirs, ignore_files,
+                                with_stats=fingerprint or use_cache or bool(tree_depth or tree_max_files),
+                                ignore_patterns=ignore_patterns, use_gitignore=use_gitignore)
+   stats["phases"]["discovery"], phase_start = _phase_time(phase_start)
+   # Индекс для сопоставления импортов строится один раз за запуск
+   project_files = collect_project_files(model)
+   import_index = ImportIndex(project_files)
+   # Кэш результатов парсинга: неизменённые файлы не перечитываются
+   cache_path = os.path.join(root_dir, CACHE_FILE_NAME)
+   old_cache = load_parse_cache(cache_path) if use_cache else {}
+   new_cache = {}
+   # Сбор подробной информации по папкам
+   structure_data = {}
+   tasks = []
+   folder_tasks = {}
+   for rel_path in sorted(model):
+       structure_data[rel_path] = {
+           "files": list(model[rel_path]["files"]),
+           "details": []
+       }
+       folder_tasks[rel_path] = collect_parse_tasks(rel_path, model[rel_path])
+       tasks.extend(folder_tasks[rel_path])
+       stats["files"]["total"] += len(model[rel_path]["files"])
+   stats["files"]["unparsed"] = stats["files"]["total"] - len(tasks)
+   stats["phases"]["index"], phase_start = _phase_time(phase_start)
+   # Парсинг (последовательный или в пуле процессов); результаты
+   # раскладываются в порядке задач, поэтому вывод не зависит от jobs
+   if jobs <= 0:
+       jobs = os.cpu_count() or 1
+   entries = parse_files(tasks, root_dir, import_index, old_cache, jobs, stats, max_file_size,
+                         prefetch, prefetch_queue)
+   for task, entry in zip(tasks, entries):
+       new_cache[task["rel_file"]] = entry
+       detail = file_detail(task, entry)
+       if detail is not None:
+           structure_data[task["folder"]]["details"].append(detail)
+   if use_cache:
+       save_parse_cache(cache_path, new_cache, old_cache)
+   stats["phases"]["parse"], phase_start = _phase_time(phase_start)
+   graph = build_dependency_graph(
+       ((task["rel_file"], task["lang"], entry["elements"]) for task, entry in zip(tasks, entries)),
+       project_files
+   )
+   stats["phases"]["graph"], phase_start = _phase_time(phase_start)
+   if symbol_index is not None:
+       stats["symbol_index"] = update_symbol_index(symbol_index, tasks, new_cache, graph, project_files)
+       stats["phases"]["symbols"], phase_start = _phase_time(phase_start)
+   sections = None
+   if fragments_dir is not None:
+       sections_path = os.path.join(root_dir, SECTIONS_CACHE_FILE_NAME) if use_cache else None
+       sections = FolderSections(structure_data, folder_tasks, new_cache, sections_path, stats)
+       stats["phases"]["sections"], phase_start = _phase_time(phase_start)
+   if stream:
+       lines = iter_architecture_lines(root_dir, model, structure_data, graph, sections, fragments_dir,
+                                       tree_depth, tree_max_files)
+   else:
+       lines = render_architecture(root_dir, model, structure_data, graph, sections, fragments_dir,
+                                   tree_depth, tree_max_files)
+       stats["phases"]["render"], phase_start = _phase_time(phase_start)
+   result = {
+       "structure": structure_data,
+       "graph": graph,
+       "lines": lines,
+       "sections": sections,
+       "stats": finish_run_stats(stats, stats_top)
+   }
+   if fingerprint:
+       settings = fingerprint_settings(ignore_dirs, ignore_files, ignore_patterns, use_gitignore,
+                                       max_file_size, fragments_dir, tree_depth, tree_max_files)
+       result["fingerprint"] = build_fingerprint(model, new_cache, settings)
+       if tree_depth or tree_max_files:
+           result["fingerprint"]["tree"] = tree_digest(root_dir, model, tree_depth, tree_max_files)
+   return result
+# ==============================
+# Несколько корней (монорепозиторий)
+# ==============================
+# Пакеты монорепозитория обрабатываются за один запуск: задачи парсинга всех
+# пакетов идут в один пул (--jobs), кэш парсинга, индекс импортов и индекс
+# символов общие и лежат в корне, каждый пакет получает свой ARCHITECTURE.md,
+# а корень – необязательную сводку по пакетам.
+PACKAGE_MARKERS = ("package.json", "pyproject.toml")
+def find_packages(model, markers=PACKAGE_MARKERS):
+   """
+   Папки модели (относительные пути, по возрастанию), в которых лежит один
+   из файлов markers; корень с таким файлом – тоже пакет (".").
+   """
+   markers = set(markers)
+   return [rel_path for rel_path in sorted(model) if markers.intersection(model[rel_path]["files"])]
+def _package_owner(rel_path, packages):
+   """Самый глубокий пакет из packages, которому принадлежит папка rel_path, или None."""
+   while rel_path not in packages:
+       if rel_path == ".":
+           return None
+       rel_path = os.path.dirname(rel_path) or "."
+   return rel_path
+def split_model(model, packages):
+   """
+   Делит модель корня на модели пакетов: {пакет: модель с путями от папки
+   пакета}. Папка относится к самому глубокому пакету, который её содержит;
+   вложенный пакет в дереве внешнего показывается свёрнутым, как игнорируемая
+   папка. Папки вне пакетов отбрасываются; "." в packages – сам корень.
+   """
+   packages = set(packages)
+   models = {package: {} for package in packages}
+   for rel_path, folder in model.items():
+       owner = _package_owner(rel_path, packages)
+       if owner is None:
+           continue
+       nested = [name for name in folder["dirs"]
+                 if (name if rel_path == "." else os.path.join(rel_path, name)) in packages]
+       if nested:
+           folder = dict(folder,
+                         dirs=[name for name in folder["dirs"] if name not in nested],
+                         ignored_dirs=sorted(folder["ignored_dirs"] + nested))
+       models[owner]["." if rel_path == owner else os.path.relpath(rel_path, owner)] = folder
+   return models
+def _is_inside(path, parent):
+   return os.path.commonpath([path, parent]) == parent
+def scan_package_models(base_dir, roots=None, **scan_kwargs):
+   """
+   {папка пакета: модель пакета}. Каждая папка обходится один раз: корни,
+   не вложенные в другие корни, обходятся параллельно в потоках (os.scandir
+   отпускает GIL), а модели вложенных корней выделяются из модели внешнего
+   (см. split_model). Без roots обходится base_dir, пакеты – по find_packages.
+   Параметры обхода – см. scan_directory_model.
+   """
+   from concurrent.futures import ThreadPoolExecutor
+   if roots:
+       root_dirs = sorted({os.path.abspath(root) for root in roots})
+       top = [root for root in root_dirs
+              if not any(other != root and _is_inside(root, other) for other in root_dirs)]
+   else:
+       top = [base_dir]
+   with ThreadPoolExecutor(max_workers=min(len(top), os.cpu_count() or 1)) as pool:
+       scanned = list(pool.map(lambda root: scan_directory_model(root, **scan_kwargs), top))
+   models = {}
+   for top_dir, model in zip(top, scanned):
+       if roots:
+           packages = ["."] + [os.path.relpath(root, top_dir) for root in root_dirs
+                               if root != top_dir and _is_inside(root, top_dir)]
        else:
-           lines.append("*(Нет файлов)*")
-       if details_list:
-           lines.append("\n**Детали по файлам:**")
-           for detail in details_list:
-               fname = detail["filename"]
-               lang = detail["lang"]
-               # Оборачиваем обработку файла в try/except для логирования имени файла при ошибке
-               try:
-                   lines.append(f"- **Файл**: {fname} (язык: {lang})")
-                   for elem in detail["elements"]:
-                       elem_type = elem.get("type", "")
-                       elem_name = elem.get("name", "")
-                       description = elem.get("description", "")
-                       lines.append(f"  - {elem_type.capitalize()}: **{elem_name}**")
-                       if description:
-                           lines.append(f"    - *Описание:* {description}")
-                       if elem.get("fields"):
-                           lines.append(f"    - *Поля:* {', '.join(elem['fields'])}")
-                       if elem.get("methods"):
-                           for m in elem['methods']:
-                               if isinstance(m, dict):
-                                   mname = m.get("name", "")
-                                   mdesc = m.get("description", "")
-                                   if mdesc:
-                                       lines.append(f"    - *Метод:* {mname} - {mdesc}")
-                                   else:
-                                       lines.append(f"    - *Метод:* {mname}")
-                               else:
-                                   # Если m не словарь, то предполагаем, что это строка
-                                   lines.append(f"    - *Метод:* {m}")
-                       if elem.get("imports"):
-                           lines.append(f"    - *Импорты:* {', '.join(elem['imports'])}")
-               except Exception as e:
-                   lines.append(f"**Ошибка при обработке файла {fname}: {str(e)}**")
-       lines.append("")
+           packages = find_packages(model)
+       for package, package_model in split_model(model, packages).items():
+           models[os.path.normpath(os.path.join(top_dir, package))] = package_model
+   return models
+def _package_prefix(base_dir, package_dir):
+   """Путь папки пакета от корня base_dir ("" для самого корня)."""
+   rel = os.path.relpath(package_dir, base_dir)
+   return "" if rel == "." else rel
+def _shared_path(prefix, rel_file):
+   """Путь файла пакета от общего корня (для корня – без изменений, как в build_architecture)."""
+   return os.path.normpath(os.path.join(prefix, rel_file)) if prefix else rel_file
+def build_packages(base, roots=None, ignore_dirs=(), ignore_files=(), use_cache=True, jobs=1,
+                   stats_top=10, ignore_patterns=(), use_gitignore=True,
+                   max_file_size=MAX_PARSE_FILE_SIZE, symbol_index=None, prefetch=0,
+                   prefetch_queue=PREFETCH_QUEUE_FILES, tree_depth=0, tree_max_files=0):
+   """
+   Собирает информацию о нескольких пакетах за один запуск. roots – папки
+   пакетов; без roots пакеты определяются в base по PACKAGE_MARKERS
+   (обход – см. scan_package_models). Кэш парсинга (ключи – пути от base), индекс импортов
+   и индекс символов (symbol_index) общие для всех пакетов; импорт из файла
+   соседнего пакета тоже считается импортом проекта. Задачи всех пакетов
+   парсятся одним вызовом parse_files (jobs, prefetch, tree_depth, tree_max_files –
+   как в build_architecture).
+   Возвращает словарь:
+    - "packages": список словарей по пакетам ("name" – путь от base через "/",
+      "root", "structure", "graph" – как в build_architecture, "lines" – ленивый итератор строк блока пакета,
+      "files" – число файлов);
+    - "graph": общий граф зависимостей (пути от base);
+    - "package_edges": {(пакет, пакет): число импортов} – связи между пакетами;
+    - "stats": статистика запуска (см. new_run_stats).
+   """
+   stats = new_run_stats()
+   phase_start = time.perf_counter()
+   base_dir = os.path.abspath(base)
+   models = scan_package_models(base_dir, roots, ignore_dirs=ignore_dirs, ignore_files=ignore_files,
+                                ignore_patterns=ignore_patterns, use_gitignore=use_gitignore,
+                                with_stats=use_cache or bool(tree_depth or tree_max_files))
+   stats["phases"]["discovery"], phase_start = _phase_time(phase_start)
+   # Задачи пакетов (пути от папки пакета) и их копии с путями от base
+   # для общего кэша и индексов
+   packages = []
+   shared_tasks = []
+   project_files = set()
+   for root_dir in sorted(models):
+       model = models[root_dir]
+       prefix = _package_prefix(base_dir, root_dir)
+       structure_data = {}
+       folder_tasks = {}
+       tasks = []
+       files = 0
+       for rel_path in sorted(model):
+           structure_data[rel_path] = {"files": list(model[rel_path]["files"]), "details": []}
+           folder_tasks[rel_path] = collect_parse_tasks(rel_path, model[rel_path])
+           tasks.extend(folder_tasks[rel_path])
+           files += len(model[rel_path]["files"])
+       shared_tasks.extend(dict(task, rel_file=_shared_path(prefix, task["rel_file"])) for task in tasks)
+       package_files = collect_project_files(model)
+       project_files.update(_shared_path(prefix, rel_file) for rel_file in package_files)
+       stats["files"]["total"] += files
+       packages.append({
+           "name": prefix.replace(os.sep, "/") or ".",
+           "root": root_dir,
+           "model": model,
+           "project_files": package_files,
+           "structure": structure_data,
+           "folder_tasks": folder_tasks,
+           "tasks": tasks,
+           "files": files
+       })
+   stats["files"]["unparsed"] = stats["files"]["total"] - len(shared_tasks)
+   import_index = ImportIndex(project_files)
+   cache_path = os.path.join(base_dir, CACHE_FILE_NAME)
+   old_cache = load_parse_cache(cache_path) if use_cache else {}
+   stats["phases"]["index"], phase_start = _phase_time(phase_start)
+   if jobs <= 0:
+       jobs = os.cpu_count() or 1
+   entries = parse_files(shared_tasks, base_dir, import_index, old_cache, jobs, stats, max_file_size,
+                         prefetch, prefetch_queue)
+   new_cache = {task["rel_file"]: entry for task, entry in zip(shared_tasks, entries)}
+   if use_cache:
+       save_parse_cache(cache_path, new_cache, old_cache)
+   stats["phases"]["parse"], phase_start = _phase_time(phase_start)
+   # Общий граф даёт связи между пакетами, граф пакета – связи внутри него
+   graph = build_dependency_graph(
+       ((task["rel_file"], task["lang"], entry["elements"]) for task, entry in zip(shared_tasks, entries)),
+       project_files
+   )
+   owners = {}
+   position = 0
+   for package in packages:
+       package_entries = entries[position:position + len(package["tasks"])]
+       position += len(package["tasks"])
+       package["entries"] = {task["rel_file"]: entry for task, entry in zip(package["tasks"], package_entries)}
+       for task, entry in zip(package["tasks"], package_entries):
+           detail = file_detail(task, entry)
+           if detail is not None:
+               package["structure"][task["folder"]]["details"].append(detail)
+       package["graph"] = build_dependency_graph(
+           ((task["rel_file"], task["lang"], entry["elements"])
+            for task, entry in zip(package["tasks"], package_entries)),
+           package["project_files"]
+       )
+       prefix = "" if package["name"] == "." else package["name"] + "/"
+       for rel_file in package["project_files"]:
+           owners[prefix + _posix_path(rel_file)] = package["name"]
+   package_edges = {}
+   for source, targets in graph["edges"].items():
+       for target in targets:
+           pair = (owners.get(source), owners.get(target))
+           if pair[0] != pair[1]:
+               package_edges[pair] = package_edges.get(pair, 0) + 1
+   stats["phases"]["graph"], phase_start = _phase_time(phase_start)
+   if symbol_index is not None:
+       stats["symbol_index"] = update_symbol_index(symbol_index, shared_tasks, new_cache, graph, project_files)
+       stats["phases"]["symbols"], phase_start = _phase_time(phase_start)
+   for package in packages:
+       package["lines"] = iter_architecture_lines(package["root"], package["model"], package["structure"],
+                                                  package["graph"], tree_depth=tree_depth,
+                                                  tree_max_files=tree_max_files)
+       for key in ("model", "project_files", "folder_tasks", "tasks", "entries"):
+           del package[key]
+   return {
+       "packages": packages,
+       "graph": graph,
+       "package_edges": package_edges,
+       "stats": finish_run_stats(stats, stats_top)
+   }
+def render_packages_summary(base, result):
+   """
+   Строки сводки по пакетам для ARCHITECTURE.md корня: ссылки на
+   ARCHITECTURE.md пакетов с числом файлов и связи между пакетами
+   (число импортов).
+   """
+   base_dir = os.path.abspath(base)
+   lines = ["## Пакеты"]
+   for package in result["packages"]:
+       link = os.path.relpath(os.path.join(package["root"], "ARCHITECTURE.md"), base_dir).replace(os.sep, "/")
+       parsed = sum(len(folder["details"]) for folder in package["structure"].values())
+       lines.append(f"- [{package['name']}]({link}) – файлов: {package['files']}, "
+                    f"с разобранной структурой: {parsed}, папок: {len(package['structure'])}")
+   lines.append("")
+   lines.append("## Зависимости между пакетами")
+   if result["package_edges"]:
+       for (source, target), count in sorted(result["package_edges"].items()):
+           lines.append(f"- **{source}** → **{target}** (импортов: {count})")
+   else:
+       lines.append("*(Связей нет)*")
+   lines.append("")
    return lines
+def write_package_architectures(result, jobs=1):
+   """
+   Записывает ARCHITECTURE.md каждого пакета (см. update_architecture_md).
+   Строки блоков формируются при записи; пакеты пишутся параллельно
+   в jobs потоках (0 – по числу ядер CPU). Возвращает число записанных файлов.
+   """
+   from concurrent.futures import ThreadPoolExecutor
+   packages = result["packages"]
+   if not packages:
+       return 0
+   workers = min(len(packages), jobs if jobs > 0 else os.cpu_count() or 1)
+   with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+       written = pool.map(
+           lambda package: update_architecture_md(package["lines"],
+                                                  os.path.join(package["root"], "ARCHITECTURE.md")),
+           packages)
+       written = sum(1 for changed in written if changed)
+   return written
 # ==============================
 # Обновление ARCHITECTURE.md
 # ==============================
-def update_architecture_md(content_lines):
+AUTO_GEN_START = '<!-- AUTO-GENERATED-CONTENT:START -->'
+AUTO_GEN_END = '<!-- AUTO-GENERATED-CONTENT:END -->'
+# Содержимое нового ARCHITECTURE.md до первой вставки сгенерированного блока
+ARCHITECTURE_TEMPLATE = f"# ARCHITECTURE.md\n\n{AUTO_GEN_START}\n{AUTO_GEN_END}\n"
+def _iter_architecture_chunks(existing_content, content_lines):
+   """
+   Части обновлённого ARCHITECTURE.md по порядку. Маркеры ищутся линейно
+   через str.find: первый START и первый END после него. Если маркеров нет,
+   блок добавляется в конец файла. Сгенерированные строки отдаются по одной,
+   без склейки в одну большую строку.
+   """
+   start = existing_content.find(AUTO_GEN_START)
+   end = -1
+   if start != -1:
+       end = existing_content.find(AUTO_GEN_END, start + len(AUTO_GEN_START))
+   if end != -1:
+       yield existing_content[:start]
+   else:
+       yield existing_content
+       yield "\n"
+   yield AUTO_GEN_START
+   yield "\n"
+   separator = ""
+   for line in content_lines:
+       yield separator
+       yield line
+       separator = "\n"
+   yield "\n"
+   yield AUTO_GEN_END
+   if end != -1:
+       yield existing_content[end + len(AUTO_GEN_END):]
+   else:
+       yield "\n"
+def _open_atomic_temp(arch_file):
+   """
+   Создаёт временный файл рядом с arch_file (та же файловая система,
+   поэтому os.replace атомарен) с правами существующего файла.
+   """
+   import tempfile
+   directory = os.path.dirname(os.path.abspath(arch_file))
+   fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".ARCHITECTURE.", suffix=".tmp")
+   try:
+       mode = os.stat(arch_file).st_mode & 0o777
+   except OSError:
+       umask = os.umask(0)
+       os.umask(umask)
+       mode = 0o666 & ~umask
+   os.chmod(tmp_path, mode)
+   return os.fdopen(fd, "w", encoding="utf-8"), tmp_path
+def update_architecture_md(content_lines, arch_file=None):
    """
    Обновляет файл ARCHITECTURE.md, вставляя сгенерированный контент между маркерами.
    Если маркеры отсутствуют, они добавляются в конец файла.
+   По умолчанию обновляется ARCHITECTURE.md рядом со скриптом.
+   Новое содержимое по мере формирования сравнивается с текущим; если оно
+   не изменилось, файл не трогается (mtime сохраняется). Иначе запись идёт
+   во временный файл, который затем атомарно заменяет ARCHITECTURE.md,
+   так что читатели не видят наполовину записанный файл.
+   Возвращает True, если файл был записан.
    """
-   root_dir = os.path.dirname(os.path.abspath(__file__))
-   arch_file = os.path.join(root_dir, "ARCHITECTURE.md")
-   auto_gen_start = '<!-- AUTO-GENERATED-CONTENT:START -->'
-   auto_gen_end = '<!-- AUTO-GENERATED-CONTENT:END -->'
-   new_auto_content = "\n".join(content_lines)
-   if os.path.exists(arch_file):
+   if arch_file is None:
+       arch_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ARCHITECTURE.md")
+   exists = os.path.exists(arch_file)
+   if exists:
        with open(arch_file, "r", encoding="utf-8") as f:
            existing_content = f.read()
    else:
-       existing_content = f"# ARCHITECTURE.md\n\n{auto_gen_start}\n{auto_gen_end}\n"
-   pattern = re.compile(
-       r'(?P<before>.*?){start_marker}.*?{end_marker}(?P<after>.*)'.format(
-           start_marker=re.escape(auto_gen_start),
-           end_marker=re.escape(auto_gen_end)
-       ),
-       re.DOTALL
-   )
-   match = pattern.match(existing_content)
-   if match:
-       updated_content = "{before}{start}\n{content}\n{end}{after}".format(
-           before=match.group('before'),
-           start=auto_gen_start,
-           content=new_auto_content,
-           end=auto_gen_end,
-           after=match.group('after')
-       )
-   else:
-       updated_content = existing_content + "\n{start}\n{content}\n{end}\n".format(
-           start=auto_gen_start,
-           content=new_auto_content,
-           end=auto_gen_end
-       )
-   with open(arch_file, "w", encoding="utf-8") as f:
-       f.write(updated_content)
+       existing_content = ARCHITECTURE_TEMPLATE
+   out = None
+   tmp_path = None
+   pos = 0
+   try:
+       for chunk in _iter_architecture_chunks(existing_content, content_lines):
+           if out is None:
+               if exists and existing_content.startswith(chunk, pos):
+                   pos += len(chunk)
+                   continue
+               # Первое расхождение: совпавшее начало берём из текущего содержимого
+               out, tmp_path = _open_atomic_temp(arch_file)
+               out.write(existing_content[:pos])
+           out.write(chunk)
+       if out is None:
+           if pos == len(existing_content):
+               print(f"[OK] Файл ARCHITECTURE.md не изменился: {arch_file}")
+               return False
+           out, tmp_path = _open_atomic_temp(arch_file)
+           out.write(existing_content[:pos])
+       out.flush()
+       os.fsync(out.fileno())
+       out.close()
+       os.replace(tmp_path, arch_file)
+   except BaseException:
+       if out is not None:
+           out.close()
+           os.unlink(tmp_path)
+       raise
    print(f"[OK] Файл ARCHITECTURE.md успешно обновлён в {arch_file}")
+   return True
+# ==============================
+# Отпечаток входных данных (--check)
+# ==============================
+# Рядом с ARCHITECTURE.md хранится .ARCHITECTURE.md.fingerprint: настройки
+# запуска, списки папок и файлов, (mtime_ns, размер) и хеш элементов каждого
+# разбираемого файла, а также хеш сгенерированного блока. --check сверяет его
+# с деревом по данным stat и перепарсивает только файлы с изменившимся stat.
+FINGERPRINT_VERSION = 1
+def fingerprint_path(arch_file):
+   """Путь файла отпечатка для arch_file: .<имя>.fingerprint в той же папке."""
+   directory, name = os.path.split(os.path.abspath(arch_file))
+   return os.path.join(directory, f".{name}.fingerprint")
+def fingerprint_settings(ignore_dirs=(), ignore_files=(), ignore_patterns=(), use_gitignore=True,
+                         max_file_size=MAX_PARSE_FILE_SIZE, fragments_dir=None, tree_depth=0,
+                         tree_max_files=0):
+   """
+   Всё, кроме файлов проекта, от чего зависит сгенерированный блок:
+   версия скрипта, параметры игнорирования, лимит размера, каталог
+   фрагментов, ограничения дерева и реестр парсеров.
+   """
+   return {
+       "tool": _tool_signature(),
+       "ignore_dirs": sorted(ignore_dirs),
+       "ignore_files": sorted(ignore_files),
+       "ignore_patterns": list(ignore_patterns),
+       "use_gitignore": bool(use_gitignore),
+       "max_file_size": max_file_size,
+       "fragments_dir": fragments_dir,
+       "tree_depth": tree_depth,
+       "tree_max_files": tree_max_files,
+       "parsers": {ext: [lang, _parser_name(parser)]
+                   for ext, (lang, parser) in sorted(PARSER_REGISTRY.items())}
+   }
+def elements_digest(entry):
+   """Хеш того, что файл даёт сгенерированному блоку: элементы и категория пропуска."""
+   data = json.dumps([entry.get("skipped"), entry["elements"]], ensure_ascii=False, separators=(",", ":"))
+   return hashlib.sha1(data.encode("utf-8")).hexdigest()
+def _fingerprint_folder(folder, files):
+   return {
+       "dirs": folder["dirs"],
+       "ignored_dirs": folder["ignored_dirs"],
+       "ignored_files": folder["ignored_files"],
+       "files": files
+   }
+def build_fingerprint(model, entries, settings):
+   """
+   Отпечаток по модели папок (scan_directory_model с with_stats) и записям
+   парсинга {относительный путь: запись}. Для файлов без парсера хранится
+   только имя: их содержимое в блок не попадает.
+   """
+   folders = {}
+   for rel_path, folder in model.items():
+       files = {}
+       for name in folder["files"]:
+           entry = entries.get(os.path.join(rel_path, name))
+           stat = folder["stats"].get(name)
+           files[name] = None if entry is None or stat is None else [stat[0], stat[1], elements_digest(entry)]
+       folders[rel_path] = _fingerprint_folder(folder, files)
+   return {"version": FINGERPRINT_VERSION, "settings": settings, "folders": folders}
+def tree_digest(root_dir, model, tree_depth, tree_max_files):
+   """
+   Хеш дерева папок с ограничениями: подписи свёрнутых записей содержат
+   размеры файлов, которые не видны по спискам файлов в отпечатке.
+   """
+   tree = generate_directory_tree(root_dir, model, max_depth=tree_depth, max_files=tree_max_files)
+   return hashlib.sha1(tree.encode("utf-8")).hexdigest()
+def hashing_lines(lines, digest):
+   """Отдаёт строки lines, добавляя в digest текст блока ("\\n".join(lines))."""
+   separator = ""
+   for line in lines:
+       digest.update((separator + line).encode("utf-8"))
+       separator = "\n"
+       yield line
+def _architecture_block(content):
+   """Текст между маркерами сгенерированного блока или None (как в _iter_architecture_chunks)."""
+   start = content.find(AUTO_GEN_START)
+   if start == -1:
+       return None
+   end = content.find(AUTO_GEN_END, start + len(AUTO_GEN_START))
+   if end == -1:
+       return None
+   return content[start + len(AUTO_GEN_START) + 1:end - 1]
+def _write_fingerprint(path, fingerprint):
+   tmp_path = path + ".tmp"
+   with open(tmp_path, "w", encoding="utf-8") as f:
+       f.write(json.dumps(fingerprint, ensure_ascii=False, separators=(",", ":")))
+   os.replace(tmp_path, path)
+def save_fingerprint(arch_file, fingerprint, block_digest):
+   """
+   Сохраняет отпечаток после записи arch_file, добавив в него stat файла
+   и хеш сгенерированного блока (см. hashing_lines).
+   """
+   st = os.stat(arch_file)
+   fingerprint["doc"] = [st.st_mtime_ns, st.st_size, block_digest]
+   _write_fingerprint(fingerprint_path(arch_file), fingerprint)
+def check_architecture(root, arch_file=None, ignore_dirs=(), ignore_files=(), ignore_patterns=(),
+                       use_gitignore=True, max_file_size=MAX_PARSE_FILE_SIZE, fragments_dir=None,
+                       tree_depth=0, tree_max_files=0):
+   """
+   Проверяет по отпечатку, актуален ли сгенерированный блок arch_file.
+   Дерево обходится одним scandir/stat; перепарсиваются только разбираемые
+   файлы с изменившимися mtime или размером, и блок считается устаревшим,
+   только если их элементы изменились. Если всё совпало, в отпечатке
+   обновляются данные stat, чтобы следующая проверка обошлась без парсинга.
+   Возвращает (устарел ли блок, причина).
+   """
+   root_dir = os.path.abspath(root)
+   if arch_file is None:
+       arch_file = os.path.join(root_dir, "ARCHITECTURE.md")
+   path = fingerprint_path(arch_file)
+   try:
+       with open(path, "r", encoding="utf-8") as f:
+           fingerprint = json.load(f)
+   except (OSError, ValueError):
+       return True, "нет отпечатка " + path
+   if not isinstance(fingerprint, dict) or fingerprint.get("version") != FINGERPRINT_VERSION:
+       return True, "отпечаток создан другой версией скрипта"
+   settings = fingerprint_settings(ignore_dirs, ignore_files, ignore_patterns, use_gitignore,
+                                   max_file_size, fragments_dir, tree_depth, tree_max_files)
+   if fingerprint.get("settings") != settings:
+       return True, "изменились скрипт, параметры игнорирования или парсеры"
+   refresh = False
+   try:
+       st = os.stat(arch_file)
+   except OSError:
+       return True, "нет файла " + arch_file
+   doc_mtime, doc_size, block_digest = fingerprint["doc"]
+   if (st.st_mtime_ns, st.st_size) != (doc_mtime, doc_size):
+       with open(arch_file, "r", encoding="utf-8") as f:
+           block = _architecture_block(f.read())
+       if block is None or hashlib.sha1(block.encode("utf-8")).hexdigest() != block_digest:
+           return True, "сгенерированный блок изменён после последнего запуска"
+       fingerprint["doc"] = [st.st_mtime_ns, st.st_size, block_digest]
+       refresh = True
+   model = scan_directory_model(root_dir, ignore_dirs, ignore_files, with_stats=True,
+                                ignore_patterns=ignore_patterns, use_gitignore=use_gitignore)
+   folders = fingerprint["folders"]
+   if folders.keys() != model.keys():
+       return True, "изменился список папок"
+   changed = []
+   for rel_path, folder in model.items():
+       stored = folders[rel_path]
+       if (stored["dirs"] != folder["dirs"] or stored["ignored_dirs"] != folder["ignored_dirs"]
+               or stored["ignored_files"] != folder["ignored_files"]
+               or stored["files"].keys() != set(folder["files"])):
+           return True, f"изменился список файлов в папке {rel_path}"
+       for task in collect_parse_tasks(rel_path, folder):
+           record = stored["files"][task["filename"]]
+           stat = folder["stats"].get(task["filename"])
+           if record is None or stat is None:
+               return True, f"нет данных о файле {os.path.normpath(task['rel_file'])}"
+           if list(stat) != record[:2]:
+               changed.append((task, record, stat))
+   if (tree_depth or tree_max_files) and (
+           tree_digest(root_dir, model, tree_depth, tree_max_files) != fingerprint.get("tree")):
+       return True, "изменились размеры файлов, свёрнутых в дереве папок"
+   if changed:
+       index = ImportIndex(collect_project_files(model))
+       for task, record, stat in changed:
+           try:
+               entry = parse_file_entry(task["parser"], task["lang"], task["path"], root_dir,
+                                        index, max_file_size)
+           except OSError:
+               return True, f"не удалось прочитать {os.path.normpath(task['rel_file'])}"
+           if elements_digest(entry) != record[2]:
+               return True, f"изменилось содержимое {os.path.normpath(task['rel_file'])}"
+           record[:2] = stat
+       refresh = True
+   if refresh:
+       # Проверка не должна падать, если каталог доступен только для чтения
+       try:
+           _write_fingerprint(path, fingerprint)
+       except OSError:
+           pass
+   return False, f"проверено файлов с изменённым stat: {len(changed)}"
+# ==============================
+# Машиночитаемая выгрузка (JSON / JSON Lines)
+# ==============================
+def iter_structure_records(structure_data, graph=None):
+   """
+   Перебирает записи по файлам проекта (в порядке папок и имён файлов):
+   {"path", "folder", "file", "lang", "skipped", "description", "classes", "functions",
+   "imports", "exports", "other"}.
+   Классы содержат свои поля и методы; для файлов без парсера lang равен None,
+   а списки пусты. skipped – категория из SKIP_CATEGORIES, если файл не парсился.
+   Если передан граф зависимостей, добавляются "dependencies", "dependents",
+   "unresolved", "fan_in", "fan_out" и "cycle" (файлы цикла импортов,
+   в который входит файл, или пустой список).
+   """
+   cycle_of = {}
+   if graph is not None:
+       for cycle in graph["cycles"]:
+           for path in cycle:
+               cycle_of[path] = cycle
+   for folder in sorted(structure_data):
+       folder_data = structure_data[folder]
+       details = {detail.filename: detail for detail in folder_data["details"]}
+       for file_name in sorted(folder_data["files"]):
+           path = os.path.normpath(os.path.join(folder, file_name)).replace(os.sep, "/")
+           record = {
+               "path": path,
+               "folder": folder.replace(os.sep, "/"),
+               "file": file_name,
+               "lang": None,
+               "skipped": None,
+               "description": "",
+               "classes": [],
+               "functions": [],
+               "imports": [],
+               "exports": [],
+               "other": []
+           }
+           detail = details.get(file_name)
+           if detail is not None:
+               record["lang"] = detail.lang
+               record["skipped"] = detail.skipped
+               for elem in detail.elements:
+                   if elem.type == "file_comment":
+                       record["description"] = elem.description
+                   elif elem.type == "file_imports":
+                       record["imports"].extend(elem.imports)
+                   elif elem.type == "exports":
+                       record["exports"].extend(elem.exports)
+                   elif elem.type in ("class", "struct"):
+                       record["classes"].append({
+                           "kind": elem.type,
+                           "name": elem.name,
+                           "description": elem.description,
+                           "fields": list(elem.fields),
+                           "methods": [
+                               {"name": m, "description": ""} if isinstance(m, str) else m._asdict()
+                               for m in elem.methods
+                           ]
+                       })
+                   elif elem.type in ("def", "function"):
+                       record["functions"].append({
+                           "name": elem.name,
+                           "description": elem.description
+                       })
+                   else:
+                       record["imports"].extend(elem.imports)
+                       record["other"].append({
+                           "type": elem.type,
+                           "name": elem.name,
+                           "description": elem.description
+                       })
+           if graph is not None:
+               record["dependencies"] = list(graph["edges"].get(path, []))
+               record["dependents"] = list(graph["reverse"].get(path, []))
+               record["unresolved"] = list(graph["unresolved"].get(path, []))
+               record["fan_in"] = len(record["dependents"])
+               record["fan_out"] = len(record["dependencies"])
+               record["cycle"] = list(cycle_of.get(path, []))
+           yield record
+def write_structure_export(structure_data, fmt, out, graph=None):
+   """
+   Пишет записи iter_structure_records в поток out по мере формирования:
+   jsonl – одна запись JSON на строку, json – массив записей.
+   """
+   if fmt == "jsonl":
+       for record in iter_structure_records(structure_data, graph):
+           out.write(json.dumps(record, ensure_ascii=False))
+           out.write("\n")
+       return
+   out.write("[")
+   separator = "\n"
+   for record in iter_structure_records(structure_data, graph):
+       out.write(separator)
+       out.write(json.dumps(record, ensure_ascii=False))
+       separator = ",\n"
+   out.write("\n]\n")
+# ==============================
+# Режим наблюдения (--watch)
+# ==============================
+def _same_listing(old_model, new_model):
+   """
+   Совпадают ли наборы папок и записей в них (без учёта mtime и размеров).
+   """
+   if old_model.keys() != new_model.keys():
+       return False
+   for rel_path, folder in new_model.items():
+       old_folder = old_model[rel_path]
+       for key in ("dirs", "files", "ignored_dirs", "ignored_files"):
+           if old_folder[key] != folder[key]:
+               return False
+   return True
+def _watch_refresh(state, new_model, root_dir, jobs, max_size=MAX_PARSE_FILE_SIZE, tree_depth=0,
+                   tree_max_files=0):
+   """
+   Приводит состояние режима наблюдения к новой модели папок: перепарсивает
+   только добавленные и изменённые файлы (и файлы, у которых изменилось
+   сопоставление импортов), заново формирует разделы затронутых папок
+   и удаляет разделы исчезнувших. Дерево с ограничениями (tree_depth,
+   tree_max_files) формируется заново при любом изменении: в нём есть размеры
+   файлов. Возвращает True, если что-то перепарсено или удалено.
+   """
+   old_model = state["model"]
+   old_entries = state["entries"]
+   project_files = collect_project_files(new_model)
+   files_changed = project_files != state["project_files"]
+   if files_changed:
+       state["project_files"] = project_files
+       state["index"] = ImportIndex(project_files)
+   index = state["index"]
+   entries = {}
+   affected = set()
+   tasks = []
+   folder_tasks = {}
+   for rel_path, folder in new_model.items():
+       old_folder = old_model.get(rel_path)
+       if old_folder is None or old_folder["files"] != folder["files"]:
+           affected.add(rel_path)
+       folder_tasks[rel_path] = collect_parse_tasks(rel_path, folder)
+       for task in folder_tasks[rel_path]:
+           entry = old_entries.get(task["rel_file"])
+           # Те же условия, что в cached_entry: язык, парсер (--python-backend),
+           # stat и пропуск из-за размера (--max-file-size)
+           if (entry is not None and entry.get("lang") == task["lang"]
+                   and entry.get("parser") == _parser_name(task["parser"])
+                   and folder["stats"].get(task["filename"]) == (entry["mtime"], entry["size"])
+                   and not _oversized_mismatch(entry, task["lang"], entry["size"], max_size)
+                   and (not files_changed or _lookups_unchanged(entry, task["lang"], index))):
+               entries[task["rel_file"]] = entry
+           else:
+               tasks.append(task)
+               affected.add(rel_path)
+   for task, entry in zip(tasks, parse_files(tasks, root_dir, index, old_entries, jobs, max_size=max_size)):
+       entries[task["rel_file"]] = entry
+   removed = set(old_model) - set(new_model)
+   for rel_path in removed:
+       del state["sections"][rel_path]
+   if tasks or removed or affected or files_changed:
+       graph = build_dependency_graph(
+           ((task["rel_file"], task["lang"], entries[task["rel_file"]]["elements"])
+            for rel_path in sorted(folder_tasks) for task in folder_tasks[rel_path]),
+           project_files
+       )
+       state["dependencies"] = render_dependency_section(graph)
+   for rel_path in affected:
+       details = []
+       for task in folder_tasks[rel_path]:
+           detail = file_detail(task, entries[task["rel_file"]])
+           if detail is not None:
+               details.append(detail)
+       state["sections"][rel_path] = render_folder_section(rel_path, {
+           "files": list(new_model[rel_path]["files"]),
+           "details": details
+       })
+   if tree_depth or tree_max_files or not _same_listing(old_model, new_model):
+       state["tree"] = render_tree_section(root_dir, new_model, tree_depth, tree_max_files)
+   state["model"] = new_model
+   state["entries"] = entries
+   return bool(tasks) or entries.keys() != old_entries.keys()
+def watch_architecture(root, arch_file=None, ignore_dirs=(), ignore_files=(), use_cache=True,
+                      jobs=1, interval=1.0, debounce=0.5, ignore_patterns=(), use_gitignore=True,
+                      max_file_size=MAX_PARSE_FILE_SIZE, tree_depth=0, tree_max_files=0):
+   """
+   Режим наблюдения: модель папок и результаты парсинга хранятся в памяти,
+   дерево опрашивается каждые interval секунд дешёвым обходом scandir/stat.
+   После изменений, дождавшись debounce секунд без новых изменений,
+   перепарсивает только затронутые файлы, заново формирует разделы
+   затронутых папок и перезаписывает сгенерированный блок, только если
+   его содержимое изменилось. После каждого обновления сохраняет отпечаток
+   (см. save_fingerprint), чтобы --check видел актуальный блок.
+   Работает до прерывания (Ctrl+C).
+   """
+   root_dir = os.path.abspath(root)
+   if arch_file is None:
+       arch_file = os.path.join(root_dir, "ARCHITECTURE.md")
+   if jobs <= 0:
+       jobs = os.cpu_count() or 1
+   cache_path = os.path.join(root_dir, CACHE_FILE_NAME)
+   state = {
+       "model": {},
+       "project_files": None,
+       "index": None,
+       "entries": load_parse_cache(cache_path) if use_cache else {},
+       "sections": {},
+       "tree": [],
+       "dependencies": [],
+       "lines": None
+   }
+   def _scan():
+       return scan_directory_model(root_dir, ignore_dirs, ignore_files, with_stats=True,
+                                   ignore_patterns=ignore_patterns, use_gitignore=use_gitignore)
+   settings = fingerprint_settings(ignore_dirs, ignore_files, ignore_patterns, use_gitignore,
+                                   max_file_size, None, tree_depth, tree_max_files)
+   print(f"[WATCH] Отслеживание изменений в {root_dir} (Ctrl+C для выхода)")
+   new_model = _scan()
+   try:
+       while True:
+           if new_model != state["model"]:
+               if _watch_refresh(state, new_model, root_dir, jobs, max_file_size,
+                                 tree_depth, tree_max_files) and use_cache:
+                   save_parse_cache(cache_path, state["entries"])
+               lines = list(state["tree"])
+               for rel_path in sorted(state["sections"]):
+                   lines.extend(state["sections"][rel_path])
+               lines.extend(state["dependencies"])
+               if lines != state["lines"]:
+                   update_architecture_md(lines, arch_file)
+                   state["lines"] = lines
+               fingerprint = build_fingerprint(state["model"], state["entries"], settings)
+               if tree_depth or tree_max_files:
+                   fingerprint["tree"] = tree_digest(root_dir, state["model"], tree_depth, tree_max_files)
+               save_fingerprint(arch_file, fingerprint,
+                                hashlib.sha1("\n".join(lines).encode("utf-8")).hexdigest())
+           time.sleep(interval)
+           new_model = _scan()
+           # Ждём, пока дерево перестанет меняться (например, при сохранении нескольких файлов)
+           while new_model != state["model"]:
+               time.sleep(debounce)
+               settled = _scan()
+               if settled == new_model:
+                   break
+               new_model = settled
+   except KeyboardInterrupt:
+       print("[WATCH] Остановлено")
+   return 0
 # ==============================
 # Запуск скрипта
 # ==============================
+def main(argv=None):
+   """
+   Командная строка: обновляет ARCHITECTURE.md для папки, в которой лежит скрипт;
+   "query ..." – поиск по индексу символов (см. parse_query_args).
+   """
+   if argv is None:
+       argv = sys.argv[1:]
+   if argv and argv[0] == "query":
+       return run_query(parse_query_args(argv[1:]))
+   args = parse_args(argv)
+   if args.profile:
+       import cProfile
+       profiler = cProfile.Profile()
+       try:
+           return profiler.runcall(_run, args)
+       finally:
+           profiler.dump_stats(args.profile)
+           print(f"[OK] Профиль cProfile сохранён в {args.profile}", file=sys.stderr)
+   return _run(args)
+def _detach_stdout():
+   """
+   Читатель stdout закрыл канал (например, "... | head"): оставшийся вывод
+   уходит в os.devnull, чтобы Python не выводил BrokenPipeError
+   при сбросе буфера на выходе.
+   """
+   devnull = os.open(os.devnull, os.O_WRONLY)
+   os.dup2(devnull, sys.stdout.fileno())
+   os.close(devnull)
+def run_query(args):
+   """Подкоманда query: печатает найденные символы или импортирующие файлы."""
+   import sqlite3
+   root_dir = os.path.dirname(os.path.abspath(__file__))
+   db_path = os.path.join(root_dir, SYMBOL_INDEX_FILE_NAME)
+   if not os.path.exists(db_path):
+       print(f"Индекс символов не найден: {db_path}; запустите updateArchitecture.py", file=sys.stderr)
+       return 1
+   conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+   try:
+       if args.importers is not None:
+           for path, module, target in query_importers(conn, args.importers, args.limit):
+               print(f"{path}\t{module}" + (f"\t{target}" if target else ""))
+           sys.stdout.flush()
+           return 0
+       rows = query_symbols(conn, args.name, args.prefix, args.file, args.kind, args.limit)
+       for path, kind, name, parent, description in rows:
+           line = f"{path}\t{kind}\t{parent + '.' if parent else ''}{name}"
+           if description:
+               line += f"\t{description}"
+           print(line)
+       sys.stdout.flush()
+   except BrokenPipeError:
+       _detach_stdout()
+       return 1
+   finally:
+       conn.close()
+   return 0
+def _run(args):
+   """Выполняет запуск по разобранным аргументам командной строки."""
+   root_dir = os.path.dirname(os.path.abspath(__file__))
+   if args.python_backend == "ast":
+       register_parser(".py", "python", "parse_python_file_ast")
+   arch_file = os.path.join(root_dir, "ARCHITECTURE.md")
+   ignore_patterns = list(args.ignore or ())
+   fragments_dir = None
+   if args.fragments_dir:
+       # Путь считается от корня проекта; фрагменты внутри проекта не попадают в обход
+       fragments_dir = os.path.normpath(os.path.join(root_dir, args.fragments_dir))
+       # Фрагмент папки "." (или папки с тем же путём) совпал бы с самим ARCHITECTURE.md
+       if _is_inside(root_dir, fragments_dir):
+           print(f"--fragments-dir не может быть корнем проекта или папкой выше него: {fragments_dir}",
+                 file=sys.stderr)
+           return 2
+       rel_fragments = os.path.relpath(fragments_dir, root_dir)
+       if rel_fragments != "." and not rel_fragments.startswith(os.pardir):
+           ignore_patterns.append("/" + rel_fragments.replace(os.sep, "/") + "/")
+   if args.root or args.packages:
+       return _run_packages(args, root_dir, arch_file, ignore_patterns)
+   if args.check:
+       stale, reason = check_architecture(
+           root_dir,
+           arch_file,
+           ignore_dirs=args.ignore_dir or (),
+           ignore_files=args.ignore_file or (),
+           ignore_patterns=ignore_patterns,
+           use_gitignore=not args.no_gitignore,
+           max_file_size=args.max_file_size,
+           fragments_dir=fragments_dir,
+           tree_depth=args.tree_depth,
+           tree_max_files=args.tree_max_files
+       )
+       if stale:
+           print(f"[STALE] ARCHITECTURE.md устарел ({reason}), запустите updateArchitecture.py")
+           return 1
+       print(f"[OK] ARCHITECTURE.md актуален ({reason})")
+       return 0
+   if args.watch:
+       return watch_architecture(
+           root_dir,
+           arch_file,
+           ignore_dirs=args.ignore_dir or (),
+           ignore_files=args.ignore_file or (),
+           use_cache=not args.no_cache,
+           jobs=args.jobs,
+           interval=args.interval,
+           debounce=args.debounce,
+           ignore_patterns=args.ignore or (),
+           use_gitignore=not args.no_gitignore,
+           max_file_size=args.max_file_size,
+           tree_depth=args.tree_depth,
+           tree_max_files=args.tree_max_files
+       )
+   if args.format == "markdown" and not os.path.exists(arch_file):
+       # Новый ARCHITECTURE.md должен попасть в обход, как при следующих запусках:
+       # иначе отпечаток первого запуска сразу расходится с деревом и --check
+       # сообщает об устаревании
+       with open(arch_file, "w", encoding="utf-8") as f:
+           f.write(ARCHITECTURE_TEMPLATE)
+   result = build_architecture(
+       root_dir,
+       ignore_dirs=args.ignore_dir or (),
+       ignore_files=args.ignore_file or (),
+       use_cache=not args.no_cache,
+       jobs=args.jobs,
+       stats_top=args.stats_top,
+       ignore_patterns=ignore_patterns,
+       use_gitignore=not args.no_gitignore,
+       max_file_size=args.max_file_size,
+       stream=True,
+       fingerprint=args.format == "markdown",
+       fragments_dir=fragments_dir,
+       symbol_index=None if args.no_index else os.path.join(root_dir, SYMBOL_INDEX_FILE_NAME),
+       prefetch=args.prefetch,
+       prefetch_queue=args.prefetch_queue,
+       tree_depth=args.tree_depth,
+       tree_max_files=args.tree_max_files
+   )
+   start = time.perf_counter()
+   if args.format != "markdown":
+       if args.output == "-":
+           try:
+               write_structure_export(result["structure"], args.format, sys.stdout, result["graph"])
+               sys.stdout.flush()
+           except BrokenPipeError:
+               _detach_stdout()
+               return 1
+       else:
+           with open(args.output, "w", encoding="utf-8") as f:
+               write_structure_export(result["structure"], args.format, f, result["graph"])
+   else:
+       block_digest = hashlib.sha1()
+       update_architecture_md(hashing_lines(result["lines"], block_digest), arch_file)
+       save_fingerprint(arch_file, result["fingerprint"], block_digest.hexdigest())
+       if fragments_dir is not None:
+           written = write_fragments(fragments_dir, result["sections"])
+           print(f"[OK] Фрагменты разделов в {fragments_dir}: записано {written}")
+   result["stats"]["phases"]["write"] = time.perf_counter() - start
+   if args.stats:
+       for line in format_run_stats(result["stats"]):
+           print(line, file=sys.stderr)
+   return 0
+def _run_packages(args, root_dir, arch_file, ignore_patterns):
+   """Запуск с --root/--packages: ARCHITECTURE.md пакетов и сводка (--summary)."""
+   roots = [os.path.join(root_dir, root) for root in args.root] if args.root else None
+   if args.summary and roots and any(os.path.normpath(root) == root_dir for root in roots):
+       print("Папка скрипта указана как пакет: сводка не записывается поверх его ARCHITECTURE.md",
+             file=sys.stderr)
+       return 2
+   if args.summary and not roots and any(
+           os.path.isfile(os.path.join(root_dir, marker)) for marker in PACKAGE_MARKERS):
+       print("В папке скрипта есть " + " или ".join(PACKAGE_MARKERS) + ": она сама пакет, "
+             "сводка не записывается поверх её ARCHITECTURE.md", file=sys.stderr)
+       return 2
+   result = build_packages(
+       root_dir,
+       roots,
+       ignore_dirs=args.ignore_dir or (),
+       ignore_files=args.ignore_file or (),
+       use_cache=not args.no_cache,
+       jobs=args.jobs,
+       stats_top=args.stats_top,
+       ignore_patterns=ignore_patterns,
+       use_gitignore=not args.no_gitignore,
+       max_file_size=args.max_file_size,
+       symbol_index=None if args.no_index else os.path.join(root_dir, SYMBOL_INDEX_FILE_NAME),
+       prefetch=args.prefetch,
+       prefetch_queue=args.prefetch_queue,
+       tree_depth=args.tree_depth,
+       tree_max_files=args.tree_max_files
+   )
+   if not result["packages"]:
+       print("Пакеты не найдены (нет файлов " + ", ".join(PACKAGE_MARKERS) + "); ARCHITECTURE.md не изменены",
+             file=sys.stderr)
+       return 1
+   start = time.perf_counter()
+   written = write_package_architectures(result, args.jobs)
+   print(f"[OK] Пакетов: {len(result['packages'])}, ARCHITECTURE.md обновлено: {written}")
+   if args.summary:
+       update_architecture_md(render_packages_summary(root_dir, result), arch_file)
+   result["stats"]["phases"]["write"] = time.perf_counter() - start
+   if args.stats:
+       for line in format_run_stats(result["stats"]):
+           print(line, file=sys.stderr)
+   return 0
 if __name__ == "__main__":
-   lines = main()
-   update_architecture_md(lines)
-   
\ No newline at end of file
+   sys.exit(main())